@@ -0,0 +1,74 @@
+# bench.py
+import asyncio
+import time
+from typing import List
+
+from rich.console import Console
+from rich.table import Table
+
+from fake_crm import FakeCRM
+from latency import LatencyHistogram
+from scraper import open_scrapers
+from tenants import TenantConfig
+
+console = Console()
+
+
+async def _bench_backend(backend: str, cfg: TenantConfig, overrides: dict, orders: int, workers: int) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for rma in range(1, orders + 1):
+        queue.put_nowait(rma)
+    hist = LatencyHistogram()
+    ok = 0
+
+    async def worker(scraper):
+        nonlocal ok
+        while True:
+            try:
+                rma = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.monotonic()
+            page_ok, _ = await scraper.open_repair_order(rma)
+            if page_ok:
+                data = await scraper.read_crm_field_values()
+                ok += bool(data.get("Klient"))
+            hist.record((time.monotonic() - t0) * 1000)
+
+    # ws_endpoint="" -> lokalny Chromium (zdalna przeglądarka nie widzi 127.0.0.1)
+    async with open_scrapers(backend, workers, cfg=cfg, cfg_overrides=overrides, ws_endpoint="") as scrapers:
+        t0 = time.monotonic()
+        await asyncio.gather(*(worker(s) for s in scrapers))
+        elapsed = time.monotonic() - t0
+    return {
+        "backend": backend,
+        "ok": ok,
+        "elapsed": elapsed,
+        "rate": orders / elapsed if elapsed > 0 else 0.0,
+        "p50": hist.percentile(0.5),
+        "p95": hist.percentile(0.95),
+    }
+
+
+async def run_benchmark(backends: List[str], orders: int = 200, workers: int = 4, latency_ms: float = 50.0):
+    """Ten sam zestaw zleceń z lokalnego fake CRM dla każdego backendu."""
+    with FakeCRM(max_rma=orders, latency_ms=latency_ms) as crm:
+        overrides = crm.config_overrides()
+        cfg = TenantConfig("bench", **overrides)
+        results = []
+        for backend in backends:
+            console.print(f"[bold]Benchmark: {backend} ({orders} zleceń, {workers} pracowników)...[/bold]")
+            try:
+                results.append(await _bench_backend(backend, cfg, overrides, orders, workers))
+            except Exception as e:
+                console.print(f"[red]{backend}: nie udało się uruchomić – {e!r}[/red]")
+
+    table = Table(title=f"Benchmark backendów (opóźnienie CRM {latency_ms:.0f} ms)")
+    for col in ("Backend", "Odczytane", "Czas [s]", "Zlecenia/s", "p50 [ms]", "p95 [ms]"):
+        table.add_column(col)
+    for r in results:
+        table.add_row(
+            r["backend"], f"{r['ok']}/{orders}", f"{r['elapsed']:.1f}", f"{r['rate']:.1f}",
+            f"{r['p50'] or 0:.0f}", f"{r['p95'] or 0:.0f}",
+        )
+    console.print(table)
@@ -11,6 +11,40 @@ CRM_PASSWORD = os.getenv("CRM_PASSWORD")
 
 NOTION_API_TOKEN = os.getenv("NOTION_API_TOKEN")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
+# Wspólny budżet zapytań do Notion (na token) dla wszystkich procesów na hoście
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+# Bufor zapisów do Notion: wysyłka co tyle sekund albo po tylu oczekujących RMA
+NOTION_WRITE_INTERVAL = float(os.getenv("NOTION_WRITE_INTERVAL", "2"))
+NOTION_WRITE_BATCH = int(os.getenv("NOTION_WRITE_BATCH", "25"))
+
+# Katalog na lokalny stan (kolejki, cache, metryki) – poza repozytorium
+STATE_DIR = os.getenv("GINCORE_STATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state"))
+DEAD_LETTER_DB = os.path.join(STATE_DIR, "dead_letter.sqlite3")
+LATENCY_FILE = os.path.join(STATE_DIR, "latency.json")
+FIELD_HASHES_DB = os.path.join(STATE_DIR, "field_hashes.sqlite3")
+# Lokalny indeks stron Notion (RMA, status) odświeżany po last_edited_time
+NOTION_INDEX_DB = os.path.join(STATE_DIR, "notion_index.sqlite3")
+# RMA potwierdzone jako nieistniejące: pomijane bez nawigacji przez TTL dni,
+# poza ostatnimi RECHECK_TAIL numerami przed najwyższym istniejącym zleceniem
+NEGATIVE_CACHE_DB = os.path.join(STATE_DIR, "negative_cache.sqlite3")
+NEGATIVE_CACHE_TTL_DAYS = float(os.getenv("GINCORE_NEGATIVE_TTL_DAYS", "30"))
+NEGATIVE_CACHE_RECHECK_TAIL = int(os.getenv("GINCORE_NEGATIVE_RECHECK_TAIL", "5"))
+
+# Log JSON (zapis w wątku tła, rotacja wg rozmiaru); komunikaty per pole próbkowane 1 na N
+LOG_FILE = os.getenv("GINCORE_LOG_FILE", os.path.join(STATE_DIR, "gincore.log"))
+LOG_LEVEL = os.getenv("GINCORE_LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.getenv("GINCORE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("GINCORE_LOG_BACKUPS", "5"))
+LOG_FIELD_SAMPLE = int(os.getenv("GINCORE_LOG_FIELD_SAMPLE", "50"))
+
+# Historia przebiegów (subkomenda "stats"): retencja w dniach i próg regresji
+# względem mediany poprzednich przebiegów
+RUN_HISTORY_DB = os.path.join(STATE_DIR, "run_history.sqlite3")
+RUN_HISTORY_KEEP_DAYS = int(os.getenv("GINCORE_HISTORY_KEEP_DAYS", "365"))
+RUN_HISTORY_REGRESSION = float(os.getenv("GINCORE_HISTORY_REGRESSION", "0.25"))
+
+# Wiele punktów serwisowych w jednym procesie (subkomenda "tenants")
+TENANTS_FILE = os.getenv("GINCORE_TENANTS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tenants.json"))
 
 CRM_USERNAME_FIELD_LOCATOR = ("name", "login")
 CRM_PASSWORD_FIELD_LOCATOR = ("name", "password")
@@ -20,9 +54,21 @@ CRM_REPAIR_ORDER_SEARCH_FIELD_LOCATOR = ("id", "repairOrderSearchInput")
 CRM_REPAIR_ORDER_GO_BUTTON_LOCATOR = ("id", "searchButton")
 CRM_RMA_NOT_FOUND_INDICATOR = ("xpath", "//h4[contains(text(), 'Order not found')]")
 
+# Zapis statusu z Notion do CRM (subkomenda "writeback"): lista statusów i przycisk zapisu zlecenia
+CRM_STATUS_SELECT_LOCATOR = ("name", "status")
+CRM_STATUS_SAVE_BUTTON_LOCATOR = ("xpath", "//button[contains(@class, 'js-order-save') or contains(text(), 'Save')]")
+
+# Pole -> lokator albo lista alternatywnych lokatorów (próbowane po kolei;
+# ten, który ostatnio zadziałał, idzie pierwszy – patrz locators.py)
 CRM_DATA_FIELDS_TO_READ = {
-    "Klient": ("xpath", "//div[contains(@class,'order-edit-client')]/a"),
-    "Numer telefonu": ("xpath", "//div[contains(@class,'order-edit-client-phone')]/a"),
+    "Klient": [
+        ("xpath", "//div[contains(@class,'order-edit-client')]/a"),
+        ("css_selector", ".order-edit-client a"),
+    ],
+    "Numer telefonu": [
+        ("xpath", "//div[contains(@class,'order-edit-client-phone')]/a"),
+        ("xpath", "//a[starts-with(@href, 'tel:')]"),
+    ],
     "Producent": ("name", "users_fields[u_producent]"),
     "Typ urządzenia": ("name", "users_fields[u_typ_urzadzenia]"),
     "Model": ("name", "categories-goods-value[]"),
@@ -30,8 +76,44 @@ CRM_DATA_FIELDS_TO_READ = {
     "Uwagi": ("name", "users_fields[u_komentarz_do_zlecenia]"),
     "Opis Usterki": ("name", "defect"),
     "Stan wizualny urządzenia": ("name", "comment"),
-    "Technik": ("xpath", "//select[@name='engineer']/../div/button/span"),
+    "Technik": [
+        ("xpath", "//select[@name='engineer']/../div/button/span"),
+        ("xpath", "//select[@name='engineer']/option[@selected]"),
+    ],
+}
+# Czas (ms) na pojawienie się pola pod pierwszym lokatorem łańcucha
+LOCATOR_BUDGET_MS = int(os.getenv("GINCORE_LOCATOR_BUDGET_MS", "500"))
+
+# Pola renderowane przez JS (bootstrap-select). W trybie pobierania przez request API
+# najpierw czytamy statyczny zamiennik z HTML; pełne renderowanie tylko, gdy nic nie zwróci.
+CRM_JS_ONLY_FIELDS = {
+    "Technik": ("xpath", "//select[@name='engineer']/option[@selected]"),
+}
+
+# Statusy zamkniętych zgłoszeń – pomijane przy odświeżaniu (refresh)
+NOTION_CLOSED_STATUSES = ("Zakończone", "Anulowane")
+# Długie pola (opis usterki, uwagi, stan) ponad limit Notion: w property zostaje
+# skrót o tej długości, pełny tekst trafia do treści strony
+NOTION_SUMMARY_CHARS = int(os.getenv("NOTION_SUMMARY_CHARS", "500"))
+
+# Status Zgłoszenia w Notion -> nazwa statusu na liście w CRM. Statusy spoza
+# mapy (np. "Nowe") nie są przenoszone do CRM.
+NOTION_TO_CRM_STATUS = {
+    "W naprawie": "W naprawie",
+    "Oczekuje na części": "Oczekuje na części",
+    "Gotowe do odbioru": "Gotowe do odbioru",
+    "Zakończone": "Wydane",
+    "Anulowane": "Anulowane",
 }
+# Harmonogram ponownych odczytów (refresh --scheduled): budżet wczytań stron CRM
+# na godzinę (nowe RMA z sync zużywają go pierwsze i nie są ograniczane),
+# okres półtrwania ważności ostatniej edycji i waga zgłoszeń zamkniętych
+RESCRAPE_DB = os.path.join(STATE_DIR, "rescrape.sqlite3")
+RESCRAPE_BUDGET_PER_HOUR = int(os.getenv("GINCORE_RESCRAPE_BUDGET", "120"))
+RESCRAPE_HALF_LIFE_DAYS = float(os.getenv("GINCORE_RESCRAPE_HALF_LIFE_DAYS", "7"))
+RESCRAPE_CLOSED_WEIGHT = 0.05
+# Dziennik zastosowanych zmian statusu (idempotencja) i kursor write-back
+STATUS_WRITEBACK_DB = os.path.join(STATE_DIR, "status_writeback.sqlite3")
 
 USERS_NAME_TO_NOTION_ID_MAP = {
     "Marian": "e9b2da1f-9ee2-4f0b-bf37-dbe991877990",
@@ -0,0 +1,126 @@
+# cost_estimate.py
+import json
+import statistics
+from dataclasses import dataclass, field
+from typing import List
+
+from rich.table import Table
+
+
+def sample_rmas(start: int, end: int, n: int) -> List[int]:
+    """n numerów RMA rozłożonych równo w zakresie [start, end]."""
+    size = end - start + 1
+    if size <= n:
+        return list(range(start, end + 1))
+    step = size / n
+    return sorted({start + int(i * step + step / 2) for i in range(n)})
+
+
+def payload_bytes(payloads: List[dict]) -> int:
+    """Rozmiar payloadów liczony tak samo jak w NotionAPI._call."""
+    return sum(len(json.dumps(p, ensure_ascii=False).encode("utf-8")) for p in payloads)
+
+
+@dataclass
+class OrderSample:
+    rma: int
+    found: bool
+    open_ms: float
+    extract_ms: float = 0.0
+    api_calls: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class CostEstimate:
+    """
+    Prognoza przebiegu sync na podstawie próbki RMA z zakresu. Odczyt z CRM
+    i zapis do Notion działają potokowo, więc czas to wolniejszy z dwóch
+    strumieni: nawigacje (z równoległością trybu) albo wywołania Notion
+    ograniczone limitem zapytań.
+    """
+
+    total: int
+    fetch_mode: str
+    parallel: int
+    notion_rate: float
+    samples: List[OrderSample] = field(default_factory=list)
+
+    @property
+    def found(self) -> List[OrderSample]:
+        return [s for s in self.samples if s.found]
+
+    @property
+    def found_ratio(self) -> float:
+        return len(self.found) / len(self.samples) if self.samples else 0.0
+
+    @staticmethod
+    def _mean(values: List[float]) -> float:
+        return statistics.fmean(values) if values else 0.0
+
+    @property
+    def orders(self) -> float:
+        """Spodziewana liczba istniejących zleceń w zakresie."""
+        return self.total * self.found_ratio
+
+    @property
+    def crm_seconds(self) -> float:
+        found, missing = self.found, [s for s in self.samples if not s.found]
+        open_ms = self._mean([s.open_ms for s in found])
+        extract_ms = self._mean([s.extract_ms for s in found])
+        if self.fetch_mode == "request":
+            # Pobrania idą oknem parallel naraz, parsowanie jest po stronie Pythona
+            per_order = (open_ms + extract_ms) / self.parallel
+        else:
+            # Wyprzedzanie nakłada otwieranie kolejnych RMA na odczyt bieżącego
+            per_order = max(extract_ms, (open_ms + extract_ms) / self.parallel)
+        per_missing = self._mean([s.open_ms for s in missing]) / self.parallel
+        return (self.orders * per_order + (self.total - self.orders) * per_missing) / 1000
+
+    @property
+    def api_calls(self) -> float:
+        return self.orders * self._mean([s.api_calls for s in self.found])
+
+    @property
+    def payload_bytes(self) -> float:
+        return self.orders * self._mean([s.bytes for s in self.found])
+
+    @property
+    def notion_seconds(self) -> float:
+        return self.api_calls / self.notion_rate if self.notion_rate > 0 else 0.0
+
+    @property
+    def wall_seconds(self) -> float:
+        return max(self.crm_seconds, self.notion_seconds)
+
+    @property
+    def rate_wait(self) -> float:
+        """Czas, o który limit Notion wydłuża przebieg ponad tempo CRM."""
+        return max(0.0, self.notion_seconds - self.crm_seconds)
+
+    def table(self, title: str = "Prognoza przebiegu (dry-run)") -> Table:
+        table = Table(title=title, show_header=False)
+        table.add_column("Metryka", style="bold", width=32)
+        table.add_column("Wartość", style="white")
+        found = self.found
+        table.add_row("RMA w zakresie", str(self.total))
+        table.add_row("Próbka", f"{len(self.samples)} RMA ({len(found)} istniejących)")
+        table.add_row("Spodziewane zlecenia", f"{self.orders:.0f}")
+        if found:
+            open_p = statistics.median(s.open_ms for s in found)
+            extract_p = statistics.median(s.extract_ms for s in found)
+            table.add_row("Otwarcie / odczyt (mediana)", f"{open_p:.0f} / {extract_p:.0f} ms")
+        table.add_row("Równoległość", f"{self.parallel} ({self.fetch_mode})")
+        table.add_row("Czas po stronie CRM", _duration(self.crm_seconds))
+        table.add_row("Wywołania Notion", f"{self.api_calls:.0f}")
+        table.add_row("Payload do Notion", f"{self.payload_bytes / 1e6:.1f} MB")
+        table.add_row("Czas przy limicie Notion", f"{_duration(self.notion_seconds)} ({self.notion_rate:g}/s)")
+        table.add_row("Czekanie na limit Notion", _duration(self.rate_wait))
+        table.add_row("Szacowany czas całkowity", _duration(self.wall_seconds))
+        return table
+
+
+def _duration(seconds: float) -> str:
+    h, rest = divmod(int(seconds), 3600)
+    m, s = divmod(rest, 60)
+    return f"{h} h {m:02d} min" if h else f"{m} min {s:02d} s"
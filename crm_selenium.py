@@ -1,6 +1,6 @@
 # crm_selenium.py
-import os, re, time, logging
-from typing import Dict, Tuple, Optional
+import os, time, logging
+from typing import Tuple, Optional
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -8,6 +8,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
 import config
+from locators import FieldValues, locator_chain
 
 _BY = {
     "id": By.ID, "name": By.NAME, "class_name": By.CLASS_NAME,
@@ -18,7 +19,9 @@ _BY = {
 def _loc(tup): kind, val = tup; return (_BY[kind], val)
 
 class CRMSelenium:
-    def __init__(self, headless: bool = True, timeout: int = 20):
+    def __init__(self, headless: bool = True, timeout: int = 20, cfg=None):
+        # cfg: moduł config albo TenantConfig (np. lokalny fake CRM)
+        self.cfg = cfg or config
         self.timeout = timeout
         self.driver = self._init_driver(headless=headless)
         self.wait = WebDriverWait(self.driver, timeout)
@@ -47,11 +50,12 @@ class CRMSelenium:
 
     # ---------- Logowanie ----------
     def login(self, username: str, password: str) -> bool:
-        self.driver.get(config.CRM_LOGIN_URL)
+        cfg = self.cfg
+        self.driver.get(cfg.CRM_LOGIN_URL)
         try:
-            self.wait.until(EC.presence_of_element_located(_loc(config.CRM_USERNAME_FIELD_LOCATOR))).send_keys(username)
-            self.driver.find_element(*_loc(config.CRM_PASSWORD_FIELD_LOCATOR)).send_keys(password)
-            self.driver.find_element(*_loc(config.CRM_LOGIN_BUTTON_LOCATOR)).click()
+            self.wait.until(EC.presence_of_element_located(_loc(cfg.CRM_USERNAME_FIELD_LOCATOR))).send_keys(username)
+            self.driver.find_element(*_loc(cfg.CRM_PASSWORD_FIELD_LOCATOR)).send_keys(password)
+            self.driver.find_element(*_loc(cfg.CRM_LOGIN_BUTTON_LOCATOR)).click()
 
             # Czekamy aż formularz zniknie lub zmieni się kontekst/URL
             self.wait.until(EC.any_of(
@@ -69,39 +73,42 @@ class CRMSelenium:
         Zwraca tuple: (page_loaded_ok: bool, rma_not_found: bool)
         Gwarantuje spójny zwrot – NIE miesza typów.
         """
-        url = f"{config.CRM_REPAIR_ORDER_BASE_URL}{rma_number}"
+        cfg = self.cfg
+        url = f"{cfg.CRM_REPAIR_ORDER_BASE_URL}{rma_number}"
         try:
             self.driver.get(url)
             self.wait.until(EC.any_of(
-                EC.presence_of_element_located(_loc(config.CRM_RMA_NOT_FOUND_INDICATOR)),
+                EC.presence_of_element_located(_loc(cfg.CRM_RMA_NOT_FOUND_INDICATOR)),
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             ))
             # „not found”?
-            if self.driver.find_elements(*_loc(config.CRM_RMA_NOT_FOUND_INDICATOR)):
+            if self.driver.find_elements(*_loc(cfg.CRM_RMA_NOT_FOUND_INDICATOR)):
                 return (False, True)
             return (True, False)
         except Exception as e:
             logging.warning("Błąd ładowania RMA %s: %s", rma_number, e)
             return (False, False)
 
-    def read_crm_field_values(self) -> Dict[str, Optional[str]]:
+    def read_crm_field_values(self) -> FieldValues:
         """
-        Czyta pola wg config.CRM_DATA_FIELDS_TO_READ, normalizuje 'Technik'.
-        Brak pola -> None (zamiast 'N/A').
+        Czyta pola wg config.CRM_DATA_FIELDS_TO_READ (normalizacja w OrderRecord).
+        Brak pola -> None (zamiast 'N/A'); data.found – pola, których element się znalazł.
         """
-        data: Dict[str, Optional[str]] = {}
-        for notion_prop, locator in config.CRM_DATA_FIELDS_TO_READ.items():
+        data = FieldValues()
+        for notion_prop, spec in self.cfg.CRM_DATA_FIELDS_TO_READ.items():
             try:
-                el = self.driver.find_element(*_loc(locator))
+                # Pierwsza alternatywa łańcucha, która coś znajdzie
+                el = next(
+                    found[0] for found in (self.driver.find_elements(*_loc(loc)) for loc in locator_chain(spec))
+                    if found
+                )
                 tag = (el.tag_name or "").lower()
                 if tag in ("input", "textarea"):
                     val = el.get_attribute("value") or el.text
                 else:
                     val = el.text
-                if notion_prop == "Technik" and val:
-                    # obcięcie sufiksów w stylu "(workload ...)"
-                    val = re.sub(r"\s*\(.*\)\s*$", "", val).strip()
                 data[notion_prop] = (val or "").strip() or None
+                data.found.add(notion_prop)
             except Exception:
                 data[notion_prop] = None
         return data
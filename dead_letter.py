@@ -0,0 +1,81 @@
+# dead_letter.py
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import config
+
+# Etapy, na których RMA może się nie udać
+STAGE_OPEN = "open"      # open_repair_order: timeout / nie można wczytać strony
+STAGE_NOTION = "notion"  # add_crm_data_to_notion zwróciło False
+
+
+@dataclass
+class DeadLetter:
+    rma: int
+    stage: str
+    error: str
+    attempts: int
+    first_failed: float
+    last_failed: float
+
+
+class DeadLetterQueue:
+    """
+    Trwała kolejka nieudanych RMA (SQLite). Jeden wiersz na RMA –
+    kolejne porażki aktualizują etap, błąd i licznik prób.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.DEAD_LETTER_DB
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                rma INTEGER PRIMARY KEY,
+                stage TEXT NOT NULL,
+                error TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                first_failed REAL NOT NULL,
+                last_failed REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def record(self, rma: int, stage: str, error: str) -> None:
+        now = time.time()
+        self.conn.execute(
+            """
+            INSERT INTO dead_letters (rma, stage, error, attempts, first_failed, last_failed)
+            VALUES (?, ?, ?, 1, ?, ?)
+            ON CONFLICT(rma) DO UPDATE SET
+                stage = excluded.stage,
+                error = excluded.error,
+                attempts = attempts + 1,
+                last_failed = excluded.last_failed
+            """,
+            (int(rma), stage, error, now, now),
+        )
+        self.conn.commit()
+
+    def remove(self, rma: int) -> None:
+        self.conn.execute("DELETE FROM dead_letters WHERE rma = ?", (int(rma),))
+        self.conn.commit()
+
+    def pending(self, limit: Optional[int] = None) -> List[DeadLetter]:
+        sql = "SELECT rma, stage, error, attempts, first_failed, last_failed FROM dead_letters ORDER BY rma"
+        params: tuple = ()
+        if limit:
+            sql += " LIMIT ?"
+            params = (int(limit),)
+        return [DeadLetter(*row) for row in self.conn.execute(sql, params)]
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
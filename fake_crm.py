@@ -0,0 +1,156 @@
+# fake_crm.py
+"""
+Lokalny, minimalny "Gincore" do benchmarków i prób bez prawdziwego CRM.
+Strony mają te same elementy, których szukają lokatory z config.py.
+"""
+import html
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Set
+from urllib.parse import parse_qs
+
+LOGIN_FORM = """<!doctype html><html><body>
+<form method="post" action="/auth/login">
+  <input name="login"><input name="password" type="password">
+  <button type="submit">Sign In</button>
+</form></body></html>"""
+
+NOT_FOUND = """<!doctype html><html><body><h4>Order not found</h4></body></html>"""
+
+ORDER_TEMPLATE = """<!doctype html><html><body>
+<div class="order-edit-client"><a href="#">{client}</a></div>
+<div class="order-edit-client-phone"><a href="#">{phone}</a></div>
+<input name="users_fields[u_producent]" value="{producer}">
+<input name="users_fields[u_typ_urzadzenia]" value="{kind}">
+<input name="categories-goods-value[]" value="{model}">
+<input name="serial[]" value="{serial}">
+<textarea name="users_fields[u_komentarz_do_zlecenia]">{notes}</textarea>
+<textarea name="defect">{defect}</textarea>
+<textarea name="comment">{visual}</textarea>
+<div><select name="engineer"><option selected>{tech}</option></select>
+<div><button type="button"><span>{tech} (2 w toku)</span></button></div></div>
+</body></html>"""
+
+
+def order_html(rma: int) -> str:
+    rnd = random.Random(rma)
+    fields = {
+        "client": f"Klient {rma}",
+        "phone": f"+48 600 {rnd.randint(100, 999)} {rnd.randint(100, 999)}",
+        "producer": rnd.choice(["Apple", "Samsung", "Xiaomi", "Lenovo"]),
+        "kind": rnd.choice(["Telefon", "Laptop", "Tablet"]),
+        "model": f"Model-{rnd.randint(1, 99)}",
+        "serial": f"SN{rma:08d}",
+        "notes": "Uwagi " * rnd.randint(0, 5),
+        "defect": "Nie włącza się. " * rnd.randint(1, 10),
+        "visual": "Rysy na obudowie",
+        "tech": rnd.choice(["Marian", "Piotr Urbanek"]),
+    }
+    return ORDER_TEMPLATE.format(**{k: html.escape(v) for k, v in fields.items()})
+
+
+class FakeCRM:
+    """
+    Serwer HTTP w wątku tła. Zlecenia 1..max_rma istnieją, missing – usunięte.
+    latency_ms symuluje czas odpowiedzi CRM.
+    """
+
+    def __init__(self, max_rma: int = 1000, latency_ms: float = 50.0,
+                 missing: Optional[Set[int]] = None, host: str = "127.0.0.1", port: int = 0):
+        self.max_rma = max_rma
+        self.latency_ms = latency_ms
+        self.missing = missing or set()
+        self.sessions: Set[str] = set()
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config_overrides(self) -> dict:
+        """Klucze dla TenantConfig wskazujące na ten serwer."""
+        return {
+            "CRM_LOGIN_URL": f"{self.base_url}/auth/login_form",
+            "CRM_REPAIR_ORDER_BASE_URL": f"{self.base_url}/orders/",
+            "CRM_USERNAME": "bench",
+            "CRM_PASSWORD": "bench",
+        }
+
+    def start(self) -> "FakeCRM":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeCRM":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler(self):
+        crm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: str = "", headers: Optional[dict] = None):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _logged_in(self) -> bool:
+                cookies = self.headers.get("Cookie", "")
+                return any(
+                    c.strip().startswith("sid=") and c.strip()[4:] in crm.sessions
+                    for c in cookies.split(";")
+                )
+
+            def do_GET(self):
+                crm.requests += 1
+                if crm.latency_ms:
+                    time.sleep(crm.latency_ms / 1000)
+                path = self.path.split("?")[0]
+                if path.startswith("/auth/login_form"):
+                    return self._send(200, LOGIN_FORM)
+                if not path.startswith("/orders/"):
+                    return self._send(404, NOT_FOUND)
+                if not self._logged_in():
+                    return self._send(302, headers={"Location": "/auth/login_form"})
+                tail = path.rstrip("/").rsplit("/", 1)[-1]
+                if not tail.isdigit():
+                    return self._send(200, "<html><body>Lista zleceń</body></html>")
+                rma = int(tail)
+                if rma > crm.max_rma or rma in crm.missing:
+                    return self._send(404, NOT_FOUND)
+                return self._send(200, order_html(rma))
+
+            def do_POST(self):
+                crm.requests += 1
+                length = int(self.headers.get("Content-Length", "0"))
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                if self.path.startswith("/auth/login") and form.get("login"):
+                    sid = secrets.token_hex(8)
+                    crm.sessions.add(sid)
+                    return self._send(302, headers={
+                        "Location": "/orders/",
+                        "Set-Cookie": f"sid={sid}; Path=/",
+                    })
+                return self._send(302, headers={"Location": "/auth/login_form"})
+
+        return Handler
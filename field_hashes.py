@@ -0,0 +1,109 @@
+# field_hashes.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import config
+
+
+def property_hash(value: dict) -> str:
+    """Stabilny skrót wartości property Notion (kolejność kluczy bez znaczenia)."""
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+
+class FieldHashStore:
+    """
+    Skróty ostatnio zsynchronizowanych wartości pól per RMA (SQLite).
+    Pozwalają wysłać do Notion tylko zmienione properties. Tabela activity
+    liczy ponowne odczyty i te z nich, które przyniosły zmianę (harmonogram
+    odświeżania, rescrape_scheduler.py).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.FIELD_HASHES_DB
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Zapisy mogą przychodzić z wątku roboczego (asyncio.to_thread) równolegle
+        # z pętlą asyncio – jedno połączenie, więc każdy dostęp pod blokadą
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS field_hashes (
+                rma INTEGER NOT NULL,
+                field TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                synced REAL NOT NULL,
+                PRIMARY KEY (rma, field)
+            );
+            CREATE TABLE IF NOT EXISTS activity (
+                rma INTEGER PRIMARY KEY,
+                checks INTEGER NOT NULL,
+                changes INTEGER NOT NULL,
+                last_check REAL NOT NULL,
+                last_change REAL
+            );
+            """
+        )
+        self.conn.commit()
+
+    def get(self, rma: int) -> Dict[str, str]:
+        with self._lock:
+            rows = self.conn.execute("SELECT field, hash FROM field_hashes WHERE rma = ?", (int(rma),))
+            return dict(rows)
+
+    def changed(self, rma: int, properties: Dict[str, dict],
+                cleared: Optional[Dict[str, dict]] = None) -> Dict[str, dict]:
+        """
+        Zwraca tylko te properties, których skrót różni się od zapisanego.
+        cleared: wartości czyszczące pól, których już nie ma w properties –
+        wchodzą do wyniku, jeśli pole ma zapisany skrót innej wartości.
+        """
+        known = self.get(rma)
+        changed = {
+            name: value
+            for name, value in properties.items()
+            if known.get(name) != property_hash(value)
+        }
+        for name, value in (cleared or {}).items():
+            if name not in properties and name in known and known[name] != property_hash(value):
+                changed[name] = value
+        return changed
+
+    def store(self, rma: int, properties: Dict[str, dict]) -> None:
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO field_hashes (rma, field, hash, synced) VALUES (?, ?, ?, ?)",
+                [(int(rma), name, property_hash(value), now) for name, value in properties.items()],
+            )
+
+    def note_check(self, rma: int, changed: bool) -> None:
+        """Odnotowuje ponowny odczyt RMA i to, czy coś się zmieniło."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO activity (rma, checks, changes, last_check, last_change) VALUES (?, 1, ?, ?, ?)
+                ON CONFLICT (rma) DO UPDATE SET
+                    checks = checks + 1,
+                    changes = changes + excluded.changes,
+                    last_check = excluded.last_check,
+                    last_change = COALESCE(excluded.last_change, last_change)
+                """,
+                (int(rma), int(changed), now, now if changed else None),
+            )
+
+    def activity(self) -> Dict[int, Tuple[int, int, float]]:
+        """RMA -> (odczyty, zmiany, czas ostatniego odczytu)."""
+        with self._lock:
+            rows = self.conn.execute("SELECT rma, checks, changes, last_check FROM activity")
+            return {rma: (checks, changes, last_check) for rma, checks, changes, last_check in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
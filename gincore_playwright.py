@@ -1,11 +1,19 @@
 # gincore_playwright.py
+import asyncio
+import logging
 import os
-import re
-from typing import Dict, Optional, Tuple
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from urllib.parse import urlparse
 from dotenv import load_dotenv
-from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import Error as PlaywrightError, Page, TimeoutError as PlaywrightTimeoutError
 
 import config
+from latency import AdaptiveTimeouts
+from locators import FieldValues, chains_for
+from negative_cache import NegativeCache
+from run_log import event, field_log
 
 load_dotenv()
 BROWSERLESS_WS = os.getenv("BROWSERLESS_WS")
@@ -31,30 +39,63 @@ def _selector(kind: str, value: str) -> str:
         return value
     raise ValueError(f"Nieobsługiwany rodzaj lokatora: {kind}")
 
+class SessionExpiredError(Exception):
+    """Sesja CRM wygasła – nawigacja skończyła się na formularzu logowania."""
+
+
+class TransientNavigationError(Exception):
+    """Przejściowy błąd nawigacji (timeout) – RMA może istnieć, warto ponowić."""
+
+
+def _is_network_error(e: Exception) -> bool:
+    message = getattr(e, "message", None) or str(e)
+    # Zależnie od wersji komunikat ma prefiks "Page.goto: "
+    return message.startswith("net::") or ": net::" in message
+
+
+def _is_login_url(url: Optional[str], cfg=None) -> bool:
+    if not url:
+        return False
+    login = urlparse((cfg or config).CRM_LOGIN_URL)
+    got = urlparse(url)
+    return got.netloc == login.netloc and got.path.rstrip("/") == login.path.rstrip("/")
+
 # --- Logowanie ---
-async def login(page: Page, username: str, password: str) -> bool:
-    await page.goto(config.CRM_LOGIN_URL, wait_until="domcontentloaded")
-    u = _selector(*config.CRM_USERNAME_FIELD_LOCATOR)
-    p = _selector(*config.CRM_PASSWORD_FIELD_LOCATOR)
-    b = _selector(*config.CRM_LOGIN_BUTTON_LOCATOR)
+async def login(
+    page: Page,
+    username: str,
+    password: str,
+    timeouts: Optional[AdaptiveTimeouts] = None,
+    cfg=None,
+) -> bool:
+    cfg = cfg or config
+    await page.goto(cfg.CRM_LOGIN_URL, wait_until="domcontentloaded")
+    u = _selector(*cfg.CRM_USERNAME_FIELD_LOCATOR)
+    p = _selector(*cfg.CRM_PASSWORD_FIELD_LOCATOR)
+    b = _selector(*cfg.CRM_LOGIN_BUTTON_LOCATOR)
     await page.fill(u, username)
     await page.fill(p, password)
     await page.click(b)
+    limit = timeouts.timeout_ms("login_idle") if timeouts else 15000
+    t0 = time.monotonic()
     try:
-        await page.wait_for_load_state("networkidle", timeout=15000)
-        return True
+        await page.wait_for_load_state("networkidle", timeout=limit)
+        ok = True
     except Exception:
-        return False
+        ok = False
+    if timeouts:
+        timeouts.observe("login_idle", (time.monotonic() - t0) * 1000)
+    return ok
 
 # --- Pozytywna detekcja strony zlecenia ---
-async def _is_order_page_loaded(page: Page) -> bool:
-    for _, (kind, val) in config.CRM_DATA_FIELDS_TO_READ.items():
-        sel = _selector(kind, val)
-        try:
-            if await page.locator(sel).first.is_visible():
-                return True
-        except Exception:
-            continue
+async def _is_order_page_loaded(page: Page, cfg=None) -> bool:
+    for chain in chains_for(cfg).chains.values():
+        for kind, val in chain:
+            try:
+                if await page.locator(_selector(kind, val)).first.is_visible():
+                    return True
+            except Exception:
+                continue
     return False
 
 URL_CANDIDATES_SUFFIXES = [
@@ -68,20 +109,34 @@ URL_CANDIDATES_SUFFIXES = [
 # gincore_playwright.py (fragment)
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
-async def open_repair_order(page: Page, rma_number: int) -> tuple[bool, bool]:
+async def open_repair_order(
+    page: Page,
+    rma_number: int,
+    timeout: int = 5000,
+    wait_until: str = "commit",
+    timeouts: Optional[AdaptiveTimeouts] = None,
+    cfg=None,
+) -> tuple[bool, bool]:
     """
     Spróbuj otworzyć stronę RMA i zwróć (page_ok, not_found).
     Jeśli status HTTP==404, uznajemy, że RMA nie istnieje.
+    Przekierowanie na CRM_LOGIN_URL -> SessionExpiredError,
+    timeout nawigacji -> TransientNavigationError.
+    cfg: konfiguracja instancji CRM (domyślnie moduł config).
     """
-    base = config.CRM_REPAIR_ORDER_BASE_URL
+    cfg = cfg or config
+    base = cfg.CRM_REPAIR_ORDER_BASE_URL
     base = base if base.endswith("/") else base + "/"
 
     for suf in URL_CANDIDATES_SUFFIXES:
         try_url = f"{base}{suf}{rma_number}"
         try:
-            # Używamy wait_until="commit", aby nie czekać na pełne załadowanie strony
+            # Domyślnie wait_until="commit", aby nie czekać na pełne załadowanie strony
             # oraz krótszy timeout (5 s zamiast domyślnych 30 s).
-            response = await page.goto(try_url, wait_until="commit", timeout=5000)
+            t0 = time.monotonic()
+            response = await page.goto(try_url, wait_until=wait_until, timeout=timeout)
+            if timeouts and wait_until == "commit":
+                timeouts.observe("order_goto", (time.monotonic() - t0) * 1000)
             if response:
                 status = response.status
                 # 404 -> RMA nie istnieje
@@ -92,28 +147,34 @@ async def open_repair_order(page: Page, rma_number: int) -> tuple[bool, bool]:
                 # Sprawdźmy później po widocznych elementach
                 pass
 
-        except PlaywrightTimeoutError:
-            # Zbyt długie ładowanie – potraktuj jako niezaładowanie strony
-            return (False, False)
+        except PlaywrightTimeoutError as e:
+            if timeouts and wait_until == "commit":
+                timeouts.observe("order_goto", timeout)
+            # Zbyt długie ładowanie – to nie jest "brak RMA", decyzję o ponowieniu
+            # podejmuje wywołujący (RetryPolicy)
+            raise TransientNavigationError(f"{try_url}: {e}") from e
+        except PlaywrightError as e:
+            # Błędy sieci (net::ERR_CONNECTION_RESET, net::ERR_NAME_NOT_RESOLVED...)
+            # też są przejściowe – ponowienie zamiast przerwania całego skanu
+            if _is_network_error(e):
+                raise TransientNavigationError(f"{try_url}: {e}") from e
+            raise
 
-        # Sprawdź, czy nie wypadło logowanie
-        try:
-            login_sel = _selector(*config.CRM_USERNAME_FIELD_LOCATOR)
-            if await page.locator(login_sel).first.is_visible():
-                return (False, False)
-        except Exception:
-            pass
+        # Wygasła sesja: CRM przekierowuje na formularz logowania –
+        # wystarczy adres odpowiedzi, bez sondowania DOM
+        if _is_login_url(response.url if response else page.url, cfg):
+            raise SessionExpiredError(try_url)
 
         # Pozytywna detekcja elementów: strona jest załadowana
         try:
-            if await _is_order_page_loaded(page):
+            if await _is_order_page_loaded(page, cfg):
                 return (True, False)
         except Exception:
             pass
 
         # Negatywna detekcja: widoczny komunikat "Order not found"
         try:
-            nf_sel = _selector(*config.CRM_RMA_NOT_FOUND_INDICATOR)
+            nf_sel = _selector(*cfg.CRM_RMA_NOT_FOUND_INDICATOR)
             if await page.locator(nf_sel).first.is_visible():
                 return (False, True)
         except Exception:
@@ -122,39 +183,222 @@ async def open_repair_order(page: Page, rma_number: int) -> tuple[bool, bool]:
         # Jeśli ta wersja URL nie zadziałała, spróbuj następnego sufiksu
     return (False, False)
 
+async def _document_bytes(page: Page) -> int:
+    """Bajty dokumentu zlecenia z Navigation Timing (bez zasobów); 0, gdy nieznane."""
+    try:
+        size = await page.evaluate("() => performance.getEntriesByType('navigation')[0]?.transferSize || 0")
+        return int(size or 0)
+    except Exception:
+        return 0
+
+# --- Polityka ponowień dla pojedynczego RMA ---
+@dataclass
+class RetryPolicy:
+    """
+    Kolejne próby otwarcia RMA: szybki "commit" na start, potem coraz
+    dłuższe limity i pełniejsze czekanie. Opóźnienie rośnie wykładniczo.
+    """
+    attempts: int = 3
+    backoff: float = 1.0
+    timeouts: Tuple[int, ...] = (5000, 15000, 30000)
+    wait_untils: Tuple[str, ...] = ("commit", "domcontentloaded", "load")
+
+    def timeout_for(self, attempt: int, first: Optional[int] = None) -> int:
+        """Limit dla próby; first (np. z AdaptiveTimeouts) zastępuje pierwszy stopień."""
+        fixed = self.timeouts[min(attempt, len(self.timeouts) - 1)]
+        if first is None:
+            return fixed
+        return first if attempt == 0 else max(fixed, first)
+
+    def wait_until_for(self, attempt: int) -> str:
+        return self.wait_untils[min(attempt, len(self.wait_untils) - 1)]
+
+    def delay_for(self, attempt: int) -> float:
+        return self.backoff * 2 ** (attempt - 1) if attempt else 0.0
+
+# --- Sesja współdzielona przez wiele stron ---
+class CRMSession:
+    """
+    Sesja CRM jednego kontekstu przeglądarki (ciasteczka są wspólne dla stron)
+    i jednej instancji CRM (cfg – moduł config albo TenantConfig).
+    Ponowne logowanie jest serializowane: gdy kilka stron naraz zauważy
+    wygaśnięcie sesji, loguje się tylko pierwsza, pozostałe ponawiają RMA.
+    """
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        max_relogins: int = 2,
+        retry: Optional[RetryPolicy] = None,
+        stats=None,
+        timeouts: Optional[AdaptiveTimeouts] = None,
+        cfg=None,
+        missing: Optional[NegativeCache] = None,
+    ):
+        self.cfg = cfg or config
+        self.missing = missing
+        self.username = username
+        self.password = password
+        self.max_relogins = max_relogins
+        self.retry = retry or RetryPolicy()
+        self.stats = stats
+        self.timeouts = timeouts
+        self.generation = 0
+        self.relogins = 0
+        self._lock = asyncio.Lock()
+
+    async def login(self, page: Page) -> bool:
+        async with self._lock:
+            ok = await login(page, self.username, self.password, self.timeouts, self.cfg)
+            self.generation += 1
+            return ok
+
+    async def relogin(self, page: Page, seen_generation: int) -> bool:
+        """
+        Ponowne logowanie po wygaśnięciu sesji. Timeout albo błąd sieci
+        (net::) -> TransientNavigationError; inny błąd Playwright -> False.
+        """
+        async with self._lock:
+            if self.generation != seen_generation:
+                # Inna strona zdążyła się już zalogować
+                return True
+            try:
+                ok = await login(page, self.username, self.password, self.timeouts, self.cfg)
+            except PlaywrightTimeoutError as e:
+                raise TransientNavigationError(f"logowanie: {e}") from e
+            except PlaywrightError as e:
+                if _is_network_error(e):
+                    raise TransientNavigationError(f"logowanie: {e}") from e
+                logging.warning("Ponowne logowanie nie powiodło się: %s", e)
+                ok = False
+            self.generation += 1
+            self.relogins += 1
+            if self.stats is not None:
+                self.stats.relogins += 1
+            return ok
+
+    async def open_repair_order(self, page: Page, rma_number: int) -> Tuple[bool, bool]:
+        """
+        open_repair_order z polityką ponowień i przezroczystym ponownym logowaniem.
+        Zwraca (page_ok, not_found); (False, False) oznacza wyczerpane próby
+        przy błędach przejściowych, a nie brak zlecenia.
+        RMA z negatywnego cache (missing) są zwracane jako brak bez nawigacji.
+        """
+        if self.missing is not None and self.missing.should_skip(rma_number):
+            if self.stats is not None:
+                self.stats.cached_missing += 1
+            event("order", rma=rma_number, stage="open", ms=0, outcome="cached_missing")
+            return False, True
+        t0 = time.monotonic()
+        outcome = "error"
+        try:
+            page_ok, not_found = await self._open_with_retry(page, rma_number)
+            outcome = "ok" if page_ok else "not_found" if not_found else "failed"
+            if page_ok and self.stats is not None:
+                self.stats.bytes_in += await _document_bytes(page)
+            self.note_result(rma_number, page_ok, not_found)
+            return page_ok, not_found
+        finally:
+            ms = (time.monotonic() - t0) * 1000
+            if self.stats is not None:
+                self.stats.observe("open", ms)
+            event("order", rma=rma_number, stage="open", ms=round(ms), outcome=outcome)
+
+    def note_result(self, rma_number: int, page_ok: bool, not_found: bool) -> None:
+        """Aktualizuje negatywny cache po rzeczywistym sprawdzeniu RMA."""
+        if self.missing is None:
+            return
+        if page_ok:
+            self.missing.note_existing(rma_number)
+        elif not_found:
+            self.missing.record(rma_number)
+
+    async def _open_with_retry(self, page: Page, rma_number: int) -> Tuple[bool, bool]:
+        relogins = 0
+        attempt = 0
+        while attempt < self.retry.attempts:
+            if attempt:
+                if self.stats is not None:
+                    self.stats.retries += 1
+                await asyncio.sleep(self.retry.delay_for(attempt))
+            seen = self.generation
+            try:
+                first = self.timeouts.timeout_ms("order_goto") if self.timeouts else None
+                page_ok, not_found = await open_repair_order(
+                    page,
+                    rma_number,
+                    timeout=self.retry.timeout_for(attempt, first),
+                    wait_until=self.retry.wait_until_for(attempt),
+                    timeouts=self.timeouts,
+                    cfg=self.cfg,
+                )
+            except SessionExpiredError:
+                if relogins >= self.max_relogins:
+                    break
+                relogins += 1
+                try:
+                    if await self.relogin(page, seen):
+                        continue  # ta sama próba – wygaśnięcie sesji nie zużywa limitu
+                except TransientNavigationError:
+                    pass
+                # Nieudane logowanie zużywa próbę, jak błąd przejściowy nawigacji
+                attempt += 1
+                continue
+            except TransientNavigationError:
+                attempt += 1
+                continue
+            if page_ok or not_found:
+                return (page_ok, not_found)
+            # Strona się wczytała, ale bez pól i bez komunikatu – też przejściowe
+            attempt += 1
+        if self.stats is not None:
+            self.stats.transient_failures += 1
+        return (False, False)
+
 # --- Wyszukiwarka ---
-async def open_repair_order_via_search(page: Page, rma_number: int) -> Tuple[bool, bool]:
+async def open_repair_order_via_search(
+    page: Page,
+    rma_number: int,
+    timeouts: Optional[AdaptiveTimeouts] = None,
+    cfg=None,
+) -> Tuple[bool, bool]:
     """
     Używa lokatorów wyszukiwarki z configu:
       - CRM_REPAIR_ORDER_SEARCH_FIELD_LOCATOR
       - CRM_REPAIR_ORDER_GO_BUTTON_LOCATOR
     Zwraca (page_ok, rma_not_found)
     """
+    cfg = cfg or config
     try:
-        base = config.CRM_REPAIR_ORDER_BASE_URL
+        base = cfg.CRM_REPAIR_ORDER_BASE_URL
         list_url = base if base.endswith("/") else f"{base}/"
         try:
             await page.goto(list_url, wait_until="domcontentloaded")
         except Exception:
             pass
 
-        sf = _selector(*config.CRM_REPAIR_ORDER_SEARCH_FIELD_LOCATOR)
-        go = _selector(*config.CRM_REPAIR_ORDER_GO_BUTTON_LOCATOR)
+        sf = _selector(*cfg.CRM_REPAIR_ORDER_SEARCH_FIELD_LOCATOR)
+        go = _selector(*cfg.CRM_REPAIR_ORDER_GO_BUTTON_LOCATOR)
 
         await page.fill(sf, str(rma_number))
         await page.click(go)
 
+        limit = timeouts.timeout_ms("search_idle") if timeouts else 8000
+        t0 = time.monotonic()
         try:
-            await page.wait_for_load_state("networkidle", timeout=8000)
+            await page.wait_for_load_state("networkidle", timeout=limit)
         except Exception:
             pass
+        if timeouts:
+            timeouts.observe("search_idle", (time.monotonic() - t0) * 1000)
 
-        if await _is_order_page_loaded(page):
+        if await _is_order_page_loaded(page, cfg):
             return (True, False)
 
         # negatywna detekcja
         try:
-            nf_sel = _selector(*config.CRM_RMA_NOT_FOUND_INDICATOR)
+            nf_sel = _selector(*cfg.CRM_RMA_NOT_FOUND_INDICATOR)
             if await page.locator(nf_sel).first.is_visible():
                 return (False, True)
         except Exception:
@@ -165,24 +409,79 @@ async def open_repair_order_via_search(page: Page, rma_number: int) -> Tuple[boo
     except Exception:
         return (False, False)
 
-# --- Odczyt wartości pól ---
-async def read_crm_field_values(page: Page) -> Dict[str, Optional[str]]:
-    data: Dict[str, Optional[str]] = {}
-    for notion_prop, (kind, val) in config.CRM_DATA_FIELDS_TO_READ.items():
-        sel = _selector(kind, val)
-        loc = page.locator(sel).first
+# --- Zapis statusu zlecenia ---
+_SELECTED_LABEL = "el => (el.options[el.selectedIndex] || {}).text?.trim() || null"
+
+
+async def set_order_status(page: Page, status: str, cfg=None, timeout: int = 10000) -> bool:
+    """
+    Ustawia status otwartego zlecenia: wybór z listy CRM_STATUS_SELECT_LOCATOR
+    i zapis przyciskiem CRM_STATUS_SAVE_BUTTON_LOCATOR. Gdy CRM ma już ten
+    status, nic nie zapisuje. True po potwierdzeniu nowej wartości na liście.
+    """
+    cfg = cfg or config
+    select = page.locator(_selector(*cfg.CRM_STATUS_SELECT_LOCATOR)).first
+    try:
+        if await select.evaluate(_SELECTED_LABEL, timeout=timeout) == status:
+            return True
+        await select.select_option(label=status, timeout=timeout)
+        await page.locator(_selector(*cfg.CRM_STATUS_SAVE_BUTTON_LOCATOR)).first.click(timeout=timeout)
         try:
-            tag = (await loc.evaluate("el => el.tagName")).lower()
-            if tag in ("input", "textarea", "select"):
-                try:
-                    v = await loc.input_value()
-                except Exception:
-                    v = (await loc.inner_text()).strip()
-            else:
-                v = (await loc.inner_text()).strip()
-            if notion_prop == "Technik" and v:
-                v = re.sub(r"\s*\(.*\)\s*$", "", v).strip()
-            data[notion_prop] = v or None
-        except Exception:
-            data[notion_prop] = None
+            await page.wait_for_load_state("networkidle", timeout=timeout)
+        except PlaywrightTimeoutError:
+            pass
+        return await select.evaluate(_SELECTED_LABEL, timeout=timeout) == status
+    except Exception:
+        return False
+
+# --- Odczyt wartości pól ---
+async def _read_locator(page: Page, sel: str, wait_ms: int, budget_ms: int) -> Tuple[bool, Optional[str]]:
+    """
+    (znaleziono, wartość). wait_ms > 0 czeka na element najwyżej tyle;
+    0 – tylko natychmiastowe sprawdzenie, bez czekania.
+    """
+    loc = page.locator(sel).first
+    try:
+        if wait_ms:
+            await loc.wait_for(state="attached", timeout=wait_ms)
+        elif not await page.locator(sel).count():
+            return False, None
+        tag = (await loc.evaluate("el => el.tagName", timeout=budget_ms)).lower()
+        if tag in ("input", "textarea", "select"):
+            try:
+                v = await loc.input_value(timeout=budget_ms)
+            except Exception:
+                v = (await loc.inner_text(timeout=budget_ms)).strip()
+        else:
+            v = (await loc.inner_text(timeout=budget_ms)).strip()
+    except Exception:
+        return False, None
+    return True, v or None
+
+
+async def read_crm_field_values(page: Page, cfg=None) -> FieldValues:
+    """
+    Czyta pola zlecenia. Każde pole może mieć łańcuch alternatywnych lokatorów:
+    zapamiętany zwycięzca dostaje LOCATOR_BUDGET_MS na pojawienie się elementu,
+    kolejne alternatywy są sprawdzane bez czekania. data.found – pola, których
+    element się znalazł (także pusty).
+    """
+    cfg = cfg or config
+    chains = chains_for(cfg)
+    budget = cfg.LOCATOR_BUDGET_MS
+    data = FieldValues()
+    for notion_prop in chains.chains:
+        value = None
+        for n, (index, (kind, val)) in enumerate(chains.ordered(notion_prop)):
+            found, value = await _read_locator(page, _selector(kind, val), budget if n == 0 else 0, budget)
+            if found:
+                chains.hit(notion_prop, index, first=n == 0)
+                data.found.add(notion_prop)
+                break
+        else:
+            chains.miss(notion_prop)
+        # Normalizacja (np. sufiks "(2 w toku)" przy Techniku) – w OrderRecord
+        data[notion_prop] = value
+        if field_log.isEnabledFor(logging.DEBUG):
+            field_log.debug("field", extra={"fields": {"field": notion_prop, "found": value is not None}})
     return data
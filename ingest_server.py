@@ -0,0 +1,273 @@
+# ingest_server.py
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from playwright.async_api import Page
+
+import config
+from dead_letter import DeadLetterQueue, STAGE_NOTION, STAGE_OPEN
+from gincore_playwright import CRMSession, read_crm_field_values
+from notion_utils import NotionAPI
+from notion_writes import QUEUED
+from order_record import OrderRecord
+from run_log import log
+from run_stats import RunStats
+from sinks import MultiSink
+
+MAX_BODY_BYTES = 64 * 1024
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+            404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+def parse_rma_numbers(body: bytes) -> List[int]:
+    """
+    Akceptuje JSON ({"rma": 123}, {"rma": [1, 2]}, [1, 2], 123)
+    albo zwykły tekst z numerami oddzielonymi spacjami/przecinkami/nowymi liniami.
+    Numer niedodatni -> ValueError (odpowiedź 400).
+    """
+    text = body.decode("utf-8").strip()
+    if not text:
+        return []
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        payload = text.replace(",", " ").split()
+    if isinstance(payload, dict):
+        payload = payload.get("rma", [])
+    if not isinstance(payload, list):
+        payload = [payload]
+    numbers = [int(str(v).strip().lstrip("№").strip()) for v in payload]
+    bad = [n for n in numbers if n <= 0]
+    if bad:
+        raise ValueError(f"numer RMA musi być dodatni: {bad[0]}")
+    return numbers
+
+
+class IngestServer:
+    """
+    Lokalny nasłuch HTTP dla natychmiastowej synchronizacji pojedynczych RMA.
+    Zgłoszenia są deduplikowane (oczekujące + w trakcie), zbierane przez krótkie
+    okno i rozdzielane na pulę zalogowanych stron.
+
+    Zapis idzie tą samą drogą co sync (sinks z NotionWriteBuffer): istniejące
+    strony dostają tylko zmienione properties. Indeks Notion jest dociągany
+    przed każdą paczką (najwyżej co index_refresh s), żeby widzieć strony
+    utworzone w międzyczasie przez inne procesy.
+    """
+
+    def __init__(
+        self,
+        session: CRMSession,
+        pages: List[Page],
+        notion: NotionAPI,
+        sinks: MultiSink,
+        dlq: DeadLetterQueue,
+        stats: RunStats,
+        window: float = 0.25,
+        token: Optional[str] = None,
+        on_result: Optional[Callable[[int, str, float], None]] = None,
+        index_refresh: float = 5.0,
+    ):
+        self.session = session
+        self.pages = pages
+        self.notion = notion
+        self.sinks = sinks
+        self.index_refresh = index_refresh
+        self._index_synced = time.monotonic()
+        self.dlq = dlq
+        self.stats = stats
+        self.window = window
+        self.token = token
+        self.on_result = on_result
+        self._pending: Dict[int, float] = {}   # RMA -> czas przyjęcia
+        self._in_flight: Set[int] = set()
+        self._queued: Dict[int, float] = {}    # RMA w buforze zapisów -> czas przyjęcia
+        self._wakeup = asyncio.Event()
+        self._work: asyncio.Queue = asyncio.Queue()
+
+    # --- Przyjmowanie zgłoszeń ---
+    def submit(self, rma_numbers: List[int]) -> Tuple[List[int], List[int]]:
+        """Zwraca (przyjęte, pominięte duplikaty)."""
+        accepted, duplicates = [], []
+        now = time.monotonic()
+        for rma in rma_numbers:
+            if rma in self._pending or rma in self._in_flight:
+                duplicates.append(rma)
+                continue
+            self._pending[rma] = now
+            accepted.append(rma)
+        if accepted:
+            self._wakeup.set()
+        return accepted, duplicates
+
+    async def _coalescer(self):
+        while True:
+            await self._wakeup.wait()
+            # Krótkie okno – zbieramy zgłoszenia wysłane jedno po drugim
+            await asyncio.sleep(self.window)
+            self._wakeup.clear()
+            await self._refresh_index()
+            batch, self._pending = self._pending, {}
+            for rma, received in sorted(batch.items()):
+                self._in_flight.add(rma)
+                self._work.put_nowait((rma, received))
+
+    async def _refresh_index(self):
+        index = getattr(self.notion, "index", None)
+        if index is None or time.monotonic() - self._index_synced < self.index_refresh:
+            return
+        try:
+            await asyncio.to_thread(index.sync, self.notion)
+        except Exception as e:
+            log.warning("Nie udało się odświeżyć indeksu Notion: %s", e)
+        self._index_synced = time.monotonic()
+
+    async def _flusher(self):
+        """Wysyła bufor zapisów co NOTION_WRITE_INTERVAL, także gdy nie ma nowych zgłoszeń."""
+        while True:
+            await asyncio.sleep(config.NOTION_WRITE_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        """Wysyłka bufora; wynik i opóźnienie end-to-end RMA liczone dopiero po zapisie."""
+        queued, self._queued = self._queued, {}
+        try:
+            await asyncio.to_thread(self.sinks.flush)
+        finally:
+            failed = self.report_failures(queued)
+            for rma, received in queued.items():
+                if rma not in failed:
+                    self._finish(rma, "saved", received)
+
+    def report_failures(self, queued: Optional[Dict[int, float]] = None) -> Set[int]:
+        """Zapisy przyjęte do bufora, których wysyłka nie powiodła się później."""
+        failed = set()
+        for rma, name in self.sinks.take_failures():
+            self.stats.saved -= 1
+            self.stats.failed += 1
+            if name == "notion":
+                self.dlq.record(rma, STAGE_NOTION, "add_crm_data_to_notion zwróciło False")
+            received = (queued or {}).get(rma) or self._queued.pop(rma, None)
+            if rma not in failed:
+                self._finish(rma, "failed", received)
+            failed.add(rma)
+        return failed
+
+    def _finish(self, rma: int, outcome: str, received: Optional[float]):
+        latency = (time.monotonic() - received) * 1000 if received is not None else 0.0
+        if received is not None:
+            self.stats.observe("e2e", latency)
+        if self.on_result:
+            self.on_result(rma, outcome, latency)
+
+    async def _worker(self, page: Page):
+        while True:
+            rma, received = await self._work.get()
+            try:
+                outcome = await self._process(page, rma)
+            except Exception as e:
+                self.stats.failed += 1
+                self.dlq.record(rma, STAGE_OPEN, repr(e))
+                outcome = "error"
+            finally:
+                self._in_flight.discard(rma)
+            if outcome == QUEUED:
+                # Wynik i opóźnienie po wysyłce bufora (flush)
+                self._queued[rma] = received
+            else:
+                self._finish(rma, outcome, received)
+
+    async def _process(self, page: Page, rma: int) -> str:
+        page_ok, not_found = await self.session.open_repair_order(page, rma)
+        if not_found:
+            self.stats.not_found += 1
+            return "not_found"
+        if not page_ok:
+            self.stats.failed += 1
+            self.dlq.record(rma, STAGE_OPEN, "nie można wczytać strony zlecenia (wyczerpane ponowienia)")
+            return "failed"
+        self.stats.processed += 1
+        record = OrderRecord.from_crm(rma, await read_crm_field_values(page))
+        if not await asyncio.to_thread(self.sinks.write, record):
+            self.stats.saved += 1
+            return QUEUED
+        self.stats.failed += 1
+        self.dlq.record(rma, STAGE_NOTION, "add_crm_data_to_notion zwróciło False")
+        return "failed"
+
+    # --- HTTP ---
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            status, payload = await self._respond(reader)
+        except (ValueError, UnicodeDecodeError) as e:
+            status, payload = 400, {"error": str(e)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("ascii") + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _respond(self, reader: asyncio.StreamReader) -> Tuple[int, dict]:
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) < 2:
+            raise ValueError("niepoprawne żądanie HTTP")
+        method, path = request_line[0].upper(), request_line[1].split("?")[0]
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            return 401, {"error": "brak lub zły token"}
+
+        if path == "/health":
+            return 200, {
+                "pending": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "processed": self.stats.processed,
+                "saved": self.stats.saved,
+                "failed": self.stats.failed,
+            }
+        if path != "/rma":
+            return 404, {"error": "nieznana ścieżka"}
+        if method != "POST":
+            return 405, {"error": "dozwolone tylko POST"}
+
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            return 413, {"error": "za duże żądanie"}
+        body = await reader.readexactly(length) if length else b""
+        accepted, duplicates = self.submit(parse_rma_numbers(body))
+        return 202, {"accepted": accepted, "duplicates": duplicates}
+
+    async def serve(self, host: str, port: int):
+        tasks = [asyncio.create_task(self._coalescer()), asyncio.create_task(self._flusher())]
+        tasks += [asyncio.create_task(self._worker(page)) for page in self.pages]
+        server = await asyncio.start_server(self._handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def default_token() -> Optional[str]:
+    return os.getenv("INGEST_TOKEN") or None
@@ -0,0 +1,113 @@
+# latency.py
+import bisect
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+# Kubełki logarytmiczne: 10 ms ... ~60 s (+ kubełek przepełnienia)
+BUCKETS_MS: Tuple[int, ...] = tuple(round(10 * 1.25 ** i) for i in range(40))
+
+
+class LatencyHistogram:
+    """Histogram czasów w stałych kubełkach – stała pamięć niezależnie od liczby próbek."""
+
+    __slots__ = ("counts",)
+
+    def __init__(self, counts: Optional[List[float]] = None):
+        size = len(BUCKETS_MS) + 1
+        self.counts: List[float] = list(counts)[:size] if counts else []
+        self.counts += [0.0] * (size - len(self.counts))
+
+    def record(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+
+    @property
+    def total(self) -> float:
+        return sum(self.counts)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Górna granica kubełka zawierającego kwantyl q (0..1); None bez próbek."""
+        total = self.total
+        if total <= 0:
+            return None
+        target = q * total
+        seen = 0.0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float(BUCKETS_MS[-1]) * 1.25
+        return float(BUCKETS_MS[-1])
+
+    def decay(self, factor: float) -> None:
+        """Postarzenie historii – starsze próbki ważą coraz mniej (okno kroczące)."""
+        self.counts = [c * factor for c in self.counts]
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+
+# operacja -> (domyślny timeout, minimum, maksimum) w ms
+TIMEOUT_BOUNDS: Dict[str, Tuple[int, int, int]] = {
+    "order_goto": (5000, 1500, 30000),
+    "login_idle": (15000, 3000, 60000),
+    "search_idle": (8000, 2000, 30000),
+}
+
+
+class AdaptiveTimeouts:
+    """
+    Timeouty wyliczane z historii opóźnień: p(quantile) × safety, przycięte
+    do TIMEOUT_BOUNDS. Dopóki historia jest za krótka, obowiązują wartości
+    domyślne. Historia jest zapisywana między uruchomieniami i postarzana
+    przy każdym wczytaniu.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        safety: float = 2.0,
+        quantile: float = 0.99,
+        min_samples: int = 20,
+        decay: float = 0.5,
+    ):
+        self.path = path or config.LATENCY_FILE
+        self.safety = safety
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._load(decay)
+
+    def _load(self, decay: float) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        for op, counts in raw.items():
+            hist = LatencyHistogram(counts)
+            hist.decay(decay)
+            self.histograms[op] = hist
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({op: h.counts for op, h in self.histograms.items()}, f)
+        os.replace(tmp, self.path)
+
+    def observe(self, op: str, ms: float) -> None:
+        """Zapisuje czas operacji; timeout zapisujemy jako jego limit (próbka ucięta)."""
+        self.histograms.setdefault(op, LatencyHistogram()).record(ms)
+
+    def timeout_ms(self, op: str) -> int:
+        default, lo, hi = TIMEOUT_BOUNDS.get(op, (30000, 1000, 60000))
+        hist = self.histograms.get(op)
+        if hist is None or hist.total < self.min_samples:
+            return default
+        p = hist.percentile(self.quantile)
+        return int(min(max(p * self.safety, lo), hi))
+
+    def snapshot(self) -> Dict[str, int]:
+        return {op: self.timeout_ms(op) for op in TIMEOUT_BOUNDS}
@@ -0,0 +1,137 @@
+# locators.py
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from rich.markup import escape
+from rich.table import Table
+
+import config
+
+Locator = Tuple[str, str]
+
+
+class FieldValues(dict):
+    """
+    Wynik odczytu pól zlecenia: pole -> wartość (None = puste albo brak).
+    found rozróżnia te przypadki: pola, których element się znalazł. Pole spoza
+    found (łańcuch nie trafił – zmiana strony, za wolne ładowanie) nie może
+    czyścić wartości zapisanej w Notion.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.found: Set[str] = set()
+
+
+def locator_chain(spec) -> List[Locator]:
+    """("xpath", "...") albo lista takich par -> lista alternatyw w kolejności."""
+    if len(spec) == 2 and all(isinstance(part, str) for part in spec):
+        return [tuple(spec)]
+    return [tuple(alt) for alt in spec]
+
+
+@dataclass
+class FieldHits:
+    first: int = 0       # trafienie pierwszym (zapamiętanym) lokatorem
+    fallback: int = 0    # trafienie którąś z kolejnych alternatyw
+    misses: int = 0      # żadna alternatywa nie znalazła elementu
+    switches: int = 0    # zmiany zapamiętanego lokatora
+
+    @property
+    def total(self) -> int:
+        return self.first + self.fallback + self.misses
+
+
+@dataclass
+class LocatorChains:
+    """
+    Łańcuchy alternatywnych lokatorów pól zlecenia. Lokator, który ostatnio
+    zadziałał, jest próbowany jako pierwszy (i zapisywany w path między
+    uruchomieniami), więc zmiana znaczników w CRM kosztuje jedną nieudaną
+    próbę na pole, a nie timeout przy każdym zleceniu.
+    """
+
+    chains: Dict[str, List[Locator]]
+    path: Optional[str] = None
+    winners: Dict[str, int] = field(default_factory=dict)
+    hits: Dict[str, FieldHits] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.hits = {f: FieldHits() for f in self.chains}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, loc in saved.items():
+            chain = self.chains.get(name)
+            if chain and tuple(loc) in chain:
+                self.winners[name] = chain.index(tuple(loc))
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {name: list(self.chains[name][i]) for name, i in self.winners.items()}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def ordered(self, name: str) -> List[Tuple[int, Locator]]:
+        """(indeks, lokator) – zapamiętany zwycięzca, potem reszta w kolejności configu."""
+        chain = self.chains[name]
+        first = self.winners.get(name, 0)
+        return [(first, chain[first])] + [(i, loc) for i, loc in enumerate(chain) if i != first]
+
+    def hit(self, name: str, index: int, first: bool) -> None:
+        stats = self.hits[name]
+        if first:
+            stats.first += 1
+            return
+        stats.fallback += 1
+        if self.winners.get(name, 0) != index:
+            self.winners[name] = index
+            stats.switches += 1
+
+    def miss(self, name: str) -> None:
+        self.hits[name].misses += 1
+
+    def report_table(self, title: str = "Lokatory pól") -> Table:
+        table = Table(title=title)
+        for col in ("Pole", "Trafność 1. próby", "Zapasowe", "Braki", "Aktualny lokator"):
+            table.add_column(col)
+        for name, stats in self.hits.items():
+            if not stats.total:
+                continue
+            rate = 100.0 * stats.first / stats.total
+            kind, value = self.chains[name][self.winners.get(name, 0)]
+            shown = value if len(value) <= 50 else value[:47] + "..."
+            table.add_row(name, f"{rate:.0f}% z {stats.total}", str(stats.fallback), str(stats.misses),
+                          escape(f"{kind}: {shown}"))
+        return table
+
+    @property
+    def used(self) -> bool:
+        return any(s.total for s in self.hits.values())
+
+
+_registry: Dict[int, LocatorChains] = {}
+
+
+def chains_for(cfg=None) -> LocatorChains:
+    """Jeden zestaw łańcuchów na konfigurację (moduł config albo TenantConfig)."""
+    cfg = cfg or config
+    chains = _registry.get(id(cfg))
+    if chains is None:
+        chains = LocatorChains(
+            {name: locator_chain(spec) for name, spec in cfg.CRM_DATA_FIELDS_TO_READ.items()},
+            path=os.path.join(cfg.STATE_DIR, "locators.json"),
+        )
+        _registry[id(cfg)] = chains
+    return chains
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 import argparse
 import asyncio
+import logging
 import os
 import sys
 import select
+import time
+from contextlib import nullcontext
 from getpass import getpass
+from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
 from rich.console import Console
@@ -15,137 +19,949 @@ from playwright.async_api import async_playwright
 
 import config
 from notion_utils import NotionAPI
+from rate_budget import SharedRateLimiter, shared_limiter
+from dead_letter import DeadLetterQueue, STAGE_NOTION, STAGE_OPEN
+from run_stats import RunStats
+from page_pool import PageRecycler, RecycleInfo
+from latency import AdaptiveTimeouts
+from ingest_server import IngestServer, default_token
+from cost_estimate import CostEstimate, OrderSample, payload_bytes, sample_rmas
+from sinks import MultiSink, build_sinks
+from status_writeback import StatusLog, plan_changes
+from rescrape_scheduler import PageLoadBudget, plan_rescrape
+from field_hashes import FieldHashStore
+from notion_writes import UNCHANGED, NotionWriteBuffer
+from locators import chains_for
+from negative_cache import NegativeCache
+from notion_index import NotionIndex
+from order_record import OrderRecord
+from profiling import RunProfiler, SlowOrderTracer
+from run_history import RunHistory, history_tables, record_run
+from run_log import event, setup_logging
+from tenants import FairSlots, TenantConfig, load_tenants
+from scraper import BACKENDS, PlaywrightScraper, Scraper, open_scrapers
+from order_fetch import RequestFetcher
 from gincore_playwright import (
     BROWSERLESS_WS,
-    login,
-    open_repair_order,
+    CRMSession,
     read_crm_field_values,
+    set_order_status,
 )
 
-# Kolejność i kolory pól w tabeli
-ORDERED_FIELDS = [
-    ("RMA", "RMA"),
-    ("Klient", "Klient"),
-    ("Numer telefonu", "Numer telefonu"),
-    ("Typ urządzenia", "Typ urządzenia"),
-    ("Producent", "Producent"),
-    ("Model", "Model"),
-    ("Numer Seryjny", "Numer Seryjny"),
-    ("Opis Usterki", "Opis Usterki"),
-    ("Stan wizualny urządzenia", "Stan wizualny urządzenia"),
-    ("Technik", "Technik"),
-    ("Uwagi", "Uwagi"),
-    ("URL", "URL"),
-]
-FIELD_COLORS = {
-    "RMA": "bold cyan",
-    "Klient": "bright_blue",
-    "Numer telefonu": "bright_cyan",
-    "Typ urządzenia": "green",
-    "Producent": "bright_green",
-    "Model": "bright_green",
-    "Numer Seryjny": "magenta",
-    "Opis Usterki": "yellow",
-    "Stan wizualny urządzenia": "yellow",
-    "Technik": "bright_green",
-    "Uwagi": "bright_magenta",
-    "URL": "bright_blue",
-}
-
 console = Console()
 
+def print_crm_table(record: OrderRecord) -> None:
+    """Wyświetla kolorową tabelę z danymi zlecenia."""
+    table = Table(show_header=False)
+    table.add_column("Pole", style="bold", width=28)
+    table.add_column("Wartość", style="white", overflow="fold")
+    for label, value in record.table_rows():
+        table.add_row(label, value)
+    console.print(table)
+
+def open_notion_index(notion: NotionAPI, path: Optional[str] = None, label: str = "") -> NotionIndex:
+    """
+    Lokalny indeks stron Notion dociągnięty o zmiany od ostatniego kursora
+    i podpięty pod notion (sprawdzanie duplikatów przed pages.create).
+    Błąd pobierania zostawia indeks z poprzedniego stanu.
+    """
+    index = NotionIndex(path)
+    prefix = f"{label}: " if label else ""
+    try:
+        changed = index.sync(notion)
+        console.print(f"[dim]{prefix}indeks Notion: {changed} zmienionych stron, razem {len(index)}.[/dim]")
+    except Exception as e:
+        logging.exception("Błąd odświeżania indeksu Notion: %s", e)
+        console.print(f"[yellow]{prefix}nie udało się odświeżyć indeksu Notion – używam zapisanego.[/yellow]")
+    notion.index = index
+    return index
+
+def report_locators(cfg=None, title: str = "Lokatory pól") -> None:
+    """Zapisuje zapamiętane lokatory i pokazuje trafność łańcuchów z tego przebiegu."""
+    chains = chains_for(cfg)
+    chains.save()
+    if chains.used:
+        console.print(chains.report_table(title))
+
+def report_deferred_failures(sinks: MultiSink, stats: RunStats, dlq: DeadLetterQueue, label: str = "") -> None:
+    """Zapisy przyjęte do bufora Notion, których wysyłka nie powiodła się później."""
+    for rma, name in sinks.take_failures():
+        stats.saved -= 1
+        stats.failed += 1
+        console.print(f"[red]{label}Błąd przy zapisie RMA {rma} do: {name}.[/red]")
+        if name == "notion":
+            dlq.record(rma, STAGE_NOTION, "add_crm_data_to_notion zwróciło False")
+
 # ------------------- Funkcje główne -------------------
 
-async def sync_all():
-    """Skanuje i dodaje kolejne RMA aż do pierwszego braku zgłoszenia."""
-    notion = NotionAPI()
-    last = notion.get_last_repair_order_number()
-    start_rma = int(last) + 1 if last else 1
+async def sync_all(
+    max_consecutive_failures: int = 5,
+    queue_size: int = 8,
+    recycle_after: int = 500,
+    max_heap_mb: float = 512.0,
+    recycle_context: bool = False,
+    sink_specs: Optional[List[str]] = None,
+    start: Optional[int] = None,
+    tracer: Optional[SlowOrderTracer] = None,
+    fetch_mode: str = "render",
+    fetch_window: int = 8,
+    prefetch: int = 0,
+):
+    """
+    Skanuje i dodaje kolejne RMA aż do pierwszego braku zgłoszenia.
+    RMA, których nie udało się wczytać mimo ponowień, trafiają do kolejki
+    nieudanych, a skan idzie dalej (do max_consecutive_failures z rzędu).
+
+    Odczyt z CRM i zapis do Notion działają potokowo przez ograniczoną kolejkę,
+    więc pamięć nie rośnie z liczbą RMA; strona przeglądarki jest wymieniana
+    co recycle_after nawigacji albo po przekroczeniu max_heap_mb.
+
+    Rekordy trafiają do celów z sink_specs (domyślnie tylko Notion); eksport
+    bez Notion zaczyna od start (albo od 1).
+
+    fetch_mode="request" pobiera HTML zleceń przez request API kontekstu
+    (bez renderowania), do fetch_window RMA naraz; wyniki są przetwarzane
+    w kolejności, a pobrania za końcem zakresu są anulowane.
+
+    W trybie render prefetch > 0 otwiera z wyprzedzeniem kolejne RMA na
+    zapasowych stronach (najwyżej prefetch dodatkowych), gdy bieżące jest
+    jeszcze odczytywane i zapisywane. Nie łączy się z tracerem (jeden ślad
+    obejmowałby kilka zleceń naraz) ani z recycle_context (strony zapasowe
+    dzielą kontekst z główną).
+    """
+    sink_specs = sink_specs or ["notion"]
+    uses_notion = any(spec.split(":")[0] == "notion" for spec in sink_specs)
+    notion = NotionAPI() if uses_notion else None
+    index = open_notion_index(notion) if notion else None
+    hashes = FieldHashStore() if uses_notion else None
+    stats = RunStats()
+    sinks = build_sinks(sink_specs, notion=notion, hashes=hashes, stats=stats)
+    dlq = DeadLetterQueue()
+    missing = NegativeCache()
+    loads = PageLoadBudget()
+    timeouts = AdaptiveTimeouts()
+    if start is not None:
+        start_rma = start
+    else:
+        last = index.last_rma() if index else None
+        start_rma = int(last) + 1 if last else 1
+        if last:
+            missing.note_existing(int(last))
     current = start_rma
+    records: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+    prefetch = max(0, prefetch) if fetch_mode == "render" else 0
+    if prefetch and (recycle_context or tracer):
+        raise ValueError("prefetch nie łączy się z recycle_context ani z tracerem (--profile)")
+
+    def report_recycle(info: RecycleInfo):
+        stats.recycles += 1
+        heap = f"{info.browser_heap_mb:.0f} MB" if info.browser_heap_mb is not None else "?"
+        console.print(
+            f"[dim]Wymiana strony ({info.reason}): RSS Pythona {info.python_rss_mb:.0f} MB, "
+            f"sterta przeglądarki {heap}.[/dim]"
+        )
+
+    async def write(record: OrderRecord):
+        rma = record.rma
+        print_crm_table(record)
+        t0 = time.monotonic()
+        failed = await asyncio.to_thread(sinks.write, record)
+        ms = (time.monotonic() - t0) * 1000
+        stats.observe("write", ms)
+        event("order", rma=rma, stage="write", ms=round(ms), outcome="failed" if failed else "ok",
+              failed_sinks=failed or None)
+        if not failed:
+            stats.saved += 1
+            console.print(f"[green]Zapisano RMA {rma} ({', '.join(sinks.names)}).[/green]")
+        else:
+            stats.failed += 1
+            console.print(f"[red]Błąd przy zapisie RMA {rma} do: {', '.join(failed)}.[/red]")
+            # Replay umie powtórzyć tylko zapis do Notion
+            if "notion" in failed:
+                dlq.record(rma, STAGE_NOTION, "add_crm_data_to_notion zwróciło False")
+
+    async def writer():
+        # Wyjątek nie może zakończyć zadania – skan czekałby w nieskończoność na pełnej kolejce
+        while True:
+            idle = False
+            try:
+                record = await asyncio.wait_for(records.get(), timeout=config.NOTION_WRITE_INTERVAL)
+            except asyncio.TimeoutError:
+                record, idle = None, True
+            if record is None and not idle:
+                return
+            try:
+                if idle:
+                    # Skan stoi (ponowienia, relogin) – bufor Notion nie może czekać na kolejny rekord
+                    await asyncio.to_thread(sinks.flush_if_due)
+                else:
+                    await write(record)
+                report_deferred_failures(sinks, stats, dlq)
+            except Exception as e:
+                logging.exception("Błąd zapisu: %s", e)
+                if record is not None:
+                    stats.failed += 1
+                    dlq.record(record.rma, STAGE_NOTION, f"wyjątek przy zapisie: {e}")
+
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.connect_over_cdp(BROWSERLESS_WS)
+            context = browser.contexts[0] if browser.contexts else await browser.new_context()
+            recycler = PageRecycler(
+                browser,
+                context,
+                max_navigations=recycle_after,
+                max_heap_mb=max_heap_mb,
+                recycle_context=recycle_context,
+                on_recycle=report_recycle,
+            )
+            page = await recycler.start()
+
+            session = CRMSession(config.CRM_USERNAME, config.CRM_PASSWORD, stats=stats, timeouts=timeouts,
+                                 missing=missing)
+            consecutive_failures = 0
+            writer_task = None
+            fetcher = None
+            ahead: Dict[int, asyncio.Task] = {}
+            spares: List[PageRecycler] = []
+            try:
+                await session.login(page)
+                writer_task = asyncio.create_task(writer())
+
+                if fetch_mode == "request":
+                    # Strona recyklera służy tu tylko do logowania i pól wymagających JS
+                    fetcher = RequestFetcher(session, recycler.context, page, concurrency=fetch_window)
+
+                # Pula stron dla wyprzedzania: główna + najwyżej prefetch zapasowych
+                idle: asyncio.Queue = asyncio.Queue()
+                if prefetch:
+                    idle.put_nowait(recycler)
+                    for _ in range(prefetch):
+                        spare = PageRecycler(
+                            browser,
+                            recycler.context,
+                            max_navigations=recycle_after,
+                            max_heap_mb=max_heap_mb,
+                            on_recycle=report_recycle,
+                        )
+                        await spare.start()
+                        spares.append(spare)
+                        idle.put_nowait(spare)
+
+                async def load(rma: int):
+                    """Otwiera i odczytuje RMA na pierwszej wolnej stronie z puli."""
+                    worker: PageRecycler = await idle.get()
+                    try:
+                        page_ok, not_found = await session.open_repair_order(worker.page, rma)
+                        crm_data = None
+                        if page_ok:
+                            t0 = time.monotonic()
+                            crm_data = await read_crm_field_values(worker.page)
+                            ms = (time.monotonic() - t0) * 1000
+                            stats.observe("extract", ms)
+                            event("order", rma=rma, stage="extract", ms=round(ms), outcome="ok")
+                        await worker.after_navigation()
+                        return page_ok, not_found, crm_data
+                    finally:
+                        idle.put_nowait(worker)
+
+                async def scrape(rma: int):
+                    """(page_ok, not_found, dane) dla RMA – renderowanie albo request API."""
+                    nonlocal page
+                    if fetcher is not None:
+                        for nxt in range(rma, rma + max(1, fetch_window)):
+                            if nxt not in ahead:
+                                ahead[nxt] = asyncio.create_task(fetcher.fetch(nxt))
+                        t0 = time.monotonic()
+                        result = await ahead.pop(rma)
+                        stats.observe("fetch", (time.monotonic() - t0) * 1000)
+                        return result
+                    if prefetch:
+                        for nxt in range(rma, rma + 1 + prefetch):
+                            if nxt not in ahead:
+                                ahead[nxt] = asyncio.create_task(load(nxt))
+                        return await ahead.pop(rma)
+
+                    order_t0 = time.monotonic()
+                    if tracer:
+                        await tracer.begin(recycler.context)
+                    page_ok, not_found = await session.open_repair_order(page, rma)
+                    crm_data = None
+                    if page_ok:
+                        t0 = time.monotonic()
+                        crm_data = await read_crm_field_values(page)
+                        ms = (time.monotonic() - t0) * 1000
+                        stats.observe("extract", ms)
+                        event("order", rma=rma, stage="extract", ms=round(ms), outcome="ok")
+                    if tracer:
+                        await tracer.end(recycler.context, rma, (time.monotonic() - order_t0) * 1000)
+                    page = await recycler.after_navigation()
+                    return page_ok, not_found, crm_data
+
+                with Progress(
+                    SpinnerColumn(),
+                    TextColumn("[progress.description]{task.description}"),
+                    console=console,
+                ) as progress:
+                    task = progress.add_task("Skanowanie...", total=None)
+
+                    while True:
+                        console.print(f"\n[bold]Przetwarzanie RMA {current}[/bold]")
+
+                        page_ok, not_found, crm_data = await scrape(current)
+                        # Nowe RMA zużywają budżet wczytań jako pierwsze i nigdy na niego nie czekają
+                        loads.charge()
+                        if not_found:
+                            stats.not_found += 1
+                            if missing.is_interior(current):
+                                # Dalej są znane zlecenia – to usunięty numer, nie koniec zakresu
+                                console.print(f"[dim]RMA {current} nie istnieje (luka w numeracji) – idę dalej.[/dim]")
+                                current += 1
+                                continue
+                            console.print(f"[yellow]RMA {current} nie istnieje. Kończę skanowanie.[/yellow]")
+                            break
+                        if not page_ok:
+                            stats.failed += 1
+                            consecutive_failures += 1
+                            dlq.record(current, STAGE_OPEN, "nie można wczytać strony zlecenia (wyczerpane ponowienia)")
+                            if consecutive_failures >= max_consecutive_failures:
+                                console.print(
+                                    f"[red]{consecutive_failures} RMA z rzędu nie dało się wczytać. Kończę skanowanie.[/red]"
+                                )
+                                break
+                            console.print(f"[red]Nie można wczytać RMA {current} – dodano do kolejki, idę dalej.[/red]")
+                            current += 1
+                            continue
+                        consecutive_failures = 0
+                        stats.processed += 1
+
+                        # Czeka, gdy zapis do Notion nie nadąża – kolejka jest ograniczona
+                        await records.put(OrderRecord.from_crm(current, crm_data))
+
+                        current += 1
+                        progress.advance(task)
+            finally:
+                # Pobrania za końcem zakresu (albo przerwane błędem) są zbędne
+                for pending in ahead.values():
+                    pending.cancel()
+                await asyncio.gather(*ahead.values(), return_exceptions=True)
+                if prefetch and ahead:
+                    console.print(f"[dim]Anulowano {len(ahead)} RMA otwieranych z wyprzedzeniem.[/dim]")
+                for spare in spares:
+                    await spare.close()
+
+                # Zapisy już odczytanych RMA i bufor Notion muszą wyjść także po błędzie
+                if writer_task is not None and not writer_task.done():
+                    await records.put(None)
+                    await writer_task
+                await asyncio.to_thread(sinks.close)
+                report_deferred_failures(sinks, stats, dlq)
+
+                if tracer:
+                    await tracer.close(recycler.context)
+                await recycler.close()
+                await recycler.context.close()
+                await browser.close()
+    finally:
+        if hashes is not None:
+            hashes.close()
+        if index is not None:
+            index.close()
+        dlq.close()
+        missing.close()
+        loads.close()
+        timeouts.save()
+    stats.timeouts = timeouts.snapshot()
+    if notion is not None:
+        stats.rate_wait = notion.limiter.waited
+        stats.bytes_out = notion.bytes_sent
+    report_locators()
+    console.print(stats.summary_table())
+    record_run(stats, "sync")
+
+async def estimate_sync(
+    start: Optional[int] = None,
+    count: int = 1000,
+    sample: int = 20,
+    fetch_mode: str = "render",
+    fetch_window: int = 8,
+    prefetch: int = 0,
+    notion_rate: Optional[float] = None,
+):
+    """
+    Dry-run: otwiera i odczytuje próbkę RMA z zakresu, buduje payloady Notion
+    bez wysyłania i prognozuje czas, liczbę wywołań, bajty i czekanie na limit
+    dla podanych ustawień równoległości. Nic nie jest zapisywane.
+    """
+    if start is None:
+        # Tylko lokalny indeks – dry-run nie wysyła nic do Notion
+        index = NotionIndex()
+        last = index.last_rma()
+        index.close()
+        start = int(last) + 1 if last else 1
+    end = start + max(1, count) - 1
+    parallel = max(1, fetch_window) if fetch_mode == "request" else 1 + max(0, prefetch)
+    estimate = CostEstimate(end - start + 1, fetch_mode, parallel, notion_rate or config.NOTION_RATE_LIMIT)
+    notion = NotionAPI()
+    targets = sample_rmas(start, end, max(1, sample))
+    console.print(f"[bold]Dry-run: próbka {len(targets)} RMA z zakresu {start}–{end}.[/bold]")
 
     async with async_playwright() as p:
         browser = await p.chromium.connect_over_cdp(BROWSERLESS_WS)
         context = browser.contexts[0] if browser.contexts else await browser.new_context()
         page = await context.new_page()
+        try:
+            session = CRMSession(config.CRM_USERNAME, config.CRM_PASSWORD)
+            await session.login(page)
+            fetcher = RequestFetcher(session, context, page, concurrency=1) if fetch_mode == "request" else None
+            for rma in targets:
+                t0 = time.monotonic()
+                if fetcher is not None:
+                    page_ok, _, crm_data = await fetcher.fetch(rma)
+                    open_ms, extract_ms = (time.monotonic() - t0) * 1000, 0.0
+                else:
+                    page_ok, _ = await session.open_repair_order(page, rma)
+                    open_ms = (time.monotonic() - t0) * 1000
+                    t1 = time.monotonic()
+                    crm_data = await read_crm_field_values(page) if page_ok else None
+                    extract_ms = (time.monotonic() - t1) * 1000
+                result = OrderSample(rma, bool(page_ok and crm_data), open_ms, extract_ms)
+                if result.found:
+                    payloads = notion.create_payloads(OrderRecord.from_crm(rma, crm_data))
+                    result.api_calls, result.bytes = len(payloads), payload_bytes(payloads)
+                estimate.samples.append(result)
+                state = "jest" if result.found else "brak"
+                console.print(f"[dim]RMA {rma}: {state}, {open_ms:.0f} + {extract_ms:.0f} ms.[/dim]")
+        finally:
+            await page.close()
+            await context.close()
+            await browser.close()
 
-        await login(page, config.CRM_USERNAME, config.CRM_PASSWORD)
+    console.print(estimate.table())
+    if not estimate.found:
+        console.print("[yellow]W próbce nie ma istniejących zleceń – prognoza Notion jest zerowa.[/yellow]")
 
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            console=console,
-        ) as progress:
-            task = progress.add_task("Skanowanie...", total=None)
+async def sync_single(
+    rma_num: int,
+    sink_specs: Optional[List[str]] = None,
+    tracer: Optional[SlowOrderTracer] = None,
+    backend: str = "playwright",
+):
+    """Dodaje pojedyncze zgłoszenie o numerze RMA."""
+    sink_specs = sink_specs or ["notion"]
+    notion = NotionAPI() if any(spec.split(":")[0] == "notion" for spec in sink_specs) else None
+    index = open_notion_index(notion) if notion else None
+    hashes = FieldHashStore() if notion else None
+    stats = RunStats()
+    sinks = build_sinks(sink_specs, notion=notion, hashes=hashes, stats=stats)
+    dlq = DeadLetterQueue()
+    timeouts = AdaptiveTimeouts()
+    async with open_scrapers(backend, 1, stats=stats, timeouts=timeouts) as (scraper,):
+        # Ślady Playwright mają sens tylko dla backendu Playwright
+        context = scraper.page.context if isinstance(scraper, PlaywrightScraper) else None
+        tracer = tracer if context else None
+        order_t0 = time.monotonic()
+        if tracer:
+            await tracer.begin(context)
+        page_ok, not_found = await scraper.open_repair_order(rma_num)
+        if not not_found and not page_ok:
+            stats.failed += 1
+            dlq.record(rma_num, STAGE_OPEN, "nie można wczytać strony zlecenia")
+        if not_found or not page_ok:
+            console.print(f"[yellow]RMA {rma_num} nie istnieje lub nie można wczytać strony.[/yellow]")
+        else:
+            record = OrderRecord.from_crm(rma_num, await scraper.read_crm_field_values())
+            stats.processed += 1
+            print_crm_table(record)
+            failed = sinks.write(record)
+            if not failed:
+                stats.saved += 1
+                console.print(f"[green]Zapisano RMA {rma_num} ({', '.join(sinks.names)}).[/green]")
+            else:
+                stats.failed += 1
+                console.print(f"[red]Błąd przy zapisie RMA {rma_num} do: {', '.join(failed)}.[/red]")
+                if "notion" in failed:
+                    dlq.record(rma_num, STAGE_NOTION, "add_crm_data_to_notion zwróciło False")
+        if tracer:
+            await tracer.end(context, rma_num, (time.monotonic() - order_t0) * 1000)
+            await tracer.close(context)
+    sinks.close()
+    report_deferred_failures(sinks, stats, dlq)
+    if hashes is not None:
+        hashes.close()
+    if index is not None:
+        index.close()
+    dlq.close()
+    timeouts.save()
+    stats.timeouts = timeouts.snapshot()
+    if notion is not None:
+        stats.rate_wait = notion.limiter.waited
+        stats.bytes_out = notion.bytes_sent
+    report_locators()
+    console.print(stats.summary_table())
+    record_run(stats, "single")
 
-            while True:
-                console.print(f"\n[bold]Przetwarzanie RMA {current}[/bold]")
+async def _sync_tenant(browser, tenant: TenantConfig, slots: FairSlots, limiter: SharedRateLimiter,
+                       max_consecutive_failures: int = 5) -> RunStats:
+    """Skan nowych RMA jednego najemcy; nawigacje dzielą pulę miejsc z innymi."""
+    notion = NotionAPI(tenant.NOTION_API_TOKEN, tenant.NOTION_DATABASE_ID, limiter=limiter,
+                       users=tenant.USERS_NAME_TO_NOTION_ID_MAP)
+    hashes = FieldHashStore(tenant.FIELD_HASHES_DB)
+    stats = RunStats()
+    sinks = build_sinks(["notion"], notion=notion, hashes=hashes, stats=stats)
+    dlq = DeadLetterQueue(tenant.DEAD_LETTER_DB)
+    missing = NegativeCache(tenant.NEGATIVE_CACHE_DB)
+    timeouts = AdaptiveTimeouts(tenant.LATENCY_FILE)
 
-                page_ok, not_found = await open_repair_order(page, current)
-                if not_found or not page_ok:
-                    console.print(
-                        f"[yellow]RMA {current} nie istnieje lub nie można wczytać strony. Kończę skanowanie.[/yellow]"
-                    )
-                    break
+    index = await asyncio.to_thread(open_notion_index, notion, tenant.NOTION_INDEX_DB, tenant.name)
+    last = index.last_rma()
+    current = int(last) + 1 if last else 1
+    if last:
+        missing.note_existing(int(last))
+    context = await browser.new_context()
+    page = await context.new_page()
+    session = CRMSession(tenant.CRM_USERNAME, tenant.CRM_PASSWORD, stats=stats, timeouts=timeouts, cfg=tenant,
+                         missing=missing)
+    consecutive_failures = 0
 
-                crm_data = await read_crm_field_values(page)
-                crm_data["RMA"] = str(current)
-                crm_data["URL"] = f"{config.CRM_REPAIR_ORDER_BASE_URL}{current}"
-
-                # Kolorowa tabela
-                table = Table(show_header=False)
-                table.add_column("Pole", style="bold", width=28)
-                table.add_column("Wartość", style="white", overflow="fold")
-                for disp_name, key in ORDERED_FIELDS:
-                    value = crm_data.get(key) or "-"
-                    color = FIELD_COLORS.get(disp_name, "white")
-                    table.add_row(f"[{color}]{disp_name}[/{color}]", value)
-                console.print(table)
-
-                if notion.add_crm_data_to_notion(crm_data):
-                    console.print(f"[green]Zapisano RMA {current} w Notion.[/green]")
-                else:
-                    console.print(f"[red]Błąd przy zapisie RMA {current} do Notion.[/red]")
+    async def flusher():
+        # Wolny najemca (czekanie na miejsce, ponowienia) nie może trzymać zapisów w buforze
+        while True:
+            await asyncio.sleep(config.NOTION_WRITE_INTERVAL)
+            try:
+                await asyncio.to_thread(sinks.flush_if_due)
+                report_deferred_failures(sinks, stats, dlq, f"{tenant.name}: ")
+            except Exception as e:
+                logging.exception("%s: błąd wysyłki bufora Notion: %s", tenant.name, e)
+
+    flush_task = asyncio.create_task(flusher())
+    try:
+        await slots.acquire(tenant.name)
+        try:
+            await session.login(page)
+        finally:
+            slots.release()
 
+        while True:
+            await slots.acquire(tenant.name)
+            try:
+                page_ok, not_found = await session.open_repair_order(page, current)
+                crm_data = await read_crm_field_values(page, tenant) if page_ok else None
+            finally:
+                slots.release()
+
+            if not_found:
+                stats.not_found += 1
+                if missing.is_interior(current):
+                    current += 1
+                    continue
+                break
+            if not page_ok:
+                stats.failed += 1
+                consecutive_failures += 1
+                dlq.record(current, STAGE_OPEN, "nie można wczytać strony zlecenia (wyczerpane ponowienia)")
+                if consecutive_failures >= max_consecutive_failures:
+                    break
                 current += 1
-                progress.advance(task)
+                continue
+            consecutive_failures = 0
+            stats.processed += 1
 
+            record = OrderRecord.from_crm(current, crm_data, tenant.CRM_REPAIR_ORDER_BASE_URL)
+            failed = await asyncio.to_thread(sinks.write, record)
+            if failed:
+                stats.failed += 1
+                dlq.record(current, STAGE_NOTION, "add_crm_data_to_notion zwróciło False")
+                console.print(f"[red]{tenant.name}: Błąd przy zapisie RMA {current} do Notion.[/red]")
+            else:
+                stats.saved += 1
+                console.print(f"[green]{tenant.name}: Zapisano RMA {current}.[/green]")
+            report_deferred_failures(sinks, stats, dlq, f"{tenant.name}: ")
+            current += 1
+    finally:
+        flush_task.cancel()
+        await asyncio.gather(flush_task, return_exceptions=True)
         await page.close()
         await context.close()
+        await asyncio.to_thread(sinks.close)
+        report_deferred_failures(sinks, stats, dlq, f"{tenant.name}: ")
+        hashes.close()
+        index.close()
+        dlq.close()
+        missing.close()
+        timeouts.save()
+    stats.timeouts = timeouts.snapshot()
+    stats.rate_wait = notion.rate_wait
+    stats.bytes_out = notion.bytes_sent
+    return stats
+
+async def sync_tenants(path: Optional[str] = None, only: Optional[List[str]] = None,
+                       slots: int = 4, notion_rate: Optional[float] = None):
+    """
+    Synchronizuje wiele instancji CRM (punktów serwisowych) w jednym procesie:
+    jedno połączenie z przeglądarką, wspólna pula nawigacji rozdzielana po kolei
+    między najemców i wspólny limit zapytań do Notion.
+    """
+    try:
+        tenants = load_tenants(path, only)
+    except FileNotFoundError:
+        console.print(f"[red]Brak pliku najemców {path or config.TENANTS_FILE} "
+                      f"(wzór: tenants.json.example, opcja --file).[/red]")
+        return
+    if not tenants:
+        console.print("[yellow]Brak najemców w pliku konfiguracji.[/yellow]")
+        return
+    # Budżet per token: najemcy z tą samą integracją dzielą go także z innymi procesami
+    limiters = {t.NOTION_API_TOKEN: shared_limiter(t.NOTION_API_TOKEN, notion_rate) for t in tenants}
+    fair = FairSlots(slots)
+    console.print(f"[bold]Synchronizuję {len(tenants)} najemców (miejsca: {slots}).[/bold]")
+
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(BROWSERLESS_WS)
+        results = await asyncio.gather(
+            *(_sync_tenant(browser, t, fair, limiters[t.NOTION_API_TOKEN]) for t in tenants),
+            return_exceptions=True,
+        )
         await browser.close()
 
-async def sync_single(rma_num: int):
-    """Dodaje pojedyncze zgłoszenie o numerze RMA."""
+    for tenant, result in zip(tenants, results):
+        if isinstance(result, Exception):
+            console.print(f"[red]{tenant.name}: przerwano – {result!r}[/red]")
+        else:
+            console.print(result.summary_table(title=f"Podsumowanie: {tenant.name}"))
+            record_run(result, "tenants", tenant.name)
+        report_locators(tenant, title=f"Lokatory pól: {tenant.name}")
+    waited = sum(l.waited for l in limiters.values())
+    console.print(f"[dim]Czekanie na limit Notion: {waited:.1f} s.[/dim]")
+
+async def refresh_open(concurrency: int = 3, scheduled: bool = False, budget: Optional[int] = None):
+    """
+    Odświeża otwarte zgłoszenia: ponownie czyta RMA, których status w Notion
+    nie jest zamknięty, i wysyła pages.update tylko ze zmienionymi polami
+    (przez bufor scalający zapisy tego samego RMA). Gdy zmienił się pełny
+    tekst długiego pola, podmieniana jest też jego sekcja w treści strony.
+
+    scheduled=True zamiast wszystkich otwartych bierze RMA o najwyższym
+    priorytecie (status, świeżość edycji, częstość zmian przy odczytach) –
+    tyle, ile zostało z godzinowego budżetu wczytań po nowych RMA z sync.
+    """
     notion = NotionAPI()
+    hashes = FieldHashStore()
+    missing = NegativeCache()
+    loads = PageLoadBudget(per_hour=budget)
+    stats = RunStats()
+    writes = NotionWriteBuffer(notion, hashes, stats=stats)
+    timeouts = AdaptiveTimeouts()
+    index = open_notion_index(notion)
+    if scheduled:
+        available = loads.available()
+        planned = plan_rescrape(index.edited_since(None), hashes, available)
+        targets = [(page_id, rma) for _, page_id, rma in planned]
+        console.print(f"[dim]Budżet wczytań: {available} z {loads.per_hour}/h wolne.[/dim]")
+    else:
+        # Otwarte zgłoszenia z lokalnego indeksu – Notion pytamy tylko o zmiany
+        targets = list(index.open_pages())
+    if not targets:
+        console.print("[green]Brak zgłoszeń do odświeżenia.[/green]")
+        hashes.close()
+        missing.close()
+        loads.close()
+        index.close()
+        return
+    console.print(f"[bold]Odświeżam {len(targets)} zgłoszeń (równolegle: {concurrency}).[/bold]")
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in targets:
+        queue.put_nowait(item)
+
+    def report(results):
+        for rma, ok in results:
+            if ok:
+                stats.saved += 1
+                console.print(f"[green]RMA {rma}: zaktualizowano w Notion.[/green]")
+            else:
+                stats.failed += 1
+                console.print(f"[red]Błąd aktualizacji RMA {rma} w Notion.[/red]")
+
+    async def worker(page):
+        while True:
+            try:
+                page_id, rma = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            page_ok, not_found = await session.open_repair_order(page, rma)
+            loads.charge(source="refresh")
+            if not_found:
+                stats.not_found += 1
+                continue
+            if not page_ok:
+                stats.failed += 1
+                console.print(f"[red]Nie można wczytać RMA {rma} – pomijam.[/red]")
+                continue
+            stats.processed += 1
+            record = OrderRecord.from_crm(rma, await read_crm_field_values(page))
+            hashes.note_check(rma, writes.put(record, page_id) != UNCHANGED)
+            report(await asyncio.to_thread(writes.flush_if_due))
+
     async with async_playwright() as p:
         browser = await p.chromium.connect_over_cdp(BROWSERLESS_WS)
         context = browser.contexts[0] if browser.contexts else await browser.new_context()
-        page = await context.new_page()
+        pages = [await context.new_page() for _ in range(max(1, min(concurrency, len(targets))))]
+        session = CRMSession(config.CRM_USERNAME, config.CRM_PASSWORD, stats=stats, timeouts=timeouts,
+                             missing=missing)
+        await session.login(pages[0])
+        await asyncio.gather(*(worker(pg) for pg in pages))
+        report(await asyncio.to_thread(writes.flush))
 
-        await login(page, config.CRM_USERNAME, config.CRM_PASSWORD)
-        page_ok, not_found = await open_repair_order(page, rma_num)
-        if not_found or not page_ok:
-            console.print(f"[yellow]RMA {rma_num} nie istnieje lub nie można wczytać strony.[/yellow]")
-        else:
-            crm_data = await read_crm_field_values(page)
-            crm_data["RMA"] = str(rma_num)
-            crm_data["URL"] = f"{config.CRM_REPAIR_ORDER_BASE_URL}{rma_num}"
-            table = Table(show_header=False)
-            table.add_column("Pole", style="bold", width=28)
-            table.add_column("Wartość", style="white", overflow="fold")
-            for disp_name, key in ORDERED_FIELDS:
-                value = crm_data.get(key) or "-"
-                color = FIELD_COLORS.get(disp_name, "white")
-                table.add_row(f"[{color}]{disp_name}[/{color}]", value)
-            console.print(table)
-            if notion.add_crm_data_to_notion(crm_data):
-                console.print(f"[green]Zapisano RMA {rma_num} w Notion.[/green]")
+        for pg in pages:
+            await pg.close()
+        await context.close()
+        await browser.close()
+
+    hashes.close()
+    missing.close()
+    loads.close()
+    index.close()
+    timeouts.save()
+    stats.timeouts = timeouts.snapshot()
+    if notion is not None:
+        stats.rate_wait = notion.limiter.waited
+        stats.bytes_out = notion.bytes_sent
+    report_locators()
+    console.print(stats.summary_table())
+    record_run(stats, "refresh")
+
+async def writeback_statuses(concurrency: int = 3):
+    """
+    Przenosi Status Zgłoszenia z Notion do CRM: bierze strony edytowane od
+    kursora (z lokalnego indeksu), łączy zmiany per RMA i zapisuje je w jednej
+    sesji CRM na kilku stronach naraz. Dziennik StatusLog pilnuje, by ta sama
+    zmiana nie była stosowana dwa razy; pierwsze uruchomienie tylko zapamiętuje
+    bieżące statusy.
+    """
+    notion = NotionAPI()
+    index = open_notion_index(notion)
+    log = StatusLog()
+    stats = RunStats()
+    timeouts = AdaptiveTimeouts()
+    edited = index.edited_since(log.cursor)
+    index.close()
+    if log.cursor is None:
+        log.record([(rma, status, when) for _, rma, status, when in edited if status])
+        if edited:
+            log.set_cursor(edited[-1][3])
+        console.print(f"[green]Zapamiętano bieżące statusy {len(edited)} stron – kolejne zmiany "
+                      f"będą przenoszone do CRM.[/green]")
+        log.close()
+        return
+    changes, skipped = plan_changes(edited, log)
+    log.record(skipped)
+    stats.unchanged = len(skipped)
+    if not changes:
+        if edited:
+            log.set_cursor(edited[-1][3])
+        console.print("[green]Brak zmian statusu do przeniesienia.[/green]")
+        log.close()
+        return
+    console.print(f"[bold]Przenoszę {len(changes)} zmian statusu do CRM (równolegle: {concurrency}).[/bold]")
+    queue: asyncio.Queue = asyncio.Queue()
+    for change in changes:
+        queue.put_nowait(change)
+    failed_edits: List[str] = []
+
+    async def worker(page):
+        while True:
+            try:
+                change = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.monotonic()
+            page_ok, not_found = await session.open_repair_order(page, change.rma)
+            ok = page_ok and await set_order_status(page, change.crm_status)
+            stats.observe("writeback", (time.monotonic() - t0) * 1000)
+            event("writeback", rma=change.rma, status=change.crm_status, outcome="ok" if ok else "failed")
+            if ok:
+                stats.saved += 1
+                log.record([(change.rma, change.status, change.edited)])
+                console.print(f"[green]RMA {change.rma}: status w CRM -> {change.crm_status}.[/green]")
+            elif not_found:
+                # Zlecenia nie ma w CRM – nie ma czego poprawiać przy kolejnym uruchomieniu
+                stats.not_found += 1
+                log.record([(change.rma, change.status, change.edited)])
             else:
-                console.print(f"[red]Błąd przy zapisie RMA {rma_num} do Notion.[/red]")
+                stats.failed += 1
+                failed_edits.append(change.edited)
+                console.print(f"[red]RMA {change.rma}: nie udało się ustawić statusu {change.crm_status}.[/red]")
 
-        await page.close()
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(BROWSERLESS_WS)
+        context = browser.contexts[0] if browser.contexts else await browser.new_context()
+        pages = [await context.new_page() for _ in range(max(1, min(concurrency, len(changes))))]
+        session = CRMSession(config.CRM_USERNAME, config.CRM_PASSWORD, stats=stats, timeouts=timeouts)
+        await session.login(pages[0])
+        await asyncio.gather(*(worker(pg) for pg in pages))
+
+        for pg in pages:
+            await pg.close()
         await context.close()
         await browser.close()
 
+    # Nieudane zmiany zostają za kursorem (>=) – następne uruchomienie je ponowi,
+    # a już zapisane pominie dzięki dziennikowi
+    log.set_cursor(min(failed_edits) if failed_edits else edited[-1][3])
+    log.close()
+    stats.processed = len(changes)
+    timeouts.save()
+    stats.timeouts = timeouts.snapshot()
+    stats.rate_wait = notion.limiter.waited
+    stats.bytes_out = notion.bytes_sent
+    console.print(stats.summary_table(title="Podsumowanie: statusy do CRM"))
+    record_run(stats, "writeback")
+
+async def replay_dead_letters(concurrency: int = 3, retries: int = 3, backoff: float = 2.0,
+                              backend: str = "playwright"):
+    """Ponownie przetwarza kolejkę nieudanych RMA w jednej sesji CRM."""
+    dlq = DeadLetterQueue()
+    entries = dlq.pending()
+    if not entries:
+        console.print("[green]Kolejka nieudanych RMA jest pusta.[/green]")
+        dlq.close()
+        return
+
+    console.print(f"[bold]Ponawiam {len(entries)} RMA z kolejki (równolegle: {concurrency}).[/bold]")
+    notion = NotionAPI()
+    index = open_notion_index(notion)
+    missing = NegativeCache()
+    stats = RunStats()
+    timeouts = AdaptiveTimeouts()
+    queue: asyncio.Queue = asyncio.Queue()
+    for entry in entries:
+        queue.put_nowait(entry.rma)
+    done = failed = 0
+
+    async def worker(scraper: Scraper):
+        nonlocal done, failed
+        while True:
+            try:
+                rma = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            stage, error = STAGE_OPEN, ""
+            for attempt in range(retries):
+                if attempt:
+                    await asyncio.sleep(backoff * 2 ** (attempt - 1))
+                # Sprawdzane tutaj, a nie w sesji, bo backend Selenium jej nie używa
+                if missing.should_skip(rma):
+                    stats.cached_missing += 1
+                    page_ok, not_found = False, True
+                else:
+                    page_ok, not_found = await scraper.open_repair_order(rma)
+                    if page_ok:
+                        missing.note_existing(rma)
+                    elif not_found:
+                        missing.record(rma)
+                if not_found:
+                    # RMA zniknęło z CRM – nie ma czego ponawiać
+                    stage, error = None, ""
+                    break
+                if not page_ok:
+                    stage, error = STAGE_OPEN, "nie można wczytać strony zlecenia"
+                    continue
+                record = OrderRecord.from_crm(rma, await scraper.read_crm_field_values())
+                if await asyncio.to_thread(notion.add_crm_data_to_notion, record):
+                    stats.saved += 1
+                    stage, error = None, ""
+                    break
+                stage, error = STAGE_NOTION, "add_crm_data_to_notion zwróciło False"
+
+            stats.processed += 1
+            if stage is None:
+                dlq.remove(rma)
+                done += 1
+                console.print(f"[green]RMA {rma} przetworzone – usunięto z kolejki.[/green]")
+            else:
+                dlq.record(rma, stage, error)
+                failed += 1
+                console.print(f"[red]RMA {rma} nadal się nie udaje ({stage}).[/red]")
+
+    workers = max(1, min(concurrency, len(entries)))
+    async with open_scrapers(backend, workers, stats=stats, timeouts=timeouts) as scrapers:
+        await asyncio.gather(*(worker(s) for s in scrapers))
+
+    stats.failed = failed
+    timeouts.save()
+    stats.timeouts = timeouts.snapshot()
+    if notion is not None:
+        stats.rate_wait = notion.limiter.waited
+        stats.bytes_out = notion.bytes_sent
+    console.print(f"[bold]Replay: OK {done}, nadal w kolejce {failed}.[/bold]")
+    console.print(stats.summary_table())
+    record_run(stats, "replay")
+    dlq.close()
+    missing.close()
+    index.close()
+
+async def serve(host: str = "127.0.0.1", port: int = 8765, pages_count: int = 3, window: float = 0.25):
+    """Nasłuch HTTP: POST /rma z numerami RMA -> natychmiastowa synchronizacja."""
+    notion = NotionAPI()
+    index = open_notion_index(notion)
+    hashes = FieldHashStore()
+    dlq = DeadLetterQueue()
+    missing = NegativeCache()
+    stats = RunStats()
+    sinks = build_sinks(["notion"], notion=notion, hashes=hashes, stats=stats)
+    timeouts = AdaptiveTimeouts()
+
+    def report(rma: int, outcome: str, latency_ms: float):
+        color = {"saved": "green", "not_found": "yellow"}.get(outcome, "red")
+        console.print(f"[{color}]RMA {rma}: {outcome} ({latency_ms:.0f} ms)[/{color}]")
+
+    async with async_playwright() as p:
+        browser = await p.chromium.connect_over_cdp(BROWSERLESS_WS)
+        context = browser.contexts[0] if browser.contexts else await browser.new_context()
+        pages = [await context.new_page() for _ in range(max(1, pages_count))]
+        session = CRMSession(config.CRM_USERNAME, config.CRM_PASSWORD, stats=stats, timeouts=timeouts,
+                             missing=missing)
+        await session.login(pages[0])
+
+        server = IngestServer(session, pages, notion, sinks, dlq, stats, window=window,
+                              token=default_token(), on_result=report)
+        console.print(f"[bold]Nasłuchuję na http://{host}:{port}/rma ({len(pages)} stron).[/bold]")
+        try:
+            await server.serve(host, port)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for pg in pages:
+                await pg.close()
+            await context.close()
+            await browser.close()
+            # Ostatnia wysyłka bufora – wyniki i opóźnienia RMA jeszcze w nim czekających
+            await server.flush()
+            await asyncio.to_thread(sinks.close)
+            server.report_failures()
+            hashes.close()
+            dlq.close()
+            missing.close()
+            index.close()
+            timeouts.save()
+            stats.timeouts = timeouts.snapshot()
+            if notion is not None:
+                stats.rate_wait = notion.limiter.waited
+                stats.bytes_out = notion.bytes_sent
+            report_locators()
+            console.print(stats.summary_table())
+            record_run(stats, "serve")
+
+def show_history(command: str = "sync", days: int = 30, baseline: int = 20, check: int = 5,
+                 slowest: int = 5, tenant: Optional[str] = None):
+    """Trend dzienny, regresje względem kroczącej bazowej i najwolniejsze przebiegi."""
+    history = RunHistory()
+    try:
+        for table in history_tables(history, command, days, baseline, check, slowest, tenant):
+            console.print(table)
+    finally:
+        history.close()
+
 def change_credentials():
     """Zmienia login i hasło CRM w pliku .env oraz w konfiguracji."""
     env_path = os.path.join(os.path.dirname(__file__), ".env")
@@ -194,13 +1010,79 @@ def run_menu(timeout=3) -> str:
 
 def main():
     load_dotenv()
+    setup_logging()
 
     parser = argparse.ArgumentParser(description="Synchronizacja CRM Gincore z Notion.")
     subparsers = parser.add_subparsers(dest="cmd")
-    subparsers.add_parser("sync", help="Skanuj wszystkie nowe zgłoszenia.")
+    sp_sync = subparsers.add_parser("sync", help="Skanuj wszystkie nowe zgłoszenia.")
+    sp_sync.add_argument("--queue-size", type=int, default=8, help="Maks. liczba rekordów czekających na zapis")
+    sp_sync.add_argument("--recycle-after", type=int, default=500, help="Wymiana strony co N nawigacji")
+    sp_sync.add_argument("--max-heap-mb", type=float, default=512.0, help="Wymiana strony po przekroczeniu sterty JS (MB)")
+    sp_sync.add_argument("--recycle-context", action="store_true", help="Wymieniaj także kontekst przeglądarki")
+    sp_sync.add_argument("--sink", action="append", dest="sinks", metavar="CEL",
+                         help="Cel zapisu: notion, jsonl:plik, csv:plik, sqlite:plik (można podać kilka)")
+    sp_sync.add_argument("--start", type=int, help="Pierwsze RMA (domyślnie ostatnie z Notion + 1)")
+    sp_sync.add_argument("--fetch", choices=("render", "request"), default="render", dest="fetch_mode",
+                         help="render: pełne renderowanie; request: HTML przez request API (bez renderowania)")
+    sp_sync.add_argument("--fetch-window", type=int, default=8, help="Liczba równoległych pobrań w trybie request")
+    sp_sync.add_argument("--prefetch", type=int, default=0,
+                         help="Ile kolejnych RMA otwierać z wyprzedzeniem na zapasowych stronach "
+                              "(0 = wyłączone; nie łączy się z --profile ani --recycle-context)")
+    sp_sync.add_argument("--profile", action="store_true", help="Profiluj przebieg (cProfile + ślady wolnych RMA)")
+    sp_sync.add_argument("--dry-run", action="store_true",
+                         help="Tylko prognoza: próbka RMA z zakresu, bez zapisu do Notion i celów")
+    sp_sync.add_argument("--count", type=int, default=1000, help="Liczba RMA w zakresie prognozy (--dry-run)")
+    sp_sync.add_argument("--sample", type=int, default=20, help="Liczba RMA w próbce (--dry-run)")
+    sp_sync.add_argument("--notion-rate", type=float, default=config.NOTION_RATE_LIMIT,
+                         help="Limit zapytań do Notion przyjęty w prognozie (na s)")
+    sp_sync.add_argument("--trace-threshold", type=float, default=5000.0,
+                         help="Zapisuj ślad Playwright dla RMA wolniejszych niż N ms")
     sp_single = subparsers.add_parser("single", help="Dodaj pojedyncze zgłoszenie.")
     sp_single.add_argument("--rma", type=int, required=True, help="Numer RMA do dodania")
+    sp_single.add_argument("--sink", action="append", dest="sinks", metavar="CEL",
+                           help="Cel zapisu: notion, jsonl:plik, csv:plik, sqlite:plik (można podać kilka)")
+    sp_single.add_argument("--backend", choices=BACKENDS, default="playwright", help="Silnik przeglądarki")
+    sp_single.add_argument("--profile", action="store_true", help="Profiluj przebieg (cProfile + ślad Playwright)")
+    sp_single.add_argument("--trace-threshold", type=float, default=5000.0,
+                           help="Zapisz ślad Playwright, jeśli RMA trwa dłużej niż N ms")
     subparsers.add_parser("credentials", help="Zmień login i hasło CRM.")
+    sp_tenants = subparsers.add_parser("tenants", help="Skanuj nowe zgłoszenia wielu punktów serwisowych naraz.")
+    sp_tenants.add_argument("--file", help="Plik konfiguracji najemców (domyślnie tenants.json)")
+    sp_tenants.add_argument("--only", action="append", metavar="NAZWA", help="Tylko wskazani najemcy")
+    sp_tenants.add_argument("--slots", type=int, default=4, help="Wspólna liczba równoległych nawigacji")
+    sp_tenants.add_argument("--notion-rate", type=float, default=config.NOTION_RATE_LIMIT, help="Wspólny limit zapytań do Notion (na s, na token)")
+    sp_refresh = subparsers.add_parser("refresh", help="Odśwież otwarte zgłoszenia (zmienione pola i treść długich pól).")
+    sp_refresh.add_argument("--concurrency", type=int, default=3, help="Liczba równoległych stron")
+    sp_refresh.add_argument("--scheduled", action="store_true",
+                            help="Tylko RMA o najwyższym priorytecie w ramach godzinowego budżetu wczytań")
+    sp_refresh.add_argument("--budget", type=int, help="Budżet wczytań stron CRM na godzinę (domyślnie z configu)")
+    sp_writeback = subparsers.add_parser("writeback", help="Przenieś zmiany statusu z Notion do CRM.")
+    sp_writeback.add_argument("--concurrency", type=int, default=3, help="Liczba równoległych stron")
+    sp_serve = subparsers.add_parser("serve", help="Nasłuch HTTP na numery RMA do natychmiastowej synchronizacji.")
+    sp_serve.add_argument("--host", default="127.0.0.1", help="Adres nasłuchu")
+    sp_serve.add_argument("--port", type=int, default=8765, help="Port nasłuchu")
+    sp_serve.add_argument("--pages", type=int, default=3, help="Liczba zalogowanych stron w puli")
+    sp_serve.add_argument("--window", type=float, default=0.25, help="Okno łączenia zgłoszeń (s)")
+    sp_replay = subparsers.add_parser("replay", help="Ponów nieudane RMA z kolejki.")
+    sp_replay.add_argument("--concurrency", type=int, default=3, help="Liczba równoległych stron")
+    sp_replay.add_argument("--retries", type=int, default=3, help="Liczba prób na RMA")
+    sp_replay.add_argument("--backoff", type=float, default=2.0, help="Bazowe opóźnienie między próbami (s)")
+    sp_replay.add_argument("--backend", choices=BACKENDS, default="playwright",
+                           help="Silnik przeglądarki (selenium: pula procesów)")
+    sp_stats = subparsers.add_parser("stats", help="Historia przebiegów: trend, regresje, najwolniejsze.")
+    sp_stats.add_argument("--command", default="sync", dest="run_command",
+                          choices=("sync", "single", "tenants", "refresh", "writeback", "replay", "serve"),
+                          help="Rodzaj przebiegów do pokazania")
+    sp_stats.add_argument("--tenant", help="Tylko przebiegi wskazanego najemcy")
+    sp_stats.add_argument("--days", type=int, default=30, help="Okres trendu i najwolniejszych przebiegów (dni)")
+    sp_stats.add_argument("--baseline", type=int, default=20, help="Liczba poprzednich przebiegów w bazowej")
+    sp_stats.add_argument("--check", type=int, default=5, help="Ile ostatnich przebiegów sprawdzić pod kątem regresji")
+    sp_stats.add_argument("--slowest", type=int, default=5, help="Liczba najwolniejszych przebiegów")
+    sp_bench = subparsers.add_parser("bench", help="Porównaj backendy na lokalnym fake CRM.")
+    sp_bench.add_argument("--backend", action="append", choices=BACKENDS, dest="backends", help="Backend (domyślnie oba)")
+    sp_bench.add_argument("--orders", type=int, default=200, help="Liczba zleceń na backend")
+    sp_bench.add_argument("--workers", type=int, default=4, help="Liczba równoległych pracowników")
+    sp_bench.add_argument("--latency-ms", type=float, default=50.0, help="Symulowane opóźnienie CRM (ms)")
     args, _ = parser.parse_known_args()
 
     if args.cmd is None:
@@ -220,14 +1102,61 @@ def main():
         return
 
     # Obsługa subkomend
-    if args.cmd == "sync":
-        asyncio.run(sync_all())
+    if (args.cmd == "sync" and not args.dry_run and args.fetch_mode == "render" and args.prefetch > 0
+            and (args.profile or args.recycle_context)):
+        parser.error("--prefetch nie łączy się z --profile (ślad obejmowałby kilka RMA naraz) "
+                     "ani z --recycle-context (strony zapasowe dzielą kontekst z główną)")
+    profiler = None
+    # Dry-run tylko prognozuje – nie ma czego profilować
+    if args.cmd in ("sync", "single") and args.profile and not getattr(args, "dry_run", False):
+        profiler = RunProfiler(trace_threshold_ms=args.trace_threshold)
+    tracer = profiler.tracer if profiler else None
+
+    if args.cmd == "sync" and args.dry_run:
+        asyncio.run(estimate_sync(args.start, args.count, args.sample, args.fetch_mode, args.fetch_window,
+                                  args.prefetch, args.notion_rate))
+    elif args.cmd == "sync":
+        with profiler or nullcontext():
+            asyncio.run(sync_all(
+                queue_size=args.queue_size,
+                recycle_after=args.recycle_after,
+                max_heap_mb=args.max_heap_mb,
+                recycle_context=args.recycle_context,
+                sink_specs=args.sinks,
+                start=args.start,
+                tracer=tracer,
+                fetch_mode=args.fetch_mode,
+                fetch_window=args.fetch_window,
+                prefetch=args.prefetch,
+            ))
     elif args.cmd == "single":
-        asyncio.run(sync_single(args.rma))
+        with profiler or nullcontext():
+            asyncio.run(sync_single(args.rma, args.sinks, tracer=tracer, backend=args.backend))
     elif args.cmd == "credentials":
         change_credentials()
+    elif args.cmd == "tenants":
+        asyncio.run(sync_tenants(args.file, args.only, args.slots, args.notion_rate))
+    elif args.cmd == "refresh":
+        asyncio.run(refresh_open(args.concurrency, args.scheduled, args.budget))
+    elif args.cmd == "writeback":
+        asyncio.run(writeback_statuses(args.concurrency))
+    elif args.cmd == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.pages, args.window))
+        except KeyboardInterrupt:
+            console.print("[dim]Zatrzymano nasłuch.[/dim]")
+    elif args.cmd == "replay":
+        asyncio.run(replay_dead_letters(args.concurrency, args.retries, args.backoff, args.backend))
+    elif args.cmd == "stats":
+        show_history(args.run_command, args.days, args.baseline, args.check, args.slowest, args.tenant)
+    elif args.cmd == "bench":
+        from bench import run_benchmark
+        asyncio.run(run_benchmark(args.backends or list(BACKENDS), args.orders, args.workers, args.latency_ms))
     else:
         parser.print_help()
 
+    if profiler:
+        console.print(f"[bold]Profil zapisany: {profiler.write_summary()}[/bold]")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,100 @@
+# negative_cache.py
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+import config
+
+
+class NegativeCache:
+    """
+    Trwała lista RMA potwierdzonych jako nieistniejące (usunięte lub pominięte
+    numery), żeby skany, odświeżanie i importy nie nawigowały do nich ponownie.
+
+    Wpis jest pomijany tylko, gdy jest świeższy niż ttl_days i leży poniżej
+    frontier - recheck_tail (frontier = najwyższe RMA znane jako istniejące).
+    RMA przy końcu zakresu są więc zawsze sprawdzane ponownie – tam numer
+    może się jeszcze pojawić.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_days: Optional[float] = None,
+                 recheck_tail: Optional[int] = None):
+        self.path = path or config.NEGATIVE_CACHE_DB
+        self.ttl = (ttl_days if ttl_days is not None else config.NEGATIVE_CACHE_TTL_DAYS) * 86400
+        self.recheck_tail = recheck_tail if recheck_tail is not None else config.NEGATIVE_CACHE_RECHECK_TAIL
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS missing_rmas (
+                rma INTEGER PRIMARY KEY,
+                first_seen REAL NOT NULL,
+                checked REAL NOT NULL,
+                hits INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+        # Cały zbiór w pamięci – sprawdzenie przed nawigacją bez zapytań do SQLite
+        self._entries: Dict[int, float] = dict(self.conn.execute("SELECT rma, checked FROM missing_rmas"))
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'frontier'").fetchone()
+        self.frontier = int(row[0]) if row else 0
+        self._saved_frontier = self.frontier
+        self.skipped = 0
+
+    def should_skip(self, rma: int) -> bool:
+        """True, jeśli RMA można uznać za nieistniejące bez nawigacji."""
+        checked = self._entries.get(int(rma))
+        if checked is None:
+            return False
+        if time.time() - checked > self.ttl:
+            return False
+        if rma > self.frontier - self.recheck_tail:
+            return False
+        self.skipped += 1
+        return True
+
+    def is_interior(self, rma: int) -> bool:
+        """RMA poniżej znanego istniejącego zlecenia – brak oznacza lukę, nie koniec zakresu."""
+        return int(rma) < self.frontier
+
+    def record(self, rma: int) -> None:
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO missing_rmas (rma, first_seen, checked, hits) VALUES (?, ?, ?, 1)
+                ON CONFLICT(rma) DO UPDATE SET checked = excluded.checked, hits = hits + 1
+                """,
+                (int(rma), now, now),
+            )
+        self._entries[int(rma)] = now
+
+    def note_existing(self, rma: int) -> None:
+        """Zlecenie istnieje: przesuwa frontier i usuwa ewentualny nieaktualny wpis."""
+        rma = int(rma)
+        if rma > self.frontier:
+            self.frontier = rma
+        if self._entries.pop(rma, None) is not None:
+            with self.conn:
+                self.conn.execute("DELETE FROM missing_rmas WHERE rma = ?", (rma,))
+
+    def save(self) -> None:
+        if self.frontier != self._saved_frontier:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('frontier', ?)", (str(self.frontier),)
+                )
+            self._saved_frontier = self.frontier
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def close(self) -> None:
+        self.save()
+        self.conn.close()
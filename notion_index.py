@@ -0,0 +1,145 @@
+# notion_index.py
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import config
+
+
+def page_rma(page: dict) -> Optional[int]:
+    """Numer RMA z tytułu strony ("№ 2864" -> 2864)."""
+    title = page.get("properties", {}).get("RMA", {}).get("title", [])
+    raw = title[0].get("plain_text", "") if title else ""
+    m = re.search(r"(\d+)$", raw)
+    return int(m.group(1)) if m else None
+
+
+def page_status(page: dict) -> Optional[str]:
+    status = page.get("properties", {}).get("Status Zgłoszenia", {}).get("status") or {}
+    return status.get("name")
+
+
+class NotionIndex:
+    """
+    Lokalna kopia (RMA, status) stron bazy Notion w SQLite. sync() pobiera
+    tylko strony edytowane od zapisanego kursora last_edited_time, więc koszt
+    odświeżenia zależy od liczby zmian, a nie od rozmiaru bazy. Ostatnie RMA
+    i sprawdzanie duplikatów to wtedy zapytania lokalne.
+
+    Strony przeniesione do kosza nie wracają w zapytaniach – rebuild=True
+    czyta bazę od nowa.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.NOTION_INDEX_DB
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Zapisy z wątków roboczych (add_crm_data_to_notion w asyncio.to_thread)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                page_id TEXT PRIMARY KEY,
+                rma INTEGER,
+                status TEXT,
+                last_edited TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_rma ON pages (rma);
+            CREATE INDEX IF NOT EXISTS pages_edited ON pages (last_edited);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def cursor(self) -> Optional[str]:
+        return self._meta("cursor")
+
+    def upsert(self, page: dict) -> None:
+        """Zapisuje stronę z odpowiedzi Notion (query albo pages.create)."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (page_id, rma, status, last_edited) VALUES (?, ?, ?, ?)",
+                (page["id"], page_rma(page), page_status(page), page.get("last_edited_time", "")),
+            )
+
+    def sync(self, notion, rebuild: bool = False) -> int:
+        """Dociąga strony zmienione od kursora. Zwraca liczbę pobranych stron."""
+        with self._lock:
+            if self._meta("database_id") != notion.database_id:
+                rebuild = True
+            if rebuild:
+                with self.conn:
+                    self.conn.execute("DELETE FROM pages")
+                    self.conn.execute("DELETE FROM meta")
+                    self.conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('database_id', ?)", (notion.database_id,)
+                    )
+        since = self.cursor
+        high = since
+        count = 0
+        batch = []
+        for page in notion.query_pages_edited_since(since):
+            batch.append((page["id"], page_rma(page), page_status(page), page.get("last_edited_time", "")))
+            edited = page.get("last_edited_time")
+            if edited and (high is None or edited > high):
+                high = edited
+            if len(batch) >= 100:
+                count += self._store(batch)
+                batch = []
+        count += self._store(batch)
+        if high and high != since:
+            with self._lock, self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cursor', ?)", (high,))
+        return count
+
+    def _store(self, rows: list) -> int:
+        if rows:
+            with self._lock, self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO pages (page_id, rma, status, last_edited) VALUES (?, ?, ?, ?)", rows
+                )
+        return len(rows)
+
+    def last_rma(self) -> Optional[int]:
+        row = self.conn.execute("SELECT MAX(rma) FROM pages").fetchone()
+        return row[0] if row else None
+
+    def page_for(self, rma: int) -> Optional[str]:
+        """page_id strony z danym RMA (sprawdzanie duplikatów przed pages.create)."""
+        row = self.conn.execute("SELECT page_id FROM pages WHERE rma = ? LIMIT 1", (int(rma),)).fetchone()
+        return row[0] if row else None
+
+    def open_pages(self, closed_statuses=None) -> Iterator[Tuple[str, int]]:
+        """(page_id, rma) stron, których status nie jest zamknięty."""
+        closed = tuple(closed_statuses if closed_statuses is not None else config.NOTION_CLOSED_STATUSES)
+        marks = ", ".join("?" for _ in closed) or "NULL"
+        rows = self.conn.execute(
+            f"SELECT page_id, rma FROM pages WHERE rma IS NOT NULL "
+            f"AND (status IS NULL OR status NOT IN ({marks})) ORDER BY rma",
+            closed,
+        ).fetchall()
+        return iter(rows)
+
+    def edited_since(self, since: Optional[str] = None) -> List[Tuple[str, int, Optional[str], str]]:
+        """(page_id, rma, status, last_edited) stron edytowanych od since (włącznie), od najstarszej."""
+        return self.conn.execute(
+            "SELECT page_id, rma, status, last_edited FROM pages WHERE rma IS NOT NULL "
+            "AND (? IS NULL OR last_edited >= ?) ORDER BY last_edited",
+            (since, since),
+        ).fetchall()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
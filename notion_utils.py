@@ -1,164 +1,199 @@
 import json
-import re
 import logging
+import time
+from typing import Dict
 from notion_client import Client
-from config import NOTION_API_TOKEN, NOTION_DATABASE_ID, USERS_NAME_TO_NOTION_ID_MAP
+from config import (
+    NOTION_API_TOKEN,
+    NOTION_DATABASE_ID,
+    USERS_NAME_TO_NOTION_ID_MAP,
+)
+from order_record import NOTION_BLOCKS_PER_REQUEST, NOTION_BODY_HEADINGS, as_record
+from rate_budget import SharedRateLimiter, shared_limiter
 
 
 class NotionAPI:
-    def __init__(self):
+    def __init__(self, token: str = None, database_id: str = None, limiter: SharedRateLimiter = None,
+                 index=None, users: Dict[str, str] = None):
         """
-        Initializes the Notion API client with the provided token and database ID.
+        Initializes the Notion API client with the provided token and database ID
+        (defaults from config). Without an explicit limiter every call goes
+        through the cross-process budget of this token (rate_budget.py).
+        An optional NotionIndex enables local duplicate checks before create.
+        users maps CRM user names to Notion people IDs of this workspace
+        (USERS_NAME_TO_NOTION_ID_MAP of the tenant; defaults from config).
         """
-        if not NOTION_API_TOKEN or not NOTION_DATABASE_ID:
+        token = token or NOTION_API_TOKEN
+        database_id = database_id or NOTION_DATABASE_ID
+        if not token or not database_id:
             raise RuntimeError("Brak NOTION_API_TOKEN lub NOTION_DATABASE_ID (sprawdź .env)")
 
-        self.notion = Client(auth=NOTION_API_TOKEN)
-        self.database_id = NOTION_DATABASE_ID
+        self.notion = Client(auth=token)
+        self.database_id = database_id
+        self.limiter = limiter if limiter is not None else shared_limiter(token)
+        self.index = index
+        self.users = users if users is not None else USERS_NAME_TO_NOTION_ID_MAP
+        # Bajty wysłanych payloadów (historia przebiegów)
+        self.bytes_sent = 0
+        # Czekanie na limiter tego klienta (limiter bywa wspólny dla kilku najemców)
+        self.rate_wait = 0.0
+
+    def _call(self, fn, **kwargs):
+        """Runs a Notion API call through the rate limiter (if any)."""
+        if self.limiter is not None:
+            t0 = time.monotonic()
+            self.limiter.acquire()
+            self.rate_wait += time.monotonic() - t0
+        self.bytes_sent += len(json.dumps(kwargs, ensure_ascii=False).encode("utf-8"))
+        return fn(**kwargs)
 
-    # Wyciąganie cyfr z tytułu (np. z "№ 2864" -> "2864")
     @staticmethod
-    def _strip_symbols(val: str) -> str:
-        if not val:
-            return val
-        m = re.search(r"(\d+)$", val)
-        return m.group(1) if m else val
-
-    def get_last_repair_order_number(self, property_name: str = "RMA"):
+    def crm_properties(crm_data) -> dict:
         """
-        Retrieves the last added repair order number from the Notion database.
-        Sorts by RMA descending and returns the first numeric part found.
+        Builds Notion properties from CRM data only (no defaults such as
+        status, manager or priority). Accepts an OrderRecord or a legacy dict.
         """
-        try:
-            response = self.notion.databases.query(
-                database_id=self.database_id,
-                sorts=[{"property": "RMA", "direction": "descending"}],
-                page_size=1
-            )
-
-            if response and response.get("results"):
-                latest_page = response["results"][0]
-                properties = latest_page.get("properties", {})
-                if property_name in properties:
-                    prop_data = properties[property_name]
-                    ptype = prop_data.get("type")
-
-                    if ptype == "title":
-                        items = prop_data.get("title", [])
-                        if items:
-                            raw = items[0].get("plain_text", "")
-                            return self._strip_symbols(raw)
-                    elif ptype == "number":
-                        num = prop_data.get("number")
-                        return str(num) if num is not None else None
-                    elif ptype == "rich_text":
-                        items = prop_data.get("rich_text", [])
-                        if items:
-                            raw = items[0].get("plain_text", "")
-                            return self._strip_symbols(raw)
-                return None
-            return None
-        except Exception as e:
-            logging.exception("Błąd pobierania RMA z Notion: %s", e)
-            return None
+        return as_record(crm_data).notion_properties()
 
-    def add_crm_data_to_notion(self, crm_data: dict) -> bool:
+    def add_crm_data_to_notion(self, crm_data) -> bool:
         """
-        Adds a record to Notion based on data from CRM.
+        Adds a record to Notion based on data from CRM (OrderRecord or dict).
         Returns True if success, False otherwise.
         """
-        properties = {}
-
-        # RMA (Title) – wymagane
-        rma_number = crm_data.get("RMA")
-        if rma_number:
-            properties["RMA"] = {"title": [{"text": {"content": f"№ {rma_number}"}}]}
-        else:
+        record = as_record(crm_data)
+        if not record.rma:
             logging.warning("Brak 'RMA' w danych CRM – pomijam wpis.")
             return False
+        if self.index is not None and self.index.page_for(record.rma):
+            logging.info("RMA %s jest już w Notion – pomijam duplikat.", record.rma)
+            return True
 
-        # Klient
-        v = crm_data.get("Klient")
-        if v:
-            properties["Klient"] = {"rich_text": [{"text": {"content": v}}]}
-
-        # Numer telefonu
-        v = crm_data.get("Numer telefonu")
-        if v:
-            properties["Numer telefonu"] = {"phone_number": v}
-
-        # Producent (Select)
-        v = crm_data.get("Producent")
-        if v:
-            properties["Producent"] = {"select": {"name": v}}
-
-        # Typ urządzenia w CRM → Typ Urządzenia w Notion
-        v = crm_data.get("Typ urządzenia")
-        if v:
-            properties["Typ Urządzenia"] = {"select": {"name": v}}
-
-        # Model
-        v = crm_data.get("Model")
-        if v:
-            properties["Model"] = {"rich_text": [{"text": {"content": v}}]}
-
-        # Numer Seryjny → Numer Seryjny (SN)
-        v = crm_data.get("Numer Seryjny")
-        if v:
-            properties["Numer Seryjny (SN)"] = {"rich_text": [{"text": {"content": v}}]}
-
-        # Uwagi → Uwagi (obsługa)
-        v = crm_data.get("Uwagi")
-        if v:
-            properties["Uwagi (obsługa)"] = {"rich_text": [{"text": {"content": v}}]}
-
-        # Opis Usterki → Opis Usterki (Klient)
-        v = crm_data.get("Opis Usterki")
-        if v:
-            properties["Opis Usterki (Klient)"] = {"rich_text": [{"text": {"content": v}}]}
-
-        # Stan wizualny urządzenia
-        v = crm_data.get("Stan wizualny urządzenia")
-        if v:
-            properties["Stan wizualny urządzenia"] = {
-                "rich_text": [{"text": {"content": v}}]
-            }
+        create, *appends = self.create_payloads(record)
+        try:
+            page = self._call(self.notion.pages.create, **create)
+        except Exception as e:
+            logging.exception("Błąd wysyłania danych do Notion: %s", e)
+            return False
+        if self.index is not None and page:
+            self.index.upsert(page)
+        if appends:
+            self.append_blocks(page["id"], [b for extra in appends for b in extra["children"]])
+        return True
 
-        # Technik (People)
-        technician_full = crm_data.get("Technik")
-        if technician_full:
-            technician_name_for_lookup = technician_full.split("(")[0].strip()
-            notion_user_id = USERS_NAME_TO_NOTION_ID_MAP.get(technician_name_for_lookup)
-            if notion_user_id:
-                properties["Technik"] = {"people": [{"id": notion_user_id}]}
-            # brak else – po prostu nie dodajemy, by uniknąć komunikatów
+    def create_payloads(self, record) -> list:
+        """
+        Keyword arguments of every call that creating the page takes, without
+        sending anything: pages.create first, then one blocks.children.append
+        per further batch of body blocks (block_id is known only after create).
+        """
+        properties = record.notion_properties(self.users)
 
         # Status Zgłoszenia (Status)
         properties["Status Zgłoszenia"] = {"status": {"name": "Nowe"}}
 
         # Manager Zgłoszenia (People) – stałe ID
-        manager_user_id = USERS_NAME_TO_NOTION_ID_MAP.get("Piotr Urbanek")
+        manager_user_id = self.users.get("Piotr Urbanek")
         if manager_user_id:
             properties["Manager Zgłoszenia"] = {"people": [{"id": manager_user_id}]}
 
         # Priorytet (Select)
         properties["Priorytet"] = {"select": {"name": "Standardowy"}}
 
-        # URL
-        v = crm_data.get("URL")
-        if v:
-            properties["URL"] = {"url": v}
+        # Pełna treść długich pól: pierwsze 100 bloków w tym samym create
+        blocks = record.notion_body_blocks()
+        create = {"parent": {"database_id": self.database_id}, "properties": properties}
+        if blocks:
+            create["children"] = blocks[:NOTION_BLOCKS_PER_REQUEST]
+        appends = [
+            {"block_id": None, "children": blocks[i:i + NOTION_BLOCKS_PER_REQUEST]}
+            for i in range(NOTION_BLOCKS_PER_REQUEST, len(blocks), NOTION_BLOCKS_PER_REQUEST)
+        ]
+        return [create] + appends
+
+    def append_blocks(self, page_id: str, blocks: list) -> bool:
+        """
+        Appends blocks to a page body in as few blocks.children.append calls as
+        the per-request limit allows. The page itself already exists, so a
+        failure is logged rather than reported as a failed create.
+        """
+        try:
+            for i in range(0, len(blocks), NOTION_BLOCKS_PER_REQUEST):
+                self._call(
+                    self.notion.blocks.children.append,
+                    block_id=page_id,
+                    children=blocks[i:i + NOTION_BLOCKS_PER_REQUEST],
+                )
+            return True
+        except Exception as e:
+            logging.exception("Błąd dopisywania treści strony Notion %s: %s", page_id, e)
+            return False
 
+    def replace_body_blocks(self, page_id: str, blocks: list) -> bool:
+        """
+        Replaces the CRM sections of a page body (a heading_3 named after a long
+        field and the paragraphs directly under it) with blocks, appended at the
+        end. Blocks people added in Notion outside those sections are kept.
+        """
         try:
-            self.notion.pages.create(
-                parent={"database_id": self.database_id},
-                properties=properties
-            )
+            stale, section, cursor = [], False, None
+            while True:
+                kwargs = {"block_id": page_id, "page_size": 100}
+                if cursor:
+                    kwargs["start_cursor"] = cursor
+                response = self._call(self.notion.blocks.children.list, **kwargs)
+                for block in response.get("results", []):
+                    kind = block.get("type")
+                    if kind == "heading_3":
+                        text = "".join(t.get("plain_text", "") for t in block["heading_3"].get("rich_text", []))
+                        section = text in NOTION_BODY_HEADINGS
+                    elif kind != "paragraph":
+                        section = False
+                    if section:
+                        stale.append(block["id"])
+                if not response.get("has_more"):
+                    break
+                cursor = response.get("next_cursor")
+            for block_id in stale:
+                self._call(self.notion.blocks.delete, block_id=block_id)
+        except Exception as e:
+            logging.exception("Błąd podmiany treści strony Notion %s: %s", page_id, e)
+            return False
+        return self.append_blocks(page_id, blocks)
+
+    def query_pages_edited_since(self, since: str = None):
+        """
+        Yields raw pages edited at or after the ISO timestamp `since`
+        (all pages when None), oldest edit first. Paginates through the result set.
+        """
+        cursor = None
+        while True:
+            kwargs = {
+                "database_id": self.database_id,
+                "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+                "page_size": 100,
+            }
+            if since:
+                kwargs["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+            if cursor:
+                kwargs["start_cursor"] = cursor
+            response = self._call(self.notion.databases.query, **kwargs)
+            yield from response.get("results", [])
+            if not response.get("has_more"):
+                return
+            cursor = response.get("next_cursor")
+
+    def update_page_properties(self, page_id: str, properties: dict) -> bool:
+        """
+        Sends pages.update with only the given properties.
+        Returns True if success, False otherwise.
+        """
+        try:
+            self._call(self.notion.pages.update, page_id=page_id, properties=properties)
             return True
         except Exception as e:
-            logging.exception("Błąd wysyłania danych do Notion: %s", e)
+            logging.exception("Błąd aktualizacji strony Notion %s: %s", page_id, e)
             return False
 
     # alias zgodny ze starą wersją
-    def upsert_crm_data(self, crm_data: dict) -> bool:
+    def upsert_crm_data(self, crm_data) -> bool:
         return self.add_crm_data_to_notion(crm_data)
@@ -0,0 +1,176 @@
+# notion_writes.py
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import config
+from field_hashes import FieldHashStore
+from order_record import OrderRecord
+from run_log import event, log
+
+# Wynik put()
+QUEUED = "queued"
+MERGED = "merged"
+UNCHANGED = "unchanged"
+
+# Klucz skrótu treści strony (pełny tekst długich pól) w FieldHashStore
+BODY = "_body"
+
+
+def _body(blocks: List[dict]) -> Dict[str, dict]:
+    return {BODY: {"blocks": blocks}}
+
+
+@dataclass
+class _Pending:
+    rma: int
+    record: Optional[OrderRecord] = None      # nowa strona (pages.create)
+    page_id: Optional[str] = None             # istniejąca strona (pages.update)
+    properties: Dict[str, dict] = field(default_factory=dict)
+    body: Optional[List[dict]] = None         # nowa treść sekcji długich pól
+
+
+class NotionWriteBuffer:
+    """
+    Bufor zapisów do Notion z kluczem RMA. Kolejne zapisy tego samego RMA
+    przed wysłaniem są łączone (nowsze wartości wygrywają), a properties
+    identyczne z ostatnio potwierdzonym stanem (FieldHashStore – wspólny dla
+    procesów) są pomijane. Wysyłka co interval sekund albo po max_pending RMA.
+
+    put() jest wołane z pętli asyncio albo z wątku roboczego; flush() wykonuje
+    wywołania API, więc z asyncio należy go wołać przez asyncio.to_thread.
+    """
+
+    def __init__(self, notion, hashes: FieldHashStore, interval: Optional[float] = None,
+                 max_pending: Optional[int] = None, stats=None):
+        self.notion = notion
+        self.hashes = hashes
+        self.interval = interval if interval is not None else config.NOTION_WRITE_INTERVAL
+        self.max_pending = max_pending or config.NOTION_WRITE_BATCH
+        self.stats = stats
+        self._pending: Dict[int, _Pending] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._failures: List[int] = []
+        self.sent = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, record: OrderRecord, page_id: Optional[str] = None) -> str:
+        """
+        Kolejkuje rekord. Strona już istniejąca (page_id albo wpis w indeksie
+        Notion) dostaje tylko zmienione properties, a sekcje pełnego tekstu
+        długich pól są podmieniane, gdy zmienił się ich skrót.
+        """
+        rma = record.rma
+        if page_id is None and getattr(self.notion, "index", None) is not None:
+            page_id = self.notion.index.page_for(rma)
+        with self._lock:
+            pending = self._pending.get(rma)
+            if page_id is None and (pending is None or pending.page_id is None):
+                result = MERGED if pending else QUEUED
+                self._pending[rma] = _Pending(rma, record=record)
+            else:
+                page_id = page_id or pending.page_id
+                users = getattr(self.notion, "users", None)
+                cleared = record.notion_cleared(users)
+                changed = self.hashes.changed(rma, record.notion_properties(users), cleared)
+                # Pusta treść czyści tylko sekcje zapisane wcześniej
+                body = record.notion_body_blocks()
+                body_changed = bool(self.hashes.changed(rma, _body(body)) if body
+                                    else self.hashes.changed(rma, {}, _body([])))
+                if not changed and not body_changed and pending is None:
+                    if self.stats is not None:
+                        self.stats.unchanged += 1
+                    return UNCHANGED
+                if pending is None:
+                    pending = self._pending[rma] = _Pending(rma, page_id=page_id)
+                    result = QUEUED
+                else:
+                    result = MERGED
+                pending.page_id = page_id
+                pending.record = None
+                pending.body = body if body_changed else None
+                pending.properties.update(changed)
+                # Pole wyczyszczone po wcześniejszym, jeszcze niewysłanym zapisie
+                for name in pending.properties.keys() & cleared.keys():
+                    pending.properties[name] = cleared[name]
+            if result == MERGED and self.stats is not None:
+                self.stats.coalesced += 1
+        return result
+
+    def due(self) -> bool:
+        return bool(self._pending) and (
+            len(self._pending) >= self.max_pending
+            or time.monotonic() - self._last_flush >= self.interval
+        )
+
+    def flush_if_due(self) -> List[Tuple[int, bool]]:
+        return self.flush() if self.due() else []
+
+    def flush(self) -> List[Tuple[int, bool]]:
+        """Wysyła wszystko, co czeka. Zwraca (rma, ok) dla każdego wysłanego RMA."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._last_flush = time.monotonic()
+            results = [(p.rma, self._send_safe(p)) for p in batch.values()]
+        failed = [rma for rma, ok in results if not ok]
+        if results:
+            event("notion_flush", pending=len(results), failed=len(failed))
+        if failed:
+            with self._lock:
+                self._failures.extend(failed)
+        return results
+
+    def _send_safe(self, pending: _Pending) -> bool:
+        """_send, w którym wyjątek (np. zablokowana baza skrótów) to błąd tego RMA, nie całej paczki."""
+        try:
+            return self._send(pending)
+        except Exception as e:
+            log.exception("Błąd wysyłki RMA %s do Notion: %s", pending.rma, e)
+            return False
+
+    def _send(self, pending: _Pending) -> bool:
+        if pending.record is not None:
+            ok = self.notion.add_crm_data_to_notion(pending.record)
+            if ok:
+                self.hashes.store(pending.rma, pending.record.notion_properties(self.notion.users))
+                body = pending.record.notion_body_blocks()
+                if body:
+                    self.hashes.store(pending.rma, _body(body))
+                self.sent += 1
+            return ok
+        # Ponowne porównanie tuż przed wysyłką – inny proces mógł już to zapisać
+        changed = self.hashes.changed(pending.rma, pending.properties)
+        body = pending.body
+        if body is not None and not self.hashes.changed(pending.rma, _body(body)):
+            body = None
+        if not changed and body is None:
+            if self.stats is not None:
+                self.stats.unchanged += 1
+            return True
+        ok = True
+        if changed:
+            ok = self.notion.update_page_properties(pending.page_id, changed)
+            if ok:
+                self.hashes.store(pending.rma, changed)
+        if ok and body is not None:
+            ok = self.notion.replace_body_blocks(pending.page_id, body)
+            if ok:
+                self.hashes.store(pending.rma, _body(body))
+        if ok:
+            self.sent += 1
+        return ok
+
+    def take_failures(self) -> List[int]:
+        """RMA, których wysyłka się nie udała (od ostatniego wywołania)."""
+        with self._lock:
+            failed, self._failures = self._failures, []
+        return failed
+
+    def close(self) -> List[Tuple[int, bool]]:
+        return self.flush()
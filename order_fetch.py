@@ -0,0 +1,255 @@
+# order_fetch.py
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from playwright.async_api import BrowserContext, Page
+
+import config
+from gincore_playwright import (
+    CRMSession,
+    SessionExpiredError,
+    TransientNavigationError,
+    _is_login_url,
+    _read_locator,
+    _selector,
+)
+from locators import FieldValues, chains_for
+from run_log import event, log
+
+try:  # opcjonalne: bez lxml zostaje pełne renderowanie
+    import lxml.html as lxml_html
+except ImportError:  # pragma: no cover
+    lxml_html = None
+
+try:  # lokatory css_selector w trybie request
+    from cssselect import GenericTranslator, SelectorError
+except ImportError:  # pragma: no cover
+    GenericTranslator = None
+    log.warning("Brak pakietu cssselect: pola z lokatorem css_selector nie będą czytane w trybie request "
+                "(pip install -r requirements.txt).")
+
+OrderResult = Tuple[bool, bool, Optional[Dict[str, Optional[str]]]]
+
+
+# --- Lokatory -> XPath dla lxml ---
+def _xpath(kind: str, value: str) -> Optional[str]:
+    kind = kind.lower()
+    if kind == "xpath":
+        return value
+    if kind == "id":
+        return f'//*[@id="{value}"]'
+    if kind == "name":
+        return f'//*[@name="{value}"]'
+    if kind == "class_name":
+        return f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {value} ')]"
+    if kind == "tag_name":
+        return f"//{value}"
+    if kind == "link_text":
+        return f'//a[normalize-space(.)="{value}"]'
+    if kind == "partial_link_text":
+        return f'//a[contains(normalize-space(.), "{value}")]'
+    if kind == "css_selector":
+        if GenericTranslator is None:
+            return None
+        try:
+            return GenericTranslator().css_to_xpath(value)
+        except SelectorError:
+            return None
+    return None
+
+
+def _element_value(el) -> Optional[str]:
+    """Odpowiednik input_value()/inner_text() z read_crm_field_values."""
+    tag = (el.tag or "").lower() if isinstance(el.tag, str) else ""
+    if tag == "input":
+        v = el.get("value", "")
+    elif tag == "select":
+        opts = el.xpath(".//option[@selected]") or el.xpath(".//option")[:1]
+        v = (opts[0].get("value") or opts[0].text_content()) if opts else ""
+    else:
+        v = el.text_content()
+    v = (v or "").strip()
+    return v or None
+
+
+def _lookup(doc, locator) -> Tuple[bool, Optional[str]]:
+    """(znaleziono, wartość) dla jednego lokatora."""
+    xp = _xpath(*locator)
+    if not xp:
+        return False, None
+    try:
+        found = doc.xpath(xp)
+    except Exception:
+        return False, None
+    if not found:
+        return False, None
+    first = found[0]
+    if isinstance(first, str):  # np. XPath kończący się na /text() albo @atrybut
+        return True, first.strip() or None
+    return True, _element_value(first)
+
+
+def _find(doc, locator) -> Optional[str]:
+    return _lookup(doc, locator)[1]
+
+
+def _find_chain(doc, chains, field: str) -> Tuple[bool, Optional[str]]:
+    """Jak read_crm_field_values: zapamiętany lokator najpierw, potem alternatywy."""
+    for n, (index, locator) in enumerate(chains.ordered(field)):
+        found, value = _lookup(doc, locator)
+        if found:
+            chains.hit(field, index, first=n == 0)
+            return True, value
+    chains.miss(field)
+    return False, None
+
+
+def parse_crm_field_values(html: str, cfg=None) -> Tuple[bool, bool, FieldValues, list]:
+    """
+    Parsuje HTML zlecenia względem CRM_DATA_FIELDS_TO_READ.
+    Zwraca (strona_zlecenia, not_found, dane, pola_do_renderowania).
+    """
+    cfg = cfg or config
+    doc = lxml_html.fromstring(html or "<html></html>")
+    js_fields = getattr(cfg, "CRM_JS_ONLY_FIELDS", {})
+    chains = chains_for(cfg)
+    data = FieldValues()
+    needs_render = []
+    for field in chains.chains:
+        if field in js_fields:
+            found, v = _lookup(doc, js_fields[field])
+            if v is None:
+                found = False
+                needs_render.append(field)
+        else:
+            found, v = _find_chain(doc, chains, field)
+        data[field] = v or None
+        if found:
+            data.found.add(field)
+    is_order = any(v is not None for v in data.values())
+    not_found = not is_order and _find(doc, cfg.CRM_RMA_NOT_FOUND_INDICATOR) is not None
+    return is_order, not_found, data, needs_render
+
+
+class RequestFetcher:
+    """
+    Pobieranie zleceń przez APIRequestContext kontekstu przeglądarki (te same
+    ciasteczka, bez renderowania). Wiele pobrań naraz na jednym kontekście;
+    strona render_page służy tylko do pól wymagających JS i do logowania.
+    """
+
+    def __init__(self, session: CRMSession, context: BrowserContext, render_page: Page, concurrency: int = 8):
+        self.session = session
+        self.context = context
+        self.render_page = render_page
+        self.cfg = session.cfg
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._render_lock = asyncio.Lock()
+        self.renders = 0
+
+    async def fetch(self, rma_number: int) -> OrderResult:
+        """(page_ok, not_found, dane) – (False, False, None) po wyczerpaniu ponowień."""
+        missing = self.session.missing
+        if missing is not None and missing.should_skip(rma_number):
+            if self.session.stats is not None:
+                self.session.stats.cached_missing += 1
+            return (False, True, None)
+        if lxml_html is None:
+            return await self._render_all(rma_number)
+        async with self._sem:
+            t0 = time.monotonic()
+            result = await self._fetch_with_retry(rma_number)
+            self.session.note_result(rma_number, result[0], result[1])
+            outcome = "ok" if result[0] else "not_found" if result[1] else "failed"
+            event("order", rma=rma_number, stage="fetch", ms=round((time.monotonic() - t0) * 1000), outcome=outcome)
+            return result
+
+    async def _fetch_with_retry(self, rma_number: int) -> OrderResult:
+        relogins = 0
+        attempt = 0
+        retry = self.session.retry
+        while attempt < retry.attempts:
+            if attempt:
+                if self.session.stats is not None:
+                    self.session.stats.retries += 1
+                await asyncio.sleep(retry.delay_for(attempt))
+            seen = self.session.generation
+            try:
+                result = await self._fetch_once(rma_number, retry.timeout_for(attempt))
+            except SessionExpiredError:
+                if relogins >= self.session.max_relogins:
+                    break
+                relogins += 1
+                async with self._render_lock:
+                    await self.session.relogin(self.render_page, seen)
+                continue
+            except TransientNavigationError:
+                attempt += 1
+                continue
+            if result[0] or result[1]:
+                return result
+            attempt += 1
+        if self.session.stats is not None:
+            self.session.stats.transient_failures += 1
+        return (False, False, None)
+
+    async def _fetch_once(self, rma_number: int, timeout: int) -> OrderResult:
+        base = self.cfg.CRM_REPAIR_ORDER_BASE_URL
+        url = f"{base if base.endswith('/') else base + '/'}{rma_number}"
+        try:
+            response = await self.context.request.get(url, timeout=timeout)
+        except Exception as e:
+            raise TransientNavigationError(f"{url}: {e}") from e
+        if _is_login_url(response.url, self.cfg):
+            raise SessionExpiredError(url)
+        if response.status == 404:
+            return (False, True, None)
+        if response.status >= 500:
+            raise TransientNavigationError(f"{url}: HTTP {response.status}")
+        body = await response.body()
+        if self.session.stats is not None:
+            self.session.stats.bytes_in += len(body)
+        html = body.decode("utf-8", errors="replace")
+        is_order, not_found, data, needs_render = parse_crm_field_values(html, self.cfg)
+        if not_found:
+            return (False, True, None)
+        if not is_order:
+            return (False, False, None)
+        if needs_render:
+            rendered = await self._render_fields(rma_number, needs_render)
+            data.update(rendered)
+            data.found |= rendered.found
+        return (True, False, data)
+
+    async def _render_fields(self, rma_number: int, fields: list) -> FieldValues:
+        """Pełne renderowanie tylko dla pól, których nie da się odczytać z HTML."""
+        async with self._render_lock:
+            self.renders += 1
+            page_ok, _ = await self.session.open_repair_order(self.render_page, rma_number)
+            out = FieldValues({f: None for f in fields})
+            if not page_ok:
+                return out
+            chains = chains_for(self.cfg)
+            budget = self.cfg.LOCATOR_BUDGET_MS
+            for field in fields:
+                for n, (index, (kind, val)) in enumerate(chains.ordered(field)):
+                    found, v = await _read_locator(
+                        self.render_page, _selector(kind, val), budget if n == 0 else 0, budget
+                    )
+                    if found:
+                        chains.hit(field, index, first=n == 0)
+                        out[field] = v
+                        out.found.add(field)
+                        break
+                else:
+                    chains.miss(field)
+            return out
+
+    async def _render_all(self, rma_number: int) -> OrderResult:
+        from gincore_playwright import read_crm_field_values
+        async with self._render_lock:
+            self.renders += 1
+            page_ok, not_found = await self.session.open_repair_order(self.render_page, rma_number)
+            data = await read_crm_field_values(self.render_page, self.cfg) if page_ok else None
+            return (page_ok, not_found, data)
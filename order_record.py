@@ -0,0 +1,257 @@
+# order_record.py
+import json
+import re
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+# Pole CRM (nazwa jak w CRM_DATA_FIELDS_TO_READ / eksporcie) -> atrybut rekordu
+FIELD_ATTRS: Dict[str, str] = {
+    "Klient": "client",
+    "Numer telefonu": "phone",
+    "Producent": "producer",
+    "Typ urządzenia": "device_type",
+    "Model": "model",
+    "Numer Seryjny": "serial",
+    "Uwagi": "notes",
+    "Opis Usterki": "defect",
+    "Stan wizualny urządzenia": "visual",
+    "Technik": "technician",
+}
+
+# Kolumny eksportu (jsonl / csv / sqlite) – kolejność jak dotąd: RMA, pola CRM, URL
+EXPORT_FIELDS: Tuple[str, ...] = ("RMA", *FIELD_ATTRS, "URL")
+_EXPORT_ATTRS = attrgetter("rma", *FIELD_ATTRS.values(), "url")
+
+# Tabela w konsoli: (etykieta z kolorem, atrybut)
+_TABLE = (
+    ("RMA", "rma", "bold cyan"),
+    ("Klient", "client", "bright_blue"),
+    ("Numer telefonu", "phone", "bright_cyan"),
+    ("Typ urządzenia", "device_type", "green"),
+    ("Producent", "producer", "bright_green"),
+    ("Model", "model", "bright_green"),
+    ("Numer Seryjny", "serial", "magenta"),
+    ("Opis Usterki", "defect", "yellow"),
+    ("Stan wizualny urządzenia", "visual", "yellow"),
+    ("Technik", "technician", "bright_green"),
+    ("Uwagi", "notes", "bright_magenta"),
+    ("URL", "url", "bright_blue"),
+)
+_TABLE_LABELS = tuple(f"[{color}]{name}[/{color}]" for name, _, color in _TABLE)
+_TABLE_ATTRS = attrgetter(*(attr for _, attr, _ in _TABLE))
+
+# Właściwości Notion budowane wprost z atrybutów: (atrybut, property, typ)
+_NOTION = (
+    ("client", "Klient", "rich_text"),
+    ("phone", "Numer telefonu", "phone_number"),
+    ("producer", "Producent", "select"),
+    ("device_type", "Typ Urządzenia", "select"),
+    ("model", "Model", "rich_text"),
+    ("serial", "Numer Seryjny (SN)", "rich_text"),
+    ("notes", "Uwagi (obsługa)", "rich_text"),
+    ("defect", "Opis Usterki (Klient)", "rich_text"),
+    ("visual", "Stan wizualny urządzenia", "rich_text"),
+)
+
+# Pusta wartość property danego typu (czyszczenie pola w Notion)
+_EMPTY = {
+    "rich_text": {"rich_text": []},
+    "select": {"select": None},
+    "phone_number": {"phone_number": None},
+    "people": {"people": []},
+    "url": {"url": None},
+}
+
+# Pola wielowierszowe zachowują podział na linie; za długie idą do treści strony
+_MULTILINE = {"notes", "defect", "visual"}
+# Nagłówki sekcji treści strony z pełnym tekstem tych pól (notion_body_blocks)
+NOTION_BODY_HEADINGS = frozenset(prop for attr, prop, _ in _NOTION if attr in _MULTILINE)
+
+# Limity Notion: znaki w jednym obiekcie text, obiekty w tablicy rich_text,
+# bloki w jednym żądaniu (children przy create / blocks.children.append)
+NOTION_TEXT_LIMIT = 2000
+NOTION_RICH_TEXT_ITEMS = 100
+NOTION_BLOCKS_PER_REQUEST = 100
+
+_TECH_SUFFIX = re.compile(r"\s*\(.*\)\s*$")
+_PHONE_SEPARATORS = re.compile(r"[\s\-.()]+")
+# Kilka numerów w jednym polu: "600 123 456 / 601 222 333", "600123456, 601222333"
+_PHONE_LIST = re.compile(r"\s*[/,;]\s*")
+_PHONE_NUMBER = re.compile(r"\+?\d{7,15}")
+
+
+def _utf16_len(text: str) -> int:
+    # Notion liczy długość w jednostkach UTF-16 (emoji = 2)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def text_chunks(text: str, limit: int = NOTION_TEXT_LIMIT) -> List[str]:
+    """Dzieli tekst na kawałki mieszczące się w limicie, najchętniej na spacji."""
+    chunks = []
+    while text:
+        piece = text[:limit]
+        excess = _utf16_len(piece) - limit
+        while excess > 0:
+            piece = piece[:-max(1, excess // 2)]
+            excess = _utf16_len(piece) - limit
+        if len(piece) < len(text):
+            cut = max(piece.rfind(" "), piece.rfind("\n"))
+            if cut > len(piece) // 2:
+                piece = piece[:cut + 1]
+        chunks.append(piece)
+        text = text[len(piece):]
+    return chunks
+
+
+def rich_text(text: str) -> List[dict]:
+    return [{"text": {"content": chunk}} for chunk in text_chunks(text)]
+
+
+def _summary(text: str) -> str:
+    limit = config.NOTION_SUMMARY_CHARS
+    head = text[:limit].rsplit(" ", 1)[0] if len(text) > limit else text
+    return f"{head.rstrip()}… (pełny tekst w treści strony)"
+
+
+def _clean(attr: str, value: Optional[str]) -> Optional[str]:
+    """Jedyne miejsce normalizacji wartości z CRM."""
+    if value is None:
+        return None
+    if attr in _MULTILINE:
+        value = "\n".join(line.rstrip() for line in value.strip().splitlines())
+    else:
+        value = " ".join(value.split())
+    if attr == "technician":
+        # "Marian (2 w toku)" -> "Marian"
+        value = _TECH_SUFFIX.sub("", value).strip()
+    elif attr == "phone":
+        value = ", ".join(_phone(part) for part in _PHONE_LIST.split(value) if part)
+    return value or None
+
+
+def _phone(value: str) -> str:
+    """"+48 600-123 456" -> "+48600123456"; coś, co nie jest jednym numerem, zostaje bez zmian."""
+    digits = _PHONE_SEPARATORS.sub("", value)
+    return digits if _PHONE_NUMBER.fullmatch(digits) else value
+
+
+@dataclass(slots=True)
+class OrderRecord:
+    """Jedno zlecenie z CRM: stałe pola zamiast słownika z nazwami wyświetlanymi."""
+
+    rma: int
+    client: Optional[str] = None
+    phone: Optional[str] = None
+    producer: Optional[str] = None
+    device_type: Optional[str] = None
+    model: Optional[str] = None
+    serial: Optional[str] = None
+    notes: Optional[str] = None
+    defect: Optional[str] = None
+    visual: Optional[str] = None
+    technician: Optional[str] = None
+    url: Optional[str] = None
+    # Atrybuty, których element znaleziono w CRM (None – nieznane, np. stary słownik)
+    found: Optional[frozenset] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_crm(cls, rma: int, data: Dict[str, Optional[str]], base_url: Optional[str] = None) -> "OrderRecord":
+        """Buduje rekord z wyniku read_crm_field_values (nazwy pól z configu)."""
+        rma = int(rma)
+        values = {attr: _clean(attr, data.get(name)) for name, attr in FIELD_ATTRS.items()}
+        base = base_url if base_url is not None else config.CRM_REPAIR_ORDER_BASE_URL
+        found = getattr(data, "found", None)
+        if found is not None:
+            found = frozenset(FIELD_ATTRS[name] for name in found if name in FIELD_ATTRS)
+        return cls(rma, url=f"{base}{rma}" if base else None, found=found, **values)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Optional[str]]) -> "OrderRecord":
+        """Dla starych wywołań ze słownikiem zawierającym też "RMA" i "URL"."""
+        values = {attr: _clean(attr, data.get(name)) for name, attr in FIELD_ATTRS.items()}
+        return cls(int(data.get("RMA") or 0), url=data.get("URL") or None, **values)
+
+    def export_row(self) -> tuple:
+        """Wartości w kolejności EXPORT_FIELDS."""
+        return _EXPORT_ATTRS(self)
+
+    def to_json(self) -> str:
+        return json.dumps(dict(zip(EXPORT_FIELDS, _EXPORT_ATTRS(self))), ensure_ascii=False)
+
+    def table_rows(self) -> List[Tuple[str, str]]:
+        """(etykieta z kolorem rich, wartość) w kolejności tabeli konsoli."""
+        return [(label, str(v) if v else "-") for label, v in zip(_TABLE_LABELS, _TABLE_ATTRS(self))]
+
+    def long_text(self, attr: str) -> bool:
+        """Czy pole wielowierszowe przekracza limit jednego obiektu text."""
+        v = getattr(self, attr)
+        return attr in _MULTILINE and bool(v) and _utf16_len(v) > NOTION_TEXT_LIMIT
+
+    def notion_properties(self, users: Optional[Dict[str, str]] = None) -> dict:
+        """
+        Properties Notion wyłącznie z danych CRM (bez statusu, managera,
+        priorytetu). Puste wartości są pomijane. Za długie pola wielowierszowe
+        mają tu skrót – pełny tekst jest w notion_body_blocks().
+        users: mapa technik -> ID osoby w Notion (najemca; domyślnie z config).
+        """
+        users = users if users is not None else config.USERS_NAME_TO_NOTION_ID_MAP
+        properties = {"RMA": {"title": [{"text": {"content": f"№ {self.rma}"}}]}} if self.rma else {}
+        for attr, prop, kind in _NOTION:
+            v = getattr(self, attr)
+            if not v:
+                continue
+            if kind == "rich_text":
+                text = _summary(v) if self.long_text(attr) else v
+                properties[prop] = {"rich_text": rich_text(text)[:NOTION_RICH_TEXT_ITEMS]}
+            elif kind == "select":
+                properties[prop] = {"select": {"name": v}}
+            else:
+                properties[prop] = {kind: v}
+        if self.technician:
+            notion_user_id = users.get(self.technician)
+            if notion_user_id:
+                properties["Technik"] = {"people": [{"id": notion_user_id}]}
+        if self.url:
+            properties["URL"] = {"url": self.url}
+        return properties
+
+    def notion_cleared(self, users: Optional[Dict[str, str]] = None) -> dict:
+        """
+        Wartości czyszczące dla properties, które notion_properties() pomija,
+        bo pole w CRM jest puste. Tylko dla pól, których element się znalazł
+        (found) – brak elementu nie znaczy, że pole wyczyszczono. Wysyłane
+        tylko tam, gdzie wcześniej coś zapisano (FieldHashStore.changed).
+        """
+        present = self.notion_properties(users)
+        found = self.found or frozenset()
+        cleared = {prop: _EMPTY[kind] for attr, prop, kind in _NOTION if prop not in present and attr in found}
+        if "Technik" not in present and "technician" in found:
+            cleared["Technik"] = _EMPTY["people"]
+        if "URL" not in present:
+            cleared["URL"] = _EMPTY["url"]
+        return cleared
+
+    def notion_body_blocks(self) -> List[dict]:
+        """
+        Pełna treść za długich pól jako bloki strony: nagłówek i akapit na pole.
+        Akapit mieści do 100 kawałków po 2000 znaków, więc bloków jest minimum.
+        """
+        blocks: List[dict] = []
+        for attr, prop, kind in _NOTION:
+            if kind != "rich_text" or not self.long_text(attr):
+                continue
+            blocks.append({"object": "block", "type": "heading_3",
+                           "heading_3": {"rich_text": rich_text(prop)}})
+            items = rich_text(getattr(self, attr))
+            for i in range(0, len(items), NOTION_RICH_TEXT_ITEMS):
+                blocks.append({"object": "block", "type": "paragraph",
+                               "paragraph": {"rich_text": items[i:i + NOTION_RICH_TEXT_ITEMS]}})
+        return blocks
+
+
+def as_record(crm_data) -> OrderRecord:
+    """OrderRecord bez zmian, słownik – przez from_dict."""
+    return crm_data if isinstance(crm_data, OrderRecord) else OrderRecord.from_dict(crm_data)
@@ -0,0 +1,115 @@
+# page_pool.py
+import os
+import resource
+import sys
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from playwright.async_api import Browser, BrowserContext, Page
+
+
+def process_rss_mb() -> float:
+    """Bieżące RSS procesu Pythona w MB (Linux: /proc, inaczej szczyt z getrusage)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS zwraca bajty, Linux kilobajty
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def browser_heap_mb(page: Page) -> Optional[float]:
+    """Zajęta sterta JS strony w MB (performance.memory – tylko Chromium)."""
+    try:
+        used = await page.evaluate(
+            "() => performance.memory ? performance.memory.usedJSHeapSize : null"
+        )
+    except Exception:
+        return None
+    return used / (1024 * 1024) if used else None
+
+
+@dataclass
+class RecycleInfo:
+    navigations: int
+    reason: str
+    python_rss_mb: float
+    browser_heap_mb: Optional[float]
+
+
+class PageRecycler:
+    """
+    Jedna "robocza" strona, wymieniana automatycznie po max_navigations
+    przejściach albo gdy sterta JS przekroczy max_heap_mb. Przy recycle_context
+    wymieniany jest też kontekst – ciasteczka sesji przenosimy przez storage_state,
+    więc nie trzeba logować się ponownie.
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        context: BrowserContext,
+        max_navigations: int = 500,
+        max_heap_mb: float = 512.0,
+        heap_check_every: int = 25,
+        recycle_context: bool = False,
+        on_recycle: Optional[Callable[[RecycleInfo], None]] = None,
+    ):
+        self.browser = browser
+        self.context = context
+        self.page: Optional[Page] = None
+        self.max_navigations = max_navigations
+        self.max_heap_mb = max_heap_mb
+        self.heap_check_every = max(1, heap_check_every)
+        self.recycle_context = recycle_context
+        self.on_recycle = on_recycle
+        self.navigations = 0
+        self.recycles = 0
+
+    async def start(self) -> Page:
+        self.page = await self.context.new_page()
+        return self.page
+
+    async def after_navigation(self) -> Page:
+        """Zlicza nawigację i w razie potrzeby wymienia stronę. Zwraca aktualną stronę."""
+        self.navigations += 1
+        reason = None
+        heap = None
+        if self.navigations >= self.max_navigations:
+            reason = f"{self.navigations} nawigacji"
+        elif self.navigations % self.heap_check_every == 0:
+            heap = await browser_heap_mb(self.page)
+            if heap is not None and heap >= self.max_heap_mb:
+                reason = f"sterta JS {heap:.0f} MB"
+        if reason:
+            await self.recycle(reason, heap)
+        return self.page
+
+    async def recycle(self, reason: str, heap: Optional[float] = None) -> Page:
+        if heap is None:
+            heap = await browser_heap_mb(self.page)
+        info = RecycleInfo(self.navigations, reason, process_rss_mb(), heap)
+
+        old_page, old_context = self.page, self.context
+        if self.recycle_context:
+            state = await old_context.storage_state()
+            self.context = await self.browser.new_context(storage_state=state)
+        self.page = await self.context.new_page()
+        try:
+            await old_page.close()
+            if self.recycle_context:
+                await old_context.close()
+        except Exception:
+            pass
+
+        self.navigations = 0
+        self.recycles += 1
+        if self.on_recycle:
+            self.on_recycle(info)
+        return self.page
+
+    async def close(self) -> None:
+        if self.page is not None:
+            await self.page.close()
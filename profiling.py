@@ -0,0 +1,100 @@
+# profiling.py
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import time
+from typing import List, Optional, Set, Tuple
+
+from playwright.async_api import BrowserContext
+
+import config
+
+
+class SlowOrderTracer:
+    """
+    Śledzenie Playwright tylko dla wolnych zleceń: tracing działa w kontekście
+    przez cały przebieg, ale każde RMA to osobny "chunk" – zapisujemy go na dysk
+    tylko wtedy, gdy czas zlecenia przekroczy threshold_ms.
+    """
+
+    def __init__(self, out_dir: str, threshold_ms: float = 5000.0, keep: int = 20):
+        self.out_dir = out_dir
+        self.threshold_ms = threshold_ms
+        self.keep = keep
+        self._started: Set[int] = set()
+        # min-heap (ms, rma, ścieżka) – zostaje keep najwolniejszych
+        self._slowest: List[Tuple[float, int, Optional[str]]] = []
+
+    async def begin(self, context: BrowserContext) -> None:
+        if id(context) not in self._started:
+            await context.tracing.start(screenshots=True, snapshots=True)
+            self._started.add(id(context))
+        await context.tracing.start_chunk()
+
+    async def end(self, context: BrowserContext, rma: int, elapsed_ms: float) -> Optional[str]:
+        path = None
+        if elapsed_ms >= self.threshold_ms:
+            os.makedirs(self.out_dir, exist_ok=True)
+            path = os.path.join(self.out_dir, f"trace_rma_{rma}.zip")
+            await context.tracing.stop_chunk(path=path)
+        else:
+            await context.tracing.stop_chunk()
+        item = (elapsed_ms, rma, path)
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heappushpop(self._slowest, item)
+        return path
+
+    async def close(self, context: BrowserContext) -> None:
+        if id(context) in self._started:
+            self._started.discard(id(context))
+            try:
+                await context.tracing.stop()
+            except Exception:
+                pass
+
+    def slowest(self) -> List[Tuple[float, int, Optional[str]]]:
+        return sorted(self._slowest, reverse=True)
+
+
+class RunProfiler:
+    """cProfile nad całą pętlą zdarzeń + tracer wolnych zleceń; wynik w out_dir."""
+
+    def __init__(self, out_dir: Optional[str] = None, trace_threshold_ms: float = 5000.0, top: int = 30):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.out_dir = out_dir or os.path.join(config.STATE_DIR, "profiles", stamp)
+        self.top = top
+        self.tracer = SlowOrderTracer(os.path.join(self.out_dir, "traces"), trace_threshold_ms)
+        self._profile = cProfile.Profile()
+
+    def __enter__(self) -> "RunProfiler":
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._profile.disable()
+
+    def write_summary(self) -> str:
+        """Zapisuje profile.pstats i summary.txt; zwraca ścieżkę podsumowania."""
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._profile.dump_stats(os.path.join(self.out_dir, "profile.pstats"))
+
+        buf = io.StringIO()
+        buf.write(f"== Najgorętsze funkcje (czas własny, top {self.top}) ==\n")
+        stats = pstats.Stats(self._profile, stream=buf)
+        stats.sort_stats("tottime").print_stats(self.top)
+        buf.write(f"\n== Najgorętsze funkcje (czas łączny, top {self.top}) ==\n")
+        stats.sort_stats("cumulative").print_stats(self.top)
+
+        buf.write(f"\n== Najwolniejsze RMA (próg śledzenia {self.tracer.threshold_ms:.0f} ms) ==\n")
+        for elapsed_ms, rma, path in self.tracer.slowest():
+            trace = f"  -> {path}" if path else ""
+            buf.write(f"RMA {rma}: {elapsed_ms:.0f} ms{trace}\n")
+
+        summary_path = os.path.join(self.out_dir, "summary.txt")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+        return summary_path
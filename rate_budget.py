@@ -0,0 +1,118 @@
+# rate_budget.py
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import config
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: tylko limit w obrębie procesu
+    fcntl = None
+
+# Proces bez zapytań przez tyle sekund przestaje się liczyć do podziału
+STALE_AFTER = 15.0
+
+
+class SharedRateLimiter:
+    """
+    Token bucket wspólny dla wszystkich procesów na jednym hoście (sync z crona,
+    ręczny single, refresh...). Stan leży w małym pliku JSON chronionym flock.
+    Aktywne procesy dostają równe części budżetu: przy n procesach każdy może
+    wziąć żeton najwyżej co n/rate s; samotny proces ma cały budżet.
+    Interfejs dla NotionAPI: acquire() i licznik waited (sekundy czekania).
+    """
+
+    def __init__(self, path: str, rate: float = 3.0, burst: int = 3):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.waited = 0.0
+        self.pid = str(os.getpid())
+        self._local = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _load(self, f) -> dict:
+        f.seek(0)
+        raw = f.read()
+        try:
+            state = json.loads(raw) if raw else {}
+        except ValueError:
+            state = {}
+        state.setdefault("tokens", float(self.burst))
+        state.setdefault("updated", time.time())
+        state.setdefault("procs", {})
+        return state
+
+    @staticmethod
+    def _save(f, state: dict) -> None:
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(state))
+        f.flush()
+
+    def _try_take(self) -> float:
+        """Zwraca 0, jeśli żeton pobrany, inaczej sugerowany czas czekania (s)."""
+        with open(self.path, "a+", encoding="utf-8") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                state = self._load(f)
+                now = time.time()
+                elapsed = max(0.0, now - state["updated"])
+                state["tokens"] = min(self.burst, state["tokens"] + elapsed * self.rate)
+                state["updated"] = now
+
+                procs: Dict[str, dict] = {
+                    pid: p for pid, p in state["procs"].items() if now - p.get("seen", 0) < STALE_AFTER
+                }
+                me = procs.setdefault(self.pid, {"next": 0.0})
+                me["seen"] = now
+                share_gap = len(procs) / self.rate if len(procs) > 1 else 0.0
+
+                wait = max(0.0, me.get("next", 0.0) - now)
+                if state["tokens"] < 1:
+                    wait = max(wait, (1 - state["tokens"]) / self.rate)
+                if wait <= 0:
+                    state["tokens"] -= 1
+                    me["next"] = now + share_gap
+                state["procs"] = procs
+                self._save(f, state)
+                return wait
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self) -> None:
+        # Wątki jednego procesu ustawiają się w kolejce lokalnie, a plik blokujemy krótko
+        with self._local:
+            while True:
+                wait = self._try_take()
+                if wait <= 0:
+                    return
+                self.waited += wait
+                time.sleep(wait)
+
+
+_limiters: Dict[str, SharedRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(token: str, rate: Optional[float] = None) -> SharedRateLimiter:
+    """
+    Jeden limiter na integrację Notion (token) w procesie; plik stanu też
+    per token, bo Notion liczy limit per integracja.
+    """
+    key = hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:12]
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            path = os.path.join(config.STATE_DIR, f"notion_rate_{key}.json")
+            limiter = SharedRateLimiter(path, rate=rate or config.NOTION_RATE_LIMIT)
+            _limiters[key] = limiter
+        elif rate:
+            limiter.rate = rate
+        return limiter
@@ -0,0 +1,119 @@
+# rescrape_scheduler.py
+import heapq
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+from field_hashes import FieldHashStore
+
+HOUR = 3600.0
+
+
+class PageLoadBudget:
+    """
+    Godzinowy budżet wczytań stron CRM wspólny dla procesów (SQLite, okno
+    kroczące). Sync tylko zgłasza zużycie (charge) i nigdy nie czeka – nowe
+    RMA mają pierwszeństwo; ponowne odczyty dostają to, co zostało.
+    """
+
+    def __init__(self, path: Optional[str] = None, per_hour: Optional[int] = None, flush_every: int = 25):
+        self.path = path or config.RESCRAPE_DB
+        self.per_hour = per_hour if per_hour is not None else config.RESCRAPE_BUDGET_PER_HOUR
+        self.flush_every = max(1, flush_every)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS loads (
+                ts REAL NOT NULL,
+                source TEXT NOT NULL,
+                count INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS loads_ts ON loads (ts);
+            """
+        )
+        self.conn.commit()
+        self._pending: Dict[str, int] = {}
+
+    def charge(self, count: int = 1, source: str = "sync") -> None:
+        """Zużycie budżetu; zapis do bazy co flush_every wczytań."""
+        self._pending[source] = self._pending.get(source, 0) + count
+        if sum(self._pending.values()) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO loads (ts, source, count) VALUES (?, ?, ?)",
+                [(now, source, count) for source, count in self._pending.items()],
+            )
+            self.conn.execute("DELETE FROM loads WHERE ts < ?", (now - HOUR,))
+        self._pending.clear()
+
+    def used(self) -> int:
+        row = self.conn.execute("SELECT SUM(count) FROM loads WHERE ts >= ?", (time.time() - HOUR,)).fetchone()
+        return (row[0] or 0) + sum(self._pending.values())
+
+    def available(self) -> int:
+        return max(0, self.per_hour - self.used())
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+
+def _age_days(iso: Optional[str], now: float) -> Optional[float]:
+    if not iso:
+        return None
+    try:
+        edited = datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+    return max(0.0, (now - edited) / 86400)
+
+
+def priority(status: Optional[str], last_edited: Optional[str], activity: Optional[Tuple[int, int, float]],
+             now: float, closed_statuses=None) -> float:
+    """
+    Szansa, że ponowny odczyt coś zmieni:
+      waga statusu (zamknięte prawie zero)
+      × częstość zmian z dotychczasowych odczytów (wygładzona, bez historii 1/2)
+      × świeżość ostatniej edycji w Notion (półtrwanie RESCRAPE_HALF_LIFE_DAYS)
+      × zaległość (czas od ostatniego odczytu, pełna po dobie).
+    """
+    closed = closed_statuses if closed_statuses is not None else config.NOTION_CLOSED_STATUSES
+    weight = config.RESCRAPE_CLOSED_WEIGHT if status in closed else 1.0
+    checks, changes, last_check = activity or (0, 0, None)
+    change_rate = (changes + 1) / (checks + 2)
+    age = _age_days(last_edited, now)
+    recency = 0.5 ** (age / config.RESCRAPE_HALF_LIFE_DAYS) if age is not None else 0.5
+    staleness = min(1.0, (now - last_check) / 86400) if last_check else 1.0
+    return weight * change_rate * max(recency, 0.01) * staleness
+
+
+def plan_rescrape(pages: Iterable[tuple], hashes: FieldHashStore, limit: int,
+                  now: Optional[float] = None) -> List[Tuple[float, str, int]]:
+    """
+    pages: (page_id, rma, status, last_edited) z NotionIndex. Zwraca do limit
+    pozycji (wynik, page_id, rma) o najwyższym priorytecie, od najwyższego.
+    """
+    if limit <= 0:
+        return []
+    now = now or time.time()
+    activity = hashes.activity()
+    # Duplikaty strony jednego RMA – liczy się najpóźniej edytowana
+    latest: Dict[int, tuple] = {}
+    for page in pages:
+        if page[1] not in latest or (page[3] or "") >= (latest[page[1]][3] or ""):
+            latest[page[1]] = page
+    scored = (
+        (priority(status, edited, activity.get(rma), now), page_id, rma)
+        for page_id, rma, status, edited in latest.values()
+    )
+    return [item for item in heapq.nlargest(limit, scored) if item[0] > 0]
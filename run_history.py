@@ -0,0 +1,231 @@
+# run_history.py
+import os
+import sqlite3
+import statistics
+import time
+from typing import List, Optional
+
+from rich.table import Table
+
+import config
+from run_log import log
+from run_stats import RunStats
+
+# Kolumny runs zapisywane wprost z RunStats
+_COUNTERS = ("processed", "saved", "unchanged", "not_found", "failed", "retries",
+             "transient_failures", "relogins", "bytes_in", "bytes_out")
+
+# (metryka, etykieta, czy większa wartość jest gorsza)
+_WATCHED = (
+    ("rate", "RMA/s", False),
+    ("open_p95", "open p95 (ms)", True),
+    ("extract_p95", "extract p95 (ms)", True),
+    ("write_p95", "write p95 (ms)", True),
+    ("error_rate", "Błędy (%)", True),
+)
+# Wzrost odsetka błędów (pkt proc.) uznawany za regresję
+_ERROR_RATE_MARGIN = 5.0
+
+
+class RunHistory:
+    """
+    Historia przebiegów w SQLite: jeden wiersz na uruchomienie plus percentyle
+    etapów. Zapytania raportu idą po indeksie (command, started) i czytają
+    tylko okno ostatnich przebiegów, więc nie zwalniają z wiekiem historii.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.RUN_HISTORY_DB
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                started REAL NOT NULL,
+                command TEXT NOT NULL,
+                tenant TEXT,
+                elapsed REAL NOT NULL,
+                rate REAL NOT NULL,
+                rate_wait REAL NOT NULL,
+                {", ".join(f"{c} INTEGER NOT NULL" for c in _COUNTERS)}
+            );
+            CREATE INDEX IF NOT EXISTS runs_command_started ON runs (command, started);
+            CREATE TABLE IF NOT EXISTS run_stages (
+                run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+                stage TEXT NOT NULL,
+                samples INTEGER NOT NULL,
+                p50 REAL,
+                p95 REAL,
+                p99 REAL,
+                PRIMARY KEY (run_id, stage)
+            );
+            """
+        )
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.commit()
+
+    def record(self, stats: RunStats, command: str, tenant: Optional[str] = None) -> int:
+        """Dopisuje podsumowanie przebiegu; przy okazji usuwa wpisy starsze niż retencja."""
+        elapsed = stats.elapsed
+        row = {
+            "started": time.time() - elapsed,
+            "command": command,
+            "tenant": tenant,
+            "elapsed": elapsed,
+            "rate": stats.processed / elapsed if elapsed > 0 else 0.0,
+            "rate_wait": stats.rate_wait,
+            **{c: getattr(stats, c) for c in _COUNTERS},
+        }
+        with self.conn:
+            cur = self.conn.execute(
+                f"INSERT INTO runs ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})",
+                tuple(row.values()),
+            )
+            run_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO run_stages (run_id, stage, samples, p50, p95, p99) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, stage, int(hist.total), hist.percentile(0.5), hist.percentile(0.95),
+                     hist.percentile(0.99))
+                    for stage, hist in stats.stages.items()
+                ],
+            )
+            cutoff = time.time() - config.RUN_HISTORY_KEEP_DAYS * 86400
+            self.conn.execute("DELETE FROM runs WHERE started < ?", (cutoff,))
+        return run_id
+
+    def recent(self, command: str, limit: int, tenant: Optional[str] = None) -> List[dict]:
+        """Ostatnie przebiegi (od najnowszego) z p95 etapów jako <etap>_p95."""
+        rows = self.conn.execute(
+            "SELECT * FROM runs WHERE command = ? AND (? IS NULL OR tenant = ?) "
+            "ORDER BY started DESC LIMIT ?",
+            (command, tenant, tenant, limit),
+        ).fetchall()
+        runs = [dict(r) for r in rows]
+        if not runs:
+            return runs
+        by_id = {r["id"]: r for r in runs}
+        marks = ", ".join("?" for _ in by_id)
+        for s in self.conn.execute(
+            f"SELECT run_id, stage, p95 FROM run_stages WHERE run_id IN ({marks})", tuple(by_id)
+        ):
+            by_id[s["run_id"]][f"{s['stage']}_p95"] = s["p95"]
+        for r in runs:
+            attempted = r["processed"] + r["failed"]
+            r["error_rate"] = 100.0 * r["failed"] / attempted if attempted else 0.0
+        return runs
+
+    def daily(self, command: str, days: int, tenant: Optional[str] = None) -> List[sqlite3.Row]:
+        """Agregaty dzienne z ostatnich days dni."""
+        since = time.time() - days * 86400
+        return self.conn.execute(
+            """
+            SELECT date(r.started, 'unixepoch', 'localtime') AS day,
+                   COUNT(*) AS runs,
+                   SUM(r.processed) AS processed,
+                   SUM(r.failed) AS failed,
+                   SUM(r.processed) / NULLIF(SUM(r.elapsed), 0) AS rate,
+                   AVG(s.p95) AS open_p95,
+                   SUM(r.bytes_in) AS bytes_in,
+                   SUM(r.bytes_out) AS bytes_out
+            FROM runs r
+            LEFT JOIN run_stages s ON s.run_id = r.id AND s.stage = 'open'
+            WHERE r.command = ? AND r.started >= ? AND (? IS NULL OR r.tenant = ?)
+            GROUP BY day ORDER BY day
+            """,
+            (command, since, tenant, tenant),
+        ).fetchall()
+
+    def slowest(self, command: str, days: int, limit: int, tenant: Optional[str] = None) -> List[sqlite3.Row]:
+        """Przebiegi z najmniejszą przepustowością (z pominięciem pustych)."""
+        since = time.time() - days * 86400
+        return self.conn.execute(
+            "SELECT * FROM runs WHERE command = ? AND started >= ? AND processed > 0 "
+            "AND (? IS NULL OR tenant = ?) ORDER BY rate ASC LIMIT ?",
+            (command, since, tenant, tenant, limit),
+        ).fetchall()
+
+    def regressions(self, command: str, window: int, check: int, threshold: float,
+                    tenant: Optional[str] = None) -> List[dict]:
+        """
+        Porównuje każdy z check ostatnich przebiegów z medianą window przebiegów
+        przed nim. Zwraca metryki gorsze od bazowej o więcej niż threshold.
+        """
+        runs = self.recent(command, window + check, tenant)
+        found = []
+        for i, run in enumerate(runs[:check]):
+            base_runs = [r for r in runs[i + 1:i + 1 + window] if r["processed"]]
+            if len(base_runs) < 3 or not run["processed"]:
+                continue
+            for metric, label, higher_worse in _WATCHED:
+                values = [r[metric] for r in base_runs if r.get(metric) is not None]
+                value = run.get(metric)
+                if value is None or len(values) < 3:
+                    continue
+                base = statistics.median(values)
+                if metric == "error_rate":
+                    # Odsetek błędów porównujemy w punktach procentowych
+                    worse = value - base > _ERROR_RATE_MARGIN
+                elif base <= 0:
+                    continue
+                else:
+                    change = (value - base) / base
+                    worse = change > threshold if higher_worse else change < -threshold
+                if worse:
+                    found.append({"run": run, "label": label, "value": value, "base": base})
+        return found
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _when(ts: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+
+def _mb(n: Optional[int]) -> str:
+    return f"{(n or 0) / 1e6:.1f} MB"
+
+
+def _ms(v: Optional[float]) -> str:
+    return f"{v:.0f}" if v is not None else "-"
+
+
+def history_tables(history: RunHistory, command: str = "sync", days: int = 30, window: int = 20,
+                   check: int = 5, slowest: int = 5, tenant: Optional[str] = None) -> List[Table]:
+    """Tabele dla "stats": trend dzienny, regresje względem bazowej, najwolniejsze przebiegi."""
+    threshold = config.RUN_HISTORY_REGRESSION
+    trend = Table(title=f"Trend dzienny: {command} (ostatnie {days} dni)")
+    for col in ("Dzień", "Przebiegi", "RMA", "RMA/s", "open p95 (ms)", "Błędy", "CRM", "Notion"):
+        trend.add_column(col)
+    for d in history.daily(command, days, tenant):
+        trend.add_row(d["day"], str(d["runs"]), str(d["processed"]), f"{d['rate'] or 0:.2f}",
+                      _ms(d["open_p95"]), str(d["failed"]), _mb(d["bytes_in"]), _mb(d["bytes_out"]))
+
+    reg = Table(title=f"Regresje (mediana {window} poprzednich przebiegów, próg {threshold:.0%})")
+    for col in ("Przebieg", "Metryka", "Wartość", "Bazowa"):
+        reg.add_column(col)
+    for r in history.regressions(command, window, check, threshold, tenant):
+        reg.add_row(_when(r["run"]["started"]), r["label"], f"{r['value']:.2f}", f"{r['base']:.2f}")
+
+    slow = Table(title=f"Najwolniejsze przebiegi (ostatnie {days} dni)")
+    for col in ("Start", "Najemca", "RMA", "RMA/s", "Czas", "Ponowienia", "Błędy", "Limit Notion"):
+        slow.add_column(col)
+    for r in history.slowest(command, days, slowest, tenant):
+        slow.add_row(_when(r["started"]), r["tenant"] or "-", str(r["processed"]), f"{r['rate']:.2f}",
+                     f"{r['elapsed']:.0f} s", str(r["retries"]), str(r["failed"]), f"{r['rate_wait']:.1f} s")
+    return [trend, reg, slow]
+
+
+def record_run(stats: RunStats, command: str, tenant: Optional[str] = None, path: Optional[str] = None) -> None:
+    """Zapis przebiegu do historii; błąd zapisu nie może przerwać synchronizacji."""
+    try:
+        history = RunHistory(path)
+        try:
+            history.record(stats, command, tenant)
+        finally:
+            history.close()
+    except sqlite3.Error as e:
+        log.warning("Nie zapisano historii przebiegu: %s", e)
@@ -0,0 +1,130 @@
+# run_log.py
+"""
+Logowanie strukturalne, które nie blokuje pętli asyncio: rekordy trafiają do
+kolejki w pamięci, a zapis na dysk (z rotacją) i na konsolę robi wątek
+QueueListener. Pełna kolejka gubi rekordy zamiast wstrzymywać scrapowanie.
+"""
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from typing import Dict, Optional
+
+import config
+
+log = logging.getLogger("gincore")
+# Komunikaty per pole (bardzo częste) – próbkowane
+field_log = logging.getLogger("gincore.fields")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional["DroppingQueueHandler"] = None
+
+
+def event(name: str, level: int = logging.INFO, **fields) -> None:
+    """Zdarzenie z polami (rma, stage, ms, outcome...), np. event("open", rma=12, ms=830)."""
+    if log.isEnabledFor(level):
+        log.log(level, name, extra={"fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """Jedna linia JSON na rekord; pola z event() trafiają na najwyższy poziom."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        out.update(getattr(record, "fields", None) or {})
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Przepuszcza co every-ty rekord DEBUG z wskazanych loggerów, resztę bez zmian."""
+
+    def __init__(self, every: int, loggers=("gincore.fields",)):
+        super().__init__()
+        self.every = max(1, every)
+        self.loggers = set(loggers)
+        self._counters: Dict[str, itertools.count] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or record.name not in self.loggers:
+            return True
+        counter = self._counters.setdefault(record.name, itertools.count())
+        return next(counter) % self.every == 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, który przy pełnej kolejce liczy zgubione rekordy zamiast zgłaszać błąd."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(
+    path: Optional[str] = None,
+    level: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    backups: Optional[int] = None,
+    sample_every: Optional[int] = None,
+    queue_size: int = 10000,
+) -> logging.handlers.QueueListener:
+    """
+    Podpina root logger pod kolejkę; plik JSON z rotacją wg rozmiaru,
+    na stderr tylko ostrzeżenia i błędy. Wywołanie ponowne nic nie zmienia.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return _listener
+    path = path or config.LOG_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=max_bytes or config.LOG_MAX_BYTES,
+        backupCount=backups if backups is not None else config.LOG_BACKUPS,
+        encoding="utf-8",
+        delay=True,
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setLevel(logging.WARNING)
+    console_handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    _handler.addFilter(SamplingFilter(sample_every or config.LOG_FIELD_SAMPLE))
+    root = logging.getLogger()
+    root.handlers[:] = [_handler]
+    root.setLevel(level or config.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(
+        _handler.queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """Dopisuje zaległe rekordy i zatrzymuje wątek zapisu."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    if _handler is not None and _handler.dropped:
+        print(f"Logowanie: pominięto {_handler.dropped} rekordów (pełna kolejka).", file=sys.stderr)
@@ -0,0 +1,75 @@
+# run_stats.py
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+from rich.table import Table
+
+from latency import LatencyHistogram
+
+
+@dataclass
+class RunStats:
+    """Liczniki jednego uruchomienia (sync / single / replay) do podsumowania."""
+    started: float = field(default_factory=time.monotonic)
+    processed: int = 0
+    saved: int = 0
+    unchanged: int = 0
+    # zapisy tego samego RMA scalone w buforze przed wysłaniem do Notion
+    coalesced: int = 0
+    not_found: int = 0
+    # RMA pominięte bez nawigacji dzięki NegativeCache
+    cached_missing: int = 0
+    failed: int = 0
+    retries: int = 0
+    transient_failures: int = 0
+    relogins: int = 0
+    recycles: int = 0
+    # sekundy czekania na wspólny (międzyprocesowy) limit zapytań Notion
+    rate_wait: float = 0.0
+    # bajty HTML zleceń z CRM i payloadów wysłanych do Notion
+    bytes_in: int = 0
+    bytes_out: int = 0
+    # etap (open / extract / notion) -> histogram czasów w ms
+    stages: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    # bieżące timeouty adaptacyjne (operacja -> ms)
+    timeouts: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def observe(self, stage: str, ms: float) -> None:
+        self.stages.setdefault(stage, LatencyHistogram()).record(ms)
+
+    def summary_table(self, title: str = "Podsumowanie") -> Table:
+        table = Table(title=title, show_header=False)
+        table.add_column("Metryka", style="bold", width=28)
+        table.add_column("Wartość", style="white")
+        elapsed = self.elapsed
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        table.add_row("Przetworzone RMA", str(self.processed))
+        table.add_row("Zapisane w Notion", str(self.saved))
+        if self.unchanged:
+            table.add_row("Bez zmian", str(self.unchanged))
+        if self.coalesced:
+            table.add_row("Scalone zapisy Notion", str(self.coalesced))
+        table.add_row("Nieistniejące RMA", str(self.not_found))
+        if self.cached_missing:
+            table.add_row("Pominięte (znane braki)", str(self.cached_missing))
+        table.add_row("Błędy", str(self.failed))
+        table.add_row("Ponowienia nawigacji", str(self.retries))
+        table.add_row("Wyczerpane ponowienia", str(self.transient_failures))
+        table.add_row("Ponowne logowania", str(self.relogins))
+        table.add_row("Wymiany strony", str(self.recycles))
+        if self.rate_wait:
+            table.add_row("Czekanie na limit Notion", f"{self.rate_wait:.1f} s")
+        if self.bytes_in or self.bytes_out:
+            table.add_row("Transfer CRM / Notion", f"{self.bytes_in / 1e6:.1f} / {self.bytes_out / 1e6:.1f} MB")
+        table.add_row("Czas", f"{elapsed:.1f} s ({rate:.2f} RMA/s)")
+        for stage, hist in self.stages.items():
+            p50, p95 = hist.percentile(0.5), hist.percentile(0.95)
+            table.add_row(f"Etap {stage} p50 / p95", f"{p50:.0f} / {p95:.0f} ms")
+        for op, ms in self.timeouts.items():
+            table.add_row(f"Timeout {op}", f"{ms} ms")
+        return table
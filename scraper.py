@@ -0,0 +1,171 @@
+# scraper.py
+import asyncio
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Protocol, Tuple
+
+from playwright.async_api import Page, async_playwright
+
+import config
+from gincore_playwright import BROWSERLESS_WS, CRMSession, read_crm_field_values
+
+BACKENDS = ("playwright", "selenium")
+
+
+class Scraper(Protocol):
+    """Wspólny interfejs odczytu zleceń – jeden obiekt to jeden "pracownik"."""
+
+    async def login(self) -> bool: ...
+
+    async def open_repair_order(self, rma_number: int) -> Tuple[bool, bool]: ...
+
+    async def read_crm_field_values(self) -> Dict[str, Optional[str]]: ...
+
+    async def close(self) -> None: ...
+
+
+# --- Playwright ---
+class PlaywrightScraper:
+    """Strona Playwright + wspólna CRMSession (ponowienia, ponowne logowanie)."""
+
+    def __init__(self, session: CRMSession, page: Page):
+        self.session = session
+        self.page = page
+
+    async def login(self) -> bool:
+        return await self.session.login(self.page)
+
+    async def open_repair_order(self, rma_number: int) -> Tuple[bool, bool]:
+        return await self.session.open_repair_order(self.page, rma_number)
+
+    async def read_crm_field_values(self) -> Dict[str, Optional[str]]:
+        return await read_crm_field_values(self.page, self.session.cfg)
+
+    async def close(self) -> None:
+        await self.page.close()
+
+
+# --- Selenium w procesach roboczych ---
+# Każdy proces trzyma własny WebDriver; wywołania blokujące nie zatrzymują pętli
+# asyncio i rozkładają się na rdzenie.
+_driver = None
+
+
+def _worker_init(cfg_overrides: Optional[dict], headless: bool) -> None:
+    global _driver
+    from crm_selenium import CRMSelenium
+    cfg = None
+    if cfg_overrides:
+        from tenants import TenantConfig
+        cfg = TenantConfig("selenium", **cfg_overrides)
+    _driver = CRMSelenium(headless=headless, cfg=cfg)
+
+
+def _worker_login(username: str, password: str) -> bool:
+    return _driver.login(username, password)
+
+
+def _worker_open(rma_number: int) -> Tuple[bool, bool]:
+    return _driver.open_repair_order(rma_number)
+
+
+def _worker_read() -> Dict[str, Optional[str]]:
+    return _driver.read_crm_field_values()
+
+
+def _worker_close() -> None:
+    _driver.close()
+
+
+class SeleniumProcessScraper:
+    """
+    Jeden WebDriver w jednym procesie roboczym (ProcessPoolExecutor z jednym
+    pracownikiem), dzięki czemu open i read trafiają do tej samej przeglądarki.
+    """
+
+    def __init__(self, username: str, password: str,
+                 cfg_overrides: Optional[dict] = None, headless: bool = True):
+        self.username = username
+        self.password = password
+        self._executor = ProcessPoolExecutor(
+            max_workers=1,
+            initializer=_worker_init,
+            initargs=(cfg_overrides, headless),
+        )
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def login(self) -> bool:
+        return await self._run(_worker_login, self.username, self.password)
+
+    async def open_repair_order(self, rma_number: int) -> Tuple[bool, bool]:
+        return await self._run(_worker_open, rma_number)
+
+    async def read_crm_field_values(self) -> Dict[str, Optional[str]]:
+        return await self._run(_worker_read)
+
+    async def close(self) -> None:
+        try:
+            await self._run(_worker_close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+@asynccontextmanager
+async def open_scrapers(
+    backend: str,
+    count: int,
+    cfg=None,
+    cfg_overrides: Optional[dict] = None,
+    stats=None,
+    timeouts=None,
+    ws_endpoint: Optional[str] = None,
+) -> AsyncIterator[List[Scraper]]:
+    """
+    Tworzy count zalogowanych pracowników wybranego backendu.
+    cfg_overrides (słownik kluczy configu) trafia też do procesów Selenium,
+    bo obiektu konfiguracji nie przekazujemy między procesami.
+    """
+    cfg = cfg or config
+    count = max(1, count)
+    if backend == "selenium":
+        # Bez tego brak pakietu kończy się dopiero nieczytelnym BrokenProcessPool z procesu roboczego
+        if importlib.util.find_spec("selenium") is None:
+            raise RuntimeError("Backend selenium wymaga pakietu selenium (pip install -r requirements.txt)")
+        headless = os.getenv("SELENIUM_HEADLESS", "1") != "0"
+        scrapers = [
+            SeleniumProcessScraper(cfg.CRM_USERNAME, cfg.CRM_PASSWORD, cfg_overrides, headless)
+            for _ in range(count)
+        ]
+        try:
+            # Każdy proces ma własną przeglądarkę i własne ciasteczka
+            await asyncio.gather(*(s.login() for s in scrapers))
+            yield scrapers
+        finally:
+            await asyncio.gather(*(s.close() for s in scrapers), return_exceptions=True)
+        return
+
+    if backend != "playwright":
+        raise ValueError(f"Nieznany backend: {backend} (dostępne: {', '.join(BACKENDS)})")
+    async with async_playwright() as p:
+        ws = ws_endpoint if ws_endpoint is not None else BROWSERLESS_WS
+        if ws:
+            browser = await p.chromium.connect_over_cdp(ws)
+            context = browser.contexts[0] if browser.contexts else await browser.new_context()
+        else:
+            browser = await p.chromium.launch()
+            context = await browser.new_context()
+        session = CRMSession(cfg.CRM_USERNAME, cfg.CRM_PASSWORD, stats=stats, timeouts=timeouts, cfg=cfg)
+        scrapers = [PlaywrightScraper(session, await context.new_page()) for _ in range(count)]
+        try:
+            # Ciasteczka są wspólne dla kontekstu – wystarczy jedno logowanie
+            await scrapers[0].login()
+            yield scrapers
+        finally:
+            for s in scrapers:
+                await s.close()
+            await context.close()
+            await browser.close()
@@ -0,0 +1,224 @@
+# sinks.py
+import csv
+import os
+import sqlite3
+from typing import List, Tuple
+
+from notion_writes import NotionWriteBuffer
+from order_record import EXPORT_FIELDS, OrderRecord
+
+
+class Sink:
+    """Cel zapisu rekordów z CRM. write() zwraca True, jeśli rekord został przyjęty."""
+
+    name = "sink"
+
+    def write(self, record: OrderRecord) -> bool:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def flush_if_due(self) -> None:
+        """Opróżnia bufor czasowy, jeśli minął jego termin (wołane też bez nowych rekordów)."""
+
+    def close(self) -> None:
+        self.flush()
+
+    def take_failures(self) -> List[int]:
+        """RMA przyjęte wcześniej przez write(), których zapis nie udał się później."""
+        return []
+
+
+class NotionSink(Sink):
+    """
+    Zapis do Notion. Z FieldHashStore idzie przez NotionWriteBuffer: write()
+    tylko kolejkuje, a błędy wysyłki wychodzą później przez take_failures().
+    Bez skrótów – jedno pages.create na rekord.
+    """
+
+    name = "notion"
+
+    def __init__(self, notion=None, hashes=None, stats=None):
+        if notion is None:
+            from notion_utils import NotionAPI
+            notion = NotionAPI()
+        self.notion = notion
+        # FieldHashStore: punkt odniesienia dla bufora i późniejszego "refresh"
+        self.hashes = hashes
+        self.buffer = NotionWriteBuffer(notion, hashes, stats=stats) if hashes is not None else None
+
+    def write(self, record: OrderRecord) -> bool:
+        if self.buffer is None:
+            return self.notion.add_crm_data_to_notion(record)
+        self.buffer.put(record)
+        self.buffer.flush_if_due()
+        return True
+
+    def flush(self) -> None:
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    def flush_if_due(self) -> None:
+        if self.buffer is not None:
+            self.buffer.flush_if_due()
+
+    def take_failures(self) -> List[int]:
+        return self.buffer.take_failures() if self.buffer is not None else []
+
+
+class _BufferedSink(Sink):
+    """
+    Bufor w pamięci opróżniany co batch_size rekordów (i przy zamknięciu).
+    Trzyma gotowe wiersze (krotki w kolejności EXPORT_FIELDS albo linie JSON).
+    """
+
+    def __init__(self, path: str, batch_size: int = 500):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._buffer: list = []
+
+    def _row(self, record: OrderRecord):
+        return record.export_row()
+
+    def write(self, record: OrderRecord) -> bool:
+        self._buffer.append(self._row(record))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._write_batch(self._buffer)
+            self._buffer = []
+
+    def _write_batch(self, rows: list) -> None:
+        raise NotImplementedError
+
+
+class JsonlSink(_BufferedSink):
+    name = "jsonl"
+
+    def __init__(self, path: str, batch_size: int = 500):
+        super().__init__(path, batch_size)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _row(self, record: OrderRecord) -> str:
+        return record.to_json()
+
+    def _write_batch(self, rows) -> None:
+        self._file.write("".join(r + "\n" for r in rows))
+        self._file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class CsvSink(_BufferedSink):
+    name = "csv"
+
+    def __init__(self, path: str, batch_size: int = 500):
+        super().__init__(path, batch_size)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(EXPORT_FIELDS)
+
+    def _write_batch(self, rows) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class SqliteSink(_BufferedSink):
+    """Tabela orders (RMA jako klucz) – jedna transakcja na paczkę rekordów."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, batch_size: int = 500):
+        super().__init__(path, batch_size)
+        # Zapis idzie z wątku roboczego (asyncio.to_thread), ale zawsze z jednego zadania
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        cols = ", ".join(f'"{f}" TEXT' for f in EXPORT_FIELDS[1:])
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS orders ("RMA" INTEGER PRIMARY KEY, {cols})')
+        self.conn.commit()
+        names = ", ".join(f'"{f}"' for f in EXPORT_FIELDS)
+        marks = ", ".join("?" for _ in EXPORT_FIELDS)
+        self._insert = f"INSERT OR REPLACE INTO orders ({names}) VALUES ({marks})"
+
+    def _write_batch(self, rows) -> None:
+        with self.conn:
+            self.conn.executemany(self._insert, rows)
+
+    def close(self) -> None:
+        super().close()
+        self.conn.close()
+
+
+class MultiSink:
+    """Zapis do kilku celów naraz. write() zwraca nazwy celów, które odrzuciły rekord."""
+
+    def __init__(self, sinks: List[Sink]):
+        self.sinks = sinks
+
+    @property
+    def names(self) -> List[str]:
+        return [s.name for s in self.sinks]
+
+    def has(self, name: str) -> bool:
+        return name in self.names
+
+    def write(self, record: OrderRecord) -> List[str]:
+        failed = []
+        for sink in self.sinks:
+            try:
+                ok = sink.write(record)
+            except Exception:
+                ok = False
+            if not ok:
+                failed.append(sink.name)
+        return failed
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+
+    def flush_if_due(self) -> None:
+        for sink in self.sinks:
+            sink.flush_if_due()
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+    def take_failures(self) -> List[Tuple[int, str]]:
+        """(rma, cel) zapisów odroczonych, które nie doszły do skutku."""
+        return [(rma, sink.name) for sink in self.sinks for rma in sink.take_failures()]
+
+
+_SINK_TYPES = {"jsonl": JsonlSink, "csv": CsvSink, "sqlite": SqliteSink}
+
+
+def build_sinks(specs: List[str], notion=None, batch_size: int = 500, hashes=None, stats=None) -> MultiSink:
+    """
+    Specyfikacje: "notion", "jsonl:ścieżka", "csv:ścieżka", "sqlite:ścieżka".
+    """
+    sinks: List[Sink] = []
+    for spec in specs:
+        kind, _, path = spec.partition(":")
+        kind = kind.strip().lower()
+        if kind == "notion":
+            sinks.append(NotionSink(notion, hashes=hashes, stats=stats))
+        elif kind in _SINK_TYPES:
+            if not path:
+                raise ValueError(f"Brak ścieżki dla celu '{kind}' (np. {kind}:eksport.{kind})")
+            sinks.append(_SINK_TYPES[kind](path, batch_size=batch_size))
+        else:
+            raise ValueError(f"Nieobsługiwany cel zapisu: {spec}")
+    return MultiSink(sinks)
@@ -0,0 +1,101 @@
+# status_writeback.py
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+
+@dataclass
+class StatusChange:
+    rma: int
+    page_id: str
+    status: str          # Status Zgłoszenia w Notion
+    crm_status: str      # nazwa na liście statusów w CRM
+    edited: str          # last_edited_time strony
+
+
+class StatusLog:
+    """
+    Dziennik zapisu statusów Notion -> CRM (SQLite): ostatni status przeniesiony
+    (albo świadomie pominięty) dla każdego RMA oraz kursor last_edited_time.
+    Zmiana już zapisana w dzienniku nigdy nie jest stosowana ponownie.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.STATUS_WRITEBACK_DB
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS applied (
+                rma INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                page_edited TEXT NOT NULL,
+                applied_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self.conn.commit()
+
+    @property
+    def cursor(self) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'cursor'").fetchone()
+        return row[0] if row else None
+
+    def set_cursor(self, value: str) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cursor', ?)", (value,))
+
+    def known(self, rmas: List[int]) -> Dict[int, str]:
+        """RMA -> ostatni zapisany status (tylko dla RMA obecnych w dzienniku)."""
+        known: Dict[int, str] = {}
+        for i in range(0, len(rmas), 500):
+            chunk = rmas[i:i + 500]
+            marks = ", ".join("?" for _ in chunk)
+            known.update(self.conn.execute(f"SELECT rma, status FROM applied WHERE rma IN ({marks})", chunk))
+        return known
+
+    def record(self, rows: List[Tuple[int, str, str]]) -> None:
+        """(rma, status, last_edited_time) – zapisane w CRM albo pominięte celowo."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO applied (rma, status, page_edited, applied_at) VALUES (?, ?, ?, ?)",
+                [(rma, status, edited, now) for rma, status, edited in rows],
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def plan_changes(pages: List[tuple], log: StatusLog,
+                 mapping: Optional[Dict[str, str]] = None) -> Tuple[List[StatusChange], List[Tuple[int, str, str]]]:
+    """
+    pages: (page_id, rma, status, last_edited) z NotionIndex.edited_since.
+    Kilka edycji (albo duplikatów strony) jednego RMA daje jedną zmianę – z
+    najpóźniej edytowanej strony. Zwraca (zmiany do zapisu w CRM posortowane
+    po RMA, statusy do odnotowania bez zapisu – spoza mapy).
+    """
+    mapping = mapping if mapping is not None else config.NOTION_TO_CRM_STATUS
+    latest: Dict[int, tuple] = {}
+    for page_id, rma, status, edited in pages:
+        if status and (rma not in latest or edited >= latest[rma][3]):
+            latest[rma] = (page_id, rma, status, edited)
+    known = log.known(list(latest))
+    changes, skipped = [], []
+    for rma in sorted(latest):
+        page_id, _, status, edited = latest[rma]
+        if known.get(rma) == status:
+            continue
+        if status in mapping:
+            changes.append(StatusChange(rma, page_id, status, mapping[status], edited))
+        else:
+            skipped.append((rma, status, edited))
+    return changes, skipped
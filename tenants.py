@@ -0,0 +1,119 @@
+# tenants.py
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import config
+
+
+def _resolve(value):
+    """"env:NAZWA" -> wartość zmiennej środowiskowej (hasła nie muszą leżeć w pliku)."""
+    if isinstance(value, str) and value.startswith("env:"):
+        return os.getenv(value[4:])
+    return value
+
+
+def _as_locator(value):
+    """["xpath", "..."] -> krotka; [["xpath", "..."], [...]] -> łańcuch alternatyw."""
+    if isinstance(value, list):
+        if value and isinstance(value[0], (list, tuple)):
+            return [tuple(alt) for alt in value]
+        return tuple(value)
+    return value
+
+
+class TenantConfig:
+    """
+    Konfiguracja jednego punktu serwisowego: te same nazwy atrybutów co moduł
+    config (CRM_LOGIN_URL, CRM_DATA_FIELDS_TO_READ, NOTION_DATABASE_ID, ...),
+    więc można ją podać wszędzie tam, gdzie funkcje przyjmują cfg.
+    Brakujące klucze są brane z config.
+    """
+
+    def __init__(self, name: str, **overrides):
+        self.name = name
+        for key in dir(config):
+            if key.isupper():
+                setattr(self, key, getattr(config, key))
+        for key, value in overrides.items():
+            key = key.upper()
+            if key == "CRM_DATA_FIELDS_TO_READ":
+                value = {field: _as_locator(loc) for field, loc in value.items()}
+            elif key.endswith("_LOCATOR") or key.endswith("_INDICATOR"):
+                value = _as_locator(value)
+            setattr(self, key, _resolve(value))
+        # Osobny katalog stanu – numery RMA różnych CRM się pokrywają
+        self.STATE_DIR = os.path.join(config.STATE_DIR, "tenants", name)
+        self.DEAD_LETTER_DB = os.path.join(self.STATE_DIR, "dead_letter.sqlite3")
+        self.LATENCY_FILE = os.path.join(self.STATE_DIR, "latency.json")
+        self.FIELD_HASHES_DB = os.path.join(self.STATE_DIR, "field_hashes.sqlite3")
+        self.NEGATIVE_CACHE_DB = os.path.join(self.STATE_DIR, "negative_cache.sqlite3")
+        self.NOTION_INDEX_DB = os.path.join(self.STATE_DIR, "notion_index.sqlite3")
+        self.STATUS_WRITEBACK_DB = os.path.join(self.STATE_DIR, "status_writeback.sqlite3")
+
+    def __repr__(self) -> str:
+        return f"TenantConfig({self.name!r}, {self.CRM_REPAIR_ORDER_BASE_URL!r})"
+
+
+def load_tenants(path: Optional[str] = None, only: Optional[List[str]] = None) -> List[TenantConfig]:
+    """
+    Plik JSON: {"tenants": [{"name": "...", "crm_login_url": "...", ...}, ...]}
+    (klucze jak w config.py, wielkość liter dowolna).
+    """
+    path = path or config.TENANTS_FILE
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    tenants = []
+    for entry in raw.get("tenants", []):
+        entry = dict(entry)
+        name = entry.pop("name")
+        if only and name not in only:
+            continue
+        tenants.append(TenantConfig(name, **entry))
+    return tenants
+
+
+class FairSlots:
+    """
+    Wspólna pula miejsc (stron przeglądarki) rozdzielana po kolei między
+    najemców: zwolnione miejsce dostaje najemca, który czeka najdłużej od
+    swojej ostatniej tury, więc duża zaległość jednego nie blokuje reszty.
+    """
+
+    def __init__(self, slots: int):
+        self._free = max(1, slots)
+        self._waiting: Dict[str, Deque[asyncio.Future]] = {}
+        self._order: Deque[str] = deque()
+
+    async def acquire(self, tenant: str) -> None:
+        if self._free > 0 and not self._order:
+            self._free -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(tenant, deque()).append(fut)
+        if tenant not in self._order:
+            self._order.append(tenant)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            else:
+                self._waiting[tenant].remove(fut)
+            raise
+
+    def release(self) -> None:
+        while self._order:
+            tenant = self._order.popleft()
+            queue = self._waiting.get(tenant)
+            while queue:
+                fut = queue.popleft()
+                if not fut.done():
+                    if queue:
+                        # Najemca czeka dalej – na koniec kolejki
+                        self._order.append(tenant)
+                    fut.set_result(None)
+                    return
+        self._free += 1